@@ -0,0 +1,78 @@
+"""
+Column-buffer accumulator for per-file extraction rows.
+
+Growing a DataFrame with pd.concat([acc, df]) once per file copies everything
+accumulated so far on every call. RecordBatchAccumulator instead appends each
+file's values to one Python list per column and builds the DataFrame (or an
+Arrow table / Parquet file) once, at the end.
+"""
+import pandas as pd
+
+from extraction import RECORD_COLUMNS
+
+
+class RecordBatchAccumulator:
+    """
+    Collects rows under a fixed column schema (RECORD_COLUMNS by default).
+    Columns a file does not have are filled with None, so files without SB data
+    still line up with the others.
+    """
+
+    def __init__(self, columns=RECORD_COLUMNS):
+        self.columns = list(columns)
+        self._buffers = {col: [] for col in self.columns}
+        self._row_count = 0
+
+    def __len__(self):
+        return self._row_count
+
+    def append_frame(self, df):
+        """Append all rows of a per-file DataFrame."""
+        if df is None or df.empty:
+            return
+        unexpected = [col for col in df.columns if col not in self._buffers]
+        if unexpected:
+            raise ValueError(f"Columns not in the accumulator schema: {unexpected}")
+
+        n = len(df)
+        # One conversion per file; per-column Series access costs more than the copy
+        values = df.to_numpy(dtype=object)
+        positions = {col: j for j, col in enumerate(df.columns)}
+        for col, buffer in self._buffers.items():
+            j = positions.get(col)
+            buffer.extend(values[:, j].tolist() if j is not None else [None] * n)
+        self._row_count += n
+
+    def append_records(self, records):
+        """Append rows given as dicts keyed by column name."""
+        for record in records:
+            unexpected = [col for col in record if col not in self._buffers]
+            if unexpected:
+                raise ValueError(f"Columns not in the accumulator schema: {unexpected}")
+            for col, buffer in self._buffers.items():
+                buffer.append(record.get(col))
+            self._row_count += 1
+
+    def to_frame(self):
+        """Build one DataFrame from everything appended so far."""
+        return pd.DataFrame(self._buffers, columns=self.columns)
+
+    def to_arrow(self):
+        """Build a pyarrow Table (requires the optional pyarrow package)."""
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("pyarrow is required for Arrow/Parquet output: pip install pyarrow") from e
+        return pa.table({col: self._buffers[col] for col in self.columns})
+
+    def write_parquet(self, path):
+        """Write everything appended so far to a Parquet file (requires pyarrow)."""
+        table = self.to_arrow()
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, path)
+
+    def clear(self):
+        for buffer in self._buffers.values():
+            buffer.clear()
+        self._row_count = 0
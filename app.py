@@ -1,356 +1,298 @@
-# import win32com.client
-from pathlib import Path
-
+import streamlit as st
+import pandas as pd
+from io import BytesIO
+import hashlib
 import os
-# import win32com.client
+import tempfile
+import time
+import uuid
 from pathlib import Path
+from openpyxl import load_workbook
+
+from batch import default_worker_count, extract_batch, tidy_combined_rows
+from export import EXPORT_FORMATS, export_frame, worksheet_frame
+from extraction_cache import ExtractionCache, hash_pdf
+from instrumentation import collect, log_event, log_to_env_file, profile_to, stage, timing_table
+from template_fill import apply_updates, fill_template, plan_sih_updates, read_sih_frame
+from mailbox_sources import DEFAULT_DOWNLOAD_DIR, MaildirSource, OutlookSource, iter_matching_pdfs
+from job_queue import ExtractionService, JobOptions, run_job
+from pipeline import run_pipeline
+from record_store import RecordStore
+
+# Structured JSON timing logs go to $SB_METRICS_LOG when it is set
+log_to_env_file()
+
+# ---------------- Streamlit App ----------------
+st.set_page_config(page_title="Multi-PDF SB Data Extractor", layout="wide")
+st.title("📄 Multi-PDF SB Data Extractor")
+
+st.sidebar.header("⚙️ Settings")
+use_shared_service = st.sidebar.checkbox(
+    "Use the shared extraction queue",
+    value=True,
+    help=(
+        "Extract on one worker pool shared by every session of this server, taking "
+        "turns between sessions. Identical PDFs submitted at the same time are "
+        "extracted once. Untick to extract inside this session instead."
+    )
+)
+extraction_workers = st.sidebar.number_input(
+    "Extraction worker processes",
+    min_value=1,
+    max_value=64,
+    value=default_worker_count(),
+    step=1,
+    help=(
+        "Without the shared queue: 1 = extract PDFs one after another inside this "
+        "session. A single large PDF has its pages split across the workers instead."
+    ),
+    disabled=use_shared_service,
+)
+use_extraction_cache = st.sidebar.checkbox(
+    "Reuse results for PDFs extracted before",
+    value=True,
+    help="PDFs are recognised by their content, so re-uploads skip parsing."
+)
+use_layout_template = st.sidebar.checkbox(
+    "Layout-template mode",
+    value=False,
+    help=(
+        "Learn where each invoice field sits from the first page and read only "
+        "those regions afterwards. Pages that do not match fall back to full "
+        "table extraction."
+    )
+)
+stream_pages = st.sidebar.checkbox(
+    "Low-memory page streaming",
+    value=False,
+    help=(
+        "Read invoice pages one at a time and free each page once read. Keeps "
+        "memory flat for bills with hundreds of pages."
+    )
+)
+profile_extraction = st.sidebar.checkbox(
+    "Profile the next extraction (cProfile)",
+    value=False,
+    help=(
+        "Runs the next batch in this process (1 worker) under cProfile and "
+        "offers the profile for download below."
+    )
+)
+measure_fill_memory = st.sidebar.checkbox(
+    "Report template-fill peak memory",
+    value=False,
+    help="Traces allocations during the template fill; makes the fill slower."
+)
+mailbox_kind = st.sidebar.radio(
+    "Mailbox for template PDFs",
+    ("Outlook folder", "Local Maildir / .eml folder")
+)
+if mailbox_kind == "Outlook folder":
+    mailbox_name = st.sidebar.text_input("Outlook Inbox subfolder", value="abc")
+    mailbox_source = OutlookSource(mailbox_name)
+else:
+    mailbox_name = st.sidebar.text_input("Maildir or .eml folder path", value=str(Path.home() / "Maildir"))
+    mailbox_source = MaildirSource(mailbox_name)
+if st.sidebar.button("🔄 Check mailbox again"):
+    # Part of the download memo key, so the next lookup goes to the mailbox
+    st.session_state["mailbox_refresh"] = st.session_state.get("mailbox_refresh", 0) + 1
+extraction_cache = ExtractionCache()
+if st.sidebar.button("🗑️ Clear extraction cache"):
+    extraction_cache.clear()
+    st.sidebar.success("Extraction cache cleared.")
+st.sidebar.caption(
+    f"Cache: {extraction_cache.entry_count()} PDF(s), "
+    f"{extraction_cache.size_bytes() / (1024 * 1024):.1f} MB"
+)
+save_to_store = st.sidebar.checkbox(
+    "Save extracted rows to the local store",
+    value=True,
+    help="Keeps every extracted row, so later templates can be filled without re-extracting or re-uploading."
+)
+record_store = RecordStore()
+store_stats = record_store.stats()
+st.sidebar.caption(f"Store: {store_stats['rows']} row(s) from {store_stats['pdfs']} PDF(s)")
+
+
+@st.cache_resource
+def extraction_service():
+    """The ExtractionService shared by every session of this server process."""
+    return ExtractionService(cache=ExtractionCache())
+
+
+# Names this session's jobs and workspace in the shared service
+session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+service = extraction_service() if use_shared_service else None
+if service is not None:
+    st.sidebar.caption(f"Shared queue: {service.workers} worker process(es)")
+
+
+def content_key(*parts):
+    """SHA-256 hex digest over a mix of bytes and str parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
 
-def download_pdfs_from_outlook(folder_name, sb_numbers, download_dir="temp_pdfs"):
+
+def session_memo(name, key, compute):
     """
-    Connects to Outlook, searches the given folder for emails that have PDF attachments
-    containing any of the specified Shipping Bill Numbers in their filename.
-    Downloads those attachments into download_dir (absolute path).
+    Return compute(), reusing the value kept in this session when the last
+    call for name had the same key. Only the latest value per name is kept,
+    so Streamlit reruns (widget changes) do not redo finished work.
     """
-    # ✅ Use absolute, guaranteed-valid path (under user's Documents)
-    base_path = Path.home() / "Documents" / download_dir
-    base_path.mkdir(parents=True, exist_ok=True)
-
-    outlook = win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI")
-    inbox = outlook.GetDefaultFolder(6)  # 6 = Inbox
-    target_folder = None
-
-    # Try to find the subfolder "abc" (case-insensitive)
-    for folder in inbox.Folders:
-        if folder.Name.lower() == folder_name.lower():
-            target_folder = folder
-            break
-
-    if not target_folder:
-        print(f"❌ Folder '{folder_name}' not found in Outlook Inbox.")
-        return []
-
-    print(f"📂 Searching Outlook folder '{folder_name}' for matching PDFs...")
-
-    downloaded_files = []
-    messages = target_folder.Items
-
-    for msg in messages:
-        attachments = msg.Attachments
-        for att in attachments:
-            if att.FileName.lower().endswith(".pdf"):
-                for sb_no in sb_numbers:
-                    if str(sb_no) in att.FileName:
-                        # ✅ Safe absolute path
-                        safe_filename = att.FileName.replace(":", "_").replace("\\", "_").replace("/", "_")
-                        save_path = str(base_path / safe_filename)
-                        att.SaveAsFile(save_path)
-                        downloaded_files.append(save_path)
-                        print(f"✅ Downloaded: {att.FileName}")
-                        break  # Move to next attachment
-
-    if not downloaded_files:
-        print("⚠️ No matching PDF attachments found.")
-    else:
-        print(f"📦 {len(downloaded_files)} PDFs downloaded to '{base_path}'.")
+    memo = st.session_state.setdefault("memo", {})
+    entry = memo.get(name)
+    if entry is None or entry[0] != key:
+        entry = (key, compute())
+        memo[name] = entry
+    return entry[1]
 
-    return downloaded_files
 
-import streamlit as st
-import pandas as pd
-import pdfplumber
-import re
-from difflib import get_close_matches
-from io import BytesIO
-import os
-from openpyxl import load_workbook
-# ---------------- Your existing extraction functions ----------------
-def extract_sb_data(pdf_path):
-    sb_data = []
-
-    # Patterns
-    sb_regex = r'\b\d{5,8}\b'                    
-    date_regex = r'\b\d{2}-[A-Z]{3}-\d{2}\b'    
-    iec_regex = r'IEC/Br\s*[:\-]?\s*([A-Z0-9]+)'
-    gstin_regex = r'GSTIN/TYPE\s*[:\-]?\s*([A-Z0-9]+)'
-    cbcode_regex = r'CB CODE\s*[:\-]?\s*([A-Z0-9]+)'
-
-    # Country list for fuzzy matching
-    country_list = [
-        "INDIA", "SWEDEN", "GERMANY", "USA", "UNITED STATES", "FRANCE", "ITALY", 
-        "CHINA", "JAPAN", "SOUTH KOREA", "THAILAND", "SINGAPORE", "UAE", "BRAZIL",
-        "UK", "UNITED KINGDOM", "NORWAY", "FINLAND", "DENMARK", "NETHERLANDS",
-        "POLAND", "SPAIN", "CANADA", "AUSTRALIA", "SWITZERLAND", "BELGIUM"
-    ]
-
-    with pdfplumber.open(pdf_path) as pdf:
-        page = pdf.pages[0]
-        text = page.extract_text() or ""
-
-        # --- Extract IEC, GSTIN, CB CODE ---
-        iec_value = re.search(iec_regex, text)
-        iec_value = iec_value.group(1) if iec_value else ""
-
-        gstin_value = re.search(gstin_regex, text)
-        gstin_value = gstin_value.group(1) if gstin_value else ""
-
-        cbcode_value = re.search(cbcode_regex, text)
-        cbcode_value = cbcode_value.group(1) if cbcode_value else ""
-
-        # --- Extract FINAL DESTINATION robustly ---
-        final_dest_value = ""
-        lines = text.split('\n')
-
-        for i, line in enumerate(lines):
-            if re.search(r'13\.*\s*COUNTRY\s*OF\s*FINALDESTINATIO', line, re.IGNORECASE):
-                after = line.split("13.COUNTRY OF FINALDESTINATIO")[-1].strip()
-                candidates = []
-
-                if after:
-                    candidates.append(after)
-
-                for next_line in lines[i+1:i+5]:
-                    clean_next = next_line.strip()
-                    if clean_next:
-                        candidates.append(clean_next)
-
-                for cand in candidates:
-                    cand_clean = re.sub(r'[^A-Z\s]', '', cand.upper())
-                    cand_clean = cand_clean.strip()
-                    if not cand_clean:
-                        continue
-
-                    match = get_close_matches(cand_clean, country_list, n=1, cutoff=0.5)
-                    if match:
-                        final_dest_value = match[0]
-                        break
-
-                if not final_dest_value and candidates:
-                    final_dest_value = candidates[0].strip()
-                break
-
-        # --- Extract SB Data Section ---
-        for i, line in enumerate(lines):
-            if "Port Code SB No SB Date" in line:
-                if i + 1 < len(lines):
-                    next_line = lines[i + 1]
-                    sb_numbers = re.findall(sb_regex, next_line)
-                    dates = re.findall(date_regex, next_line)
-
-                    # Port Code (before SB No)
-                    port_code = ""
-                    if sb_numbers:
-                        sb_index = next_line.find(sb_numbers[0])
-                        port_code_candidate = next_line[:sb_index].strip()
-                        port_code = port_code_candidate.split()[-1] if port_code_candidate else ""
-
-                    # Combine into rows
-                    for j in range(max(len(sb_numbers), len(dates))):
-                        sb_data.append({
-                            "PORT CODE(FROM)": port_code,
-                            "SHIPPINGBILL NO": sb_numbers[j] if j < len(sb_numbers) else "",
-                            "SHIPPING BILL DATE": dates[j] if j < len(dates) else "",
-                            "IE CODE": iec_value,
-                            "GSTIN/TYPE": gstin_value,
-                            "CB CODE": cbcode_value,
-                            "FINAL DESTINATION": final_dest_value,
-                            "INVOICE NO": ""   # Placeholder (will be filled later)
-                        })
-
-    sb_df = pd.DataFrame(sb_data) if sb_data else None
-    return sb_df
-
-
-def extract_invoice_tables(pdf_path):
+def shared_job(fetch, on_result):
     """
-    Extract tables from all pages that contain "PART - II - INVOICE DETAILS",
-    and also include the first page even if it doesn't contain that text.
-    Returns a dictionary: {sheet_name: DataFrame}
+    run_job on the shared service with this session's settings, or None when
+    extraction should run in this session (shared queue off, or profiling).
     """
-    page_tables_dict = {}
+    if service is None or profile_extraction:
+        return None
+    options = JobOptions(use_extraction_cache, use_layout_template, stream_pages)
+    return run_job(service, session_id, fetch, options, on_result=on_result)
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for i, page in enumerate(pdf.pages, start=1):
-            text = page.extract_text()
-            tables = page.extract_tables()
 
-            if (text and "PART - II - INVOICE DETAILS" in text) or i == 1:
-                if tables:
-                    page_df = pd.concat([pd.DataFrame(tbl) for tbl in tables], ignore_index=True)
-                    sheet_name = f"Page_{i}"
-                    page_tables_dict[sheet_name] = page_df
-                else:
-                    page_tables_dict[f"Page_{i}"] = pd.DataFrame([["No table found on this page"]])
+def store_result(source, result, display_name):
+    """Save one file's extracted rows to the local store, if enabled."""
+    if save_to_store and not result.error:
+        record_store.put_rows(hash_pdf(source), tidy_combined_rows(result.rows), display_name)
 
-    return page_tables_dict
 
-def extract_invoice_details_from_all_pages(tables_dict, sb_df=None):
+def profiled(label, run):
     """
-    Extracts *all* invoices from all 'PART - II - INVOICE DETAILS' pages,
-    and duplicates SB-level info for each invoice.
+    run(workers) with the configured worker count, or in this process under
+    cProfile when profiling is switched on; the profile is kept in the session
+    under label.
     """
-    if sb_df is None or sb_df.empty:
-        sb_df = pd.DataFrame()
-
-    invoice_rows = []
-
-    for page_name, page_df in tables_dict.items():
-        if page_name == "Page_1":
-            continue
-
-        page_df = page_df.fillna("").astype(str)
-        try:
-            if page_df.shape[0] >= 13 and page_df.shape[1] >= 10:
-                check_cell = page_df.iat[12, 9].strip().upper()
-                if "2.BUYER'S NAME & ADDRESS".upper() in check_cell:
-                    # Extract invoice number and date
-                    invoice_no, invoice_date = "", ""
-                    if page_df.shape[0] >= 12 and page_df.shape[1] >= 3:
-                        cell_val = page_df.iat[11, 2].strip()
-                        match = re.match(r"([A-Za-z0-9/\\-]+)\s+(\d{2}/\d{2}/\d{4})", cell_val)
-                        if match:
-                            invoice_no = match.group(1)
-                            invoice_date = match.group(2)
-                        else:
-                            invoice_no = cell_val
-
-                    # Extract drawee name
-                    drawee_name = page_df.iat[13, 9].strip() if page_df.shape[0] >= 14 else ""
-
-                    # Extract drawee address (next few rows)
-                    drawee_address_parts = []
-                    for r in range(14, min(19, page_df.shape[0])):
-                        val = page_df.iat[r, 9].strip()
-                        if len(val) > 2:
-                            drawee_address_parts.append(val)
-                    drawee_address = " ".join(drawee_address_parts)
-
-                    # Goods description
-                    goods_desc = page_df.iat[28, 4].strip() if page_df.shape[0] >= 29 else ""
-
-                    # Port of destination
-                    port_of_dest = ""
-                    if "Page_1" in tables_dict:
-                        page1_df = tables_dict["Page_1"].fillna("").astype(str)
-                        if page1_df.shape[0] >= 14 and page1_df.shape[1] >= 30:
-                            port_of_dest = page1_df.iat[13, 29].strip()
-
-                    invoice_rows.append({
-                        "INVOICE NO": invoice_no,
-                        "INVOICE DATE": invoice_date,
-                        "DRAWEE NAME": drawee_name,
-                        "DRAWEE ADDRESS": drawee_address,
-                        "GOODS DESCRIPTION": goods_desc,
-                        "PORT OF DESTINATION": port_of_dest
-                    })
-        except Exception as e:
-            print(f"Error processing {page_name}: {e}")
-
-    # ✅ Combine SB data with *all* invoices
-    combined_rows = []
-    if not sb_df.empty:
-        for _, sb_row in sb_df.iterrows():
-            for inv in invoice_rows:
-                combined_row = {**sb_row.to_dict(), **inv}
-                combined_rows.append(combined_row)
-    else:
-        combined_rows = invoice_rows
-
-    return pd.DataFrame(combined_rows)
-
-def get_port_of_destination(tables_dict):
+    if not profile_extraction:
+        return run(int(extraction_workers))
+    with tempfile.TemporaryDirectory() as tmp:
+        profile_path = os.path.join(tmp, "extraction.prof")
+        with profile_to(profile_path) as report:
+            value = run(1)
+        with open(profile_path, "rb") as f:
+            st.session_state.setdefault("profiles", {})[label] = {"data": f.read(), "stats": report["stats"]}
+    return value
+
+
+def extract_with_progress(pdf_paths, display_names):
     """
-    Extract PORT OF DESTINATION from Page_1 cell AD14
+    Extract a list of PDFs with the configured worker count, showing per-file
+    progress. Returns (combined_df, notes); notes are (kind, value) messages
+    for show_notes, kept so a memoized result can show them again.
     """
-    port_of_dest_value = ""
-
-    if "Page_1" in tables_dict:
-        page1_df = tables_dict["Page_1"].fillna("").astype(str)
-        try:
-            # Check if row 14 and column AD exist
-            if page1_df.shape[0] >= 14 and page1_df.shape[1] >= 30:
-                port_of_dest_value = page1_df.iat[13, 29].strip()
-                print(f"🔍 Port of Destination (AD14): '{port_of_dest_value}'")
-        except Exception as e:
-            print(f"Error extracting Port of Destination from Page_1: {e}")
+    progress = st.progress(0.0, text=f"Extracting 0/{len(pdf_paths)} PDF(s)...")
+    page_totals = {"pages": 0, "skipped_pages": 0}
+    results = []
+
+    def on_progress(done, total, result):
+        progress.progress(done / total, text=f"Extracted {done}/{total}: {display_names[result.index]}")
+        store_result(pdf_paths[result.index], result, display_names[result.index])
+        results.append(result)
+        if result.stats:
+            page_totals["pages"] += result.stats["pages"]
+            page_totals["skipped_pages"] += result.stats["skipped_pages"]
+
+    job = shared_job(pdf_paths, lambda done, result, accumulator: on_progress(done, len(pdf_paths), result))
+    if job is not None:
+        combined_df, failures = job.rows, job.failures
     else:
-        print("⚠️ Page_1 not found in tables_dict.")
-
-    return port_of_dest_value
+        combined_df, failures = profiled("uploads", lambda workers: extract_batch(
+            pdf_paths,
+            workers=workers,
+            on_progress=on_progress,
+            cache=extraction_cache if use_extraction_cache else None,
+            use_layout_template=use_layout_template,
+            stream_pages=stream_pages,
+        ))
+    return combined_df, extraction_notes(failures, page_totals, display_names, results)
+
+
+def extraction_notes(failures, page_totals, display_names, results=()):
+    """(kind, value) messages for failed files, skipped pages and stage timings."""
+    notes = []
+    for failure in failures:
+        notes.append(("warning", f"⚠️ Could not extract {display_names[failure.index]}: {failure.error}"))
+    if page_totals["pages"]:
+        notes.append((
+            "caption",
+            f"Table extraction skipped on {page_totals['skipped_pages']} of "
+            f"{page_totals['pages']} parsed pages (no invoice details)."
+        ))
+    if results:
+        notes.append(("timings", timing_table(results, display_names)))
+    return notes
+
+
+def show_notes(notes):
+    for kind, value in notes:
+        if kind == "timings":
+            with st.expander("⏱️ Stage timings per file (seconds)"):
+                st.dataframe(value)
+        else:
+            getattr(st, kind)(value)
 
 
-def save_sb_and_tables(sb_df, tables_dict, sb_output_path, tables_output_path):
-    os.makedirs(os.path.dirname(sb_output_path), exist_ok=True)
-    os.makedirs(os.path.dirname(tables_output_path), exist_ok=True)
+def extract_uploads(uploaded_files):
+    """
+    Extract the uploaded PDFs and apply the SB-level clean-up.
+    Returns (combined_sb_df, notes).
+    """
+    st.info("Processing PDFs... This may take a few seconds.")
 
-    if sb_df is not None and not sb_df.empty:
-        sb_df.to_excel(sb_output_path, index=False)
-        print(f"SB Data saved to: {sb_output_path}")
-    else:
-        print("No SB Data found to save.")
+    # Parsed straight from the uploaded bytes; nothing is written to disk
+    combined_sb_df, notes = extract_with_progress(
+        [f.getvalue() for f in uploaded_files], [f.name for f in uploaded_files]
+    )
 
-    if tables_dict:
-        with pd.ExcelWriter(tables_output_path, engine='openpyxl') as writer:
-            for sheet_name, df in tables_dict.items():
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-        print(f"Invoice Tables saved to: {tables_output_path}")
-    else:
-        print("No Invoice Tables found to save.")
+    return tidy_combined_rows(combined_sb_df), notes
 
-# ---------------- Streamlit App ----------------
-st.set_page_config(page_title="Multi-PDF SB Data Extractor", layout="wide")
-st.title("📄 Multi-PDF SB Data Extractor")
 
 # File uploader (multiple PDFs)
 uploaded_files = st.file_uploader(
     "Upload PDF files (multiple allowed)", type=["pdf"], accept_multiple_files=True
 )
 
+# Extracted uploads, kept for the session so later steps can use them
+combined_sb_df = None
+combined_sb_key = None
+
 if uploaded_files:
-    st.info("Processing PDFs... This may take a few seconds.")
-    combined_sb_df = pd.DataFrame()
-    
-    for uploaded_file in uploaded_files:
-        # Save uploaded file temporarily
-        pdf_path = f"temp_uploaded.pdf"
-        with open(pdf_path, "wb") as f:
-            f.write(uploaded_file.read())
-        
-        # Extract SB Data
-        sb_df = extract_sb_data(pdf_path)
-        
-        # Extract invoice tables to get invoice/buyer info
-        invoice_tables_dict = extract_invoice_tables(pdf_path)
-        sb_df = extract_invoice_details_from_all_pages(invoice_tables_dict, sb_df=sb_df)
-        
-        if sb_df is not None and not sb_df.empty:
-            combined_sb_df = pd.concat([combined_sb_df, sb_df], ignore_index=True)
-    
-    if not combined_sb_df.empty:
-        # Fill SB-level columns
-        sb_columns_to_fill = [
-            "PORT CODE(FROM)", "SHIPPINGBILL NO", "SHIPPING BILL DATE", "IE CODE", 
-            "GSTIN/TYPE", "CB CODE", "FINAL DESTINATION"
-        ]
-        combined_sb_df[sb_columns_to_fill] = combined_sb_df[sb_columns_to_fill].ffill()
-
-        # Remove rows where INVOICE NO is blank
-        combined_sb_df = combined_sb_df[
-            combined_sb_df["INVOICE NO"].notna() & (combined_sb_df["INVOICE NO"] != "")
-        ]
+    combined_sb_key = content_key(
+        "uploads", use_layout_template,
+        *[part for f in uploaded_files for part in (f.name, f.getvalue())]
+    )
+    combined_sb_df, upload_notes = session_memo(
+        "uploads", combined_sb_key, lambda: extract_uploads(uploaded_files)
+    )
+    show_notes(upload_notes)
 
+    if not combined_sb_df.empty:
         # Display combined SB Data
         st.subheader("📊 Combined SB Data")
         st.dataframe(combined_sb_df)
-        
-        # Download combined SB Data as Excel
-        towrite = BytesIO()
-        combined_sb_df.to_excel(towrite, index=False, engine='openpyxl')
-        towrite.seek(0)
+
+        # Download combined SB Data (written in chunks, in the chosen format)
+        export_format = st.selectbox("Download format", list(EXPORT_FORMATS), key="export_format")
+        combined_sb_export = session_memo(
+            "combined_export",
+            content_key(combined_sb_key, export_format),
+            lambda: export_frame(combined_sb_df, export_format),
+        )
         st.download_button(
-            label="⬇️ Download Combined SB Data as Excel",
-            data=towrite,
-            file_name="Combined_SB_Data.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            label=f"⬇️ Download Combined SB Data as {export_format.upper()}",
+            data=combined_sb_export,
+            file_name=f"Combined_SB_Data.{export_format}",
+            mime=EXPORT_FORMATS[export_format]
         )
     else:
         st.warning("No SB Data found in the uploaded PDFs.")
@@ -362,21 +304,30 @@ if uploaded_files:
 st.subheader("📥 Upload Excel with Shipping Bill Numbers to Fill Data")
 
 
+STORE_SOURCE = "Look up saved rows in the local store"
 data_source = st.radio(
     "Select data source for filling details:",
-    ("Use existing combined_sb_df", "Upload another Excel file")
+    ("Use existing combined_sb_df", "Upload another Excel file", STORE_SOURCE)
 )
 
-# Initialize effective_combined_df
+# Initialize effective_combined_df and the content key it was built from
 effective_combined_df = None
+effective_key = None
+# Template workbook bytes after the extracted-data fill; the SIH step continues from them
+filled_excel_bytes = None
 
 if data_source == "Use existing combined_sb_df":
-    if 'combined_sb_df' not in locals() or combined_sb_df.empty:
+    if combined_sb_df is None or combined_sb_df.empty:
         st.error("❌ No existing file found in memory.")
     else:
         effective_combined_df = combined_sb_df
+        effective_key = combined_sb_key
         st.success("✅ Using existing combined_sb_df loaded in memory.")
 
+elif data_source == STORE_SOURCE:
+    # Looked up below, once the template's Shipping Bill numbers are known
+    st.info(f"🗄️ Rows for the template's Shipping Bills will be read from the local store ({record_store.path}).")
+
 else:
     uploaded_combined = st.file_uploader(
         "Upload Excel file to use as combined_sb_df",
@@ -384,10 +335,90 @@ else:
         key="combined_source"
     )
     if uploaded_combined:
-        effective_combined_df = pd.read_excel(uploaded_combined)
+        effective_key = content_key("combined_source", uploaded_combined.getvalue())
+        effective_combined_df = session_memo(
+            "combined_source", effective_key, lambda: pd.read_excel(BytesIO(uploaded_combined.getvalue()))
+        )
         st.success("✅ Uploaded Excel loaded as combined_sb_df.")
 
 
+def read_template_sb_list(data):
+    """Shipping Bill numbers listed in the template, or None without a 'SHIPPINGBILL NO' column."""
+    user_sb_df = pd.read_excel(BytesIO(data))
+    if "SHIPPINGBILL NO" not in user_sb_df.columns:
+        return None
+    return user_sb_df["SHIPPINGBILL NO"].astype(str).str.strip().unique().tolist()
+
+
+def fetch_and_extract(sb_list):
+    """
+    Download the matching PDFs from the selected mailbox and extract each one
+    as soon as it arrives, showing partial results meanwhile.
+    Returns (PipelineResult, notes, content key of the extracted PDFs).
+    """
+    status = st.empty()
+    preview = st.empty()
+    page_totals = {"pages": 0, "skipped_pages": 0}
+    last_preview = [0.0]
+    results = []
+
+    def on_result(done, result, accumulator):
+        status.info(f"⏳ Extracted {done} PDF(s) so far, latest: {os.path.basename(result.source)}")
+        store_result(result.source, result, os.path.basename(result.source))
+        results.append(result)
+        if result.stats:
+            page_totals["pages"] += result.stats["pages"]
+            page_totals["skipped_pages"] += result.stats["skipped_pages"]
+        # Rebuilding the preview costs a full copy, so refresh it at most twice a second
+        if time.monotonic() - last_preview[0] > 0.5:
+            preview.dataframe(accumulator.to_frame())
+            last_preview[0] = time.monotonic()
+
+    # Each session downloads into its own directory; the mailbox watermark and
+    # index stay in the shared one, so new mail is still listed only once
+    if service is not None:
+        fetch = iter_matching_pdfs(
+            mailbox_source, sb_list, service.workspace(session_id) / "mail", state_dir=DEFAULT_DOWNLOAD_DIR
+        )
+    else:
+        fetch = iter_matching_pdfs(mailbox_source, sb_list)
+    result = shared_job(fetch, on_result)
+    if result is None:
+        result = profiled("mailbox", lambda workers: run_pipeline(
+            fetch,
+            workers=workers,
+            on_result=on_result,
+            cache=extraction_cache if use_extraction_cache else None,
+            use_layout_template=use_layout_template,
+            stream_pages=stream_pages,
+        ))
+    status.empty()
+    preview.empty()
+    display_names = [os.path.basename(p) for p in result.sources]
+    rows_key = content_key("downloads", use_layout_template, *[hash_pdf(p) for p in result.sources])
+    return result, extraction_notes(result.failures, page_totals, display_names, results), rows_key
+
+
+def fill_template_bytes(template_bytes, extracted_df):
+    """
+    Fill a copy of the template; returns (filled workbook bytes, FillReport,
+    preview DataFrame, {stage: seconds}).
+    """
+    with collect() as metrics:
+        with stage("load_template"):
+            wb = load_workbook(BytesIO(template_bytes))
+        ws = wb.active
+        fill_report = fill_template(ws, extracted_df, track_memory=measure_fill_memory)
+        # Preview straight from the filled sheet, before it is serialized
+        preview = worksheet_frame(ws)
+        filled_excel = BytesIO()
+        with stage("save_template"):
+            wb.save(filled_excel)
+    fill_metrics = metrics.to_dict()
+    log_event("template_filled", rows=fill_report.filled_rows, metrics=fill_metrics)
+    return filled_excel.getvalue(), fill_report, preview, fill_metrics["stages"]
+
+
 # --- Step 2: Upload target Excel (template) ---
 uploaded_excel = st.file_uploader(
     "Upload Excel file containing 'SHIPPINGBILL NO' column to fill data",
@@ -396,126 +427,92 @@ uploaded_excel = st.file_uploader(
 )
 
 if uploaded_excel:
-    user_sb_df = pd.read_excel(uploaded_excel)
+    template_bytes = uploaded_excel.getvalue()
+    template_key = content_key("template", template_bytes)
+    sb_list = session_memo("template_sb_list", template_key, lambda: read_template_sb_list(template_bytes))
 
-    if "SHIPPINGBILL NO" not in user_sb_df.columns:
+    if sb_list is None:
         st.error("❌ The uploaded Excel must contain a column named 'SHIPPINGBILL NO'.")
     else:
-        sb_list = user_sb_df["SHIPPINGBILL NO"].astype(str).str.strip().unique().tolist()
-        st.info(f"Looking for {len(sb_list)} Shipping Bill PDFs in Outlook folder 'abc'...")
-
-        # 🔹 Auto-download PDFs from Outlook
-        downloaded_files = download_pdfs_from_outlook("abc", sb_list)
-
-        if downloaded_files:
-            st.success(f"✅ Found and downloaded {len(downloaded_files)} PDF(s). Extracting data...")
+        st.info(f"Looking for {len(sb_list)} Shipping Bill PDFs in mailbox '{mailbox_name}'...")
+
+        # 🔹 Download from the mailbox and extract while downloading (only new mail is listed on repeat runs)
+        pipeline_result, download_notes, downloaded_key = session_memo(
+            "mailbox",
+            content_key(
+                mailbox_source.key, st.session_state.get("mailbox_refresh", 0), use_layout_template, *sorted(sb_list)
+            ),
+            lambda: fetch_and_extract(sb_list),
+        )
+        if pipeline_result.error:
+            st.error(f"❌ Could not read mailbox '{mailbox_name}': {pipeline_result.error}")
 
-            # 🔹 Extract all PDFs into one DataFrame
-            extracted_sb_df = pd.DataFrame()
-            for pdf_path in downloaded_files:
-                sb_df = extract_sb_data(pdf_path)
-                invoice_tables_dict = extract_invoice_tables(pdf_path)
-                sb_df = extract_invoice_details_from_all_pages(invoice_tables_dict, sb_df=sb_df)
-                if sb_df is not None and not sb_df.empty:
-                    extracted_sb_df = pd.concat([extracted_sb_df, sb_df], ignore_index=True)
+        if pipeline_result.sources:
+            st.success(f"✅ Found and extracted {len(pipeline_result.sources)} PDF(s) from the mailbox.")
+            show_notes(download_notes)
 
+            extracted_sb_df = pipeline_result.rows
             if not extracted_sb_df.empty:
                 st.success("✅ PDF extraction complete. Merging into template...")
                 effective_combined_df = extracted_sb_df
+                effective_key = downloaded_key
             else:
                 st.warning("⚠️ No data extracted from the downloaded PDFs.")
         else:
-            st.warning("⚠️ No matching PDFs found in Outlook folder 'abc'. Proceeding with existing/combined data if available.")
+            st.warning(f"⚠️ No matching PDFs found in mailbox '{mailbox_name}'. Proceeding with existing/combined data if available.")
+
+        # The store already holds the rows just downloaded, unless saving is turned off
+        if data_source == STORE_SOURCE and (save_to_store or effective_combined_df is None):
+            effective_key = content_key("store", record_store.revision(), *sorted(sb_list))
+            effective_combined_df = session_memo(
+                "store_lookup", effective_key, lambda: record_store.rows_for_shipping_bills(sb_list)
+            )
+            st.info(
+                f"🗄️ {len(effective_combined_df)} stored row(s) found for "
+                f"{effective_combined_df['SHIPPINGBILL NO'].nunique()} of {len(sb_list)} Shipping Bill(s)."
+            )
 
     # ✅ Only continue if we now have combined data
-    if effective_combined_df is not None and not effective_combined_df.empty:
-        # Normalize both data sources
-        user_sb_df["SHIPPINGBILL NO"] = user_sb_df["SHIPPINGBILL NO"].astype(str).str.strip()
+    if sb_list is not None and effective_combined_df is not None and not effective_combined_df.empty:
+        # Normalize the extracted data (on a copy, the memoized frame stays as extracted)
+        effective_combined_df = effective_combined_df.copy()
         effective_combined_df["SHIPPINGBILL NO"] = effective_combined_df["SHIPPINGBILL NO"].astype(str).str.strip()
 
-        # Select relevant columns
-        extracted_cols = [
-            "SHIPPINGBILL NO", "PORT CODE(FROM)", "SHIPPING BILL DATE", "IE CODE", "GSTIN/TYPE",
-            "CB CODE", "FINAL DESTINATION", "INVOICE NO", "INVOICE DATE", "DRAWEE NAME",
-            "DRAWEE ADDRESS", "GOODS DESCRIPTION", "PORT OF DESTINATION"
-        ]
-        available_cols = [c for c in extracted_cols if c in effective_combined_df.columns]
-        extracted_data = effective_combined_df[available_cols].drop_duplicates(subset=["SHIPPINGBILL NO"])
-        extracted_dict = extracted_data.set_index("SHIPPINGBILL NO").to_dict(orient="index")
-
-        st.write(f"🧾 Extracted {len(extracted_data)} unique Shipping Bills from PDFs.")
+        st.write(f"🧾 Extracted {effective_combined_df['SHIPPINGBILL NO'].nunique()} unique Shipping Bills from PDFs.")
 
         # --- Fill the template Excel (preserving formatting)
-        in_memory_file = BytesIO(uploaded_excel.getvalue())
-        wb = load_workbook(in_memory_file)
-        ws = wb.active
-
-        header_map = {str(cell.value).strip(): cell.column_letter for cell in ws[1] if cell.value}
-
-        filled_rows = 0
-        # --- Build multi-key lookup using both SB and INVOICE NO ---
-        if "INVOICE NO" in effective_combined_df.columns:
-            extracted_dict = (
-                effective_combined_df
-                .set_index(["SHIPPINGBILL NO", "INVOICE NO"])
-                .to_dict(orient="index")
-            )
-        else:
-            extracted_dict = (
-                effective_combined_df
-                .set_index("SHIPPINGBILL NO")
-                .to_dict(orient="index")
+        filled_excel_bytes, fill_report, filled_preview, fill_stages = session_memo(
+            "filled_template",
+            content_key(template_key, effective_key, measure_fill_memory),
+            lambda: fill_template_bytes(template_bytes, effective_combined_df),
+        )
+        filled_rows = fill_report.filled_rows
+
+        st.caption(
+            f"Matched {fill_report.pair_matches} row(s) on SB + invoice and "
+            f"{fill_report.sb_matches} on SB only; {fill_report.cells_written} cell(s) written. "
+            + "Time: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in fill_stages.items()) + "."
+            + (
+                f" Peak memory during fill: {fill_report.peak_memory_bytes / (1024 * 1024):.1f} MB."
+                if fill_report.peak_memory_bytes is not None else ""
             )
-
-        filled_rows = 0
-        for row in ws.iter_rows(min_row=2):
-            sb_value = None
-            invoice_value = None
-
-            # Locate SB and Invoice cells
-            if "SHIPPINGBILL NO" in header_map:
-                sb_cell = ws[f"{header_map['SHIPPINGBILL NO']}{row[0].row}"]
-                sb_value = str(sb_cell.value).strip() if sb_cell.value else None
-            if "INVOICE NO" in header_map:
-                inv_cell = ws[f"{header_map['INVOICE NO']}{row[0].row}"]
-                invoice_value = str(inv_cell.value).strip() if inv_cell.value else None
-
-            # Lookup match
-            key = None
-            if invoice_value and (sb_value, invoice_value) in extracted_dict:
-                key = (sb_value, invoice_value)
-            elif sb_value in extracted_dict:  # fallback if invoice not found
-                key = sb_value
-
-            if key:
-                extracted_row = extracted_dict[key]
-                for field, value in extracted_row.items():
-                    if field in header_map:
-                        target_cell = ws[f"{header_map[field]}{row[0].row}"]
-                        if (target_cell.value is None or str(target_cell.value).strip() == "") and value not in [None, ""]:
-                            target_cell.value = value
-                filled_rows += 1
+        )
 
         if filled_rows > 0:
             st.success(f"✅ Filled data for {filled_rows} rows in your Excel template.")
         else:
             st.warning("⚠️ No matching Shipping Bill Numbers found in extracted data.")
 
-        # Save filled Excel
-        filled_excel = BytesIO()
-        wb.save(filled_excel)
-        filled_excel.seek(0)
-
         # Show preview
-        st.dataframe(pd.read_excel(filled_excel))
+        st.dataframe(filled_preview)
 
         st.download_button(
             label="⬇️ Download Filled Excel",
-            data=filled_excel,
+            data=filled_excel_bytes,
             file_name="Filled_SB_Data_Formatted.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
-    else:
+    elif sb_list is not None:
         st.error("❌ No extracted data available to fill into the template.")
 
 #######################################################################################################################################
@@ -527,88 +524,60 @@ uploaded_sih = st.file_uploader(
     key="sih_excel"
 )
 
-if uploaded_sih and effective_combined_df is not None and not effective_combined_df.empty:
-    # --- Read SIH without assuming header ---
-    sih_df = pd.read_excel(uploaded_sih, sheet_name="SIH", header=None)
 
-    # --- Find header row in first 5 rows ---
-    header_row_index = None
-    for i in range(5):
-        row_values = sih_df.iloc[i].astype(str).str.strip().tolist()
-        if any("Invoice Id" in val for val in row_values):
-            header_row_index = i
-            break
+def fill_sih_bytes(filled_bytes, sih_df):
+    """Add SIH data to the filled template; returns (final workbook bytes, SihJoinReport)."""
+    # --- Continue from the template already filled with extracted PDF data ---
+    wb = load_workbook(BytesIO(filled_bytes))
+    ws = wb.active
+
+    # --- Fill SIH data (indexed join planned up front, then written in one pass) ---
+    sih_updates, sih_report = plan_sih_updates(ws, sih_df)
+    apply_updates(ws, sih_updates)
+
+    final_excel = BytesIO()
+    wb.save(final_excel)
+    return final_excel.getvalue(), sih_report
+
+
+if uploaded_sih and filled_excel_bytes is None:
+    st.info("Fill a template above first; SIH data is added to the filled template.")
+
+if uploaded_sih and filled_excel_bytes is not None:
+    sih_bytes = uploaded_sih.getvalue()
+    sih_key = content_key("sih", sih_bytes)
+    sih_df, header_row_index = session_memo("sih", sih_key, lambda: read_sih_frame(BytesIO(sih_bytes)))
 
     if header_row_index is not None:
-        # Set proper headers
-        sih_df.columns = sih_df.iloc[header_row_index]
-        sih_df = sih_df.iloc[header_row_index + 1:].reset_index(drop=True)
         st.success(f"✅ SIH header found at row {header_row_index + 1}")
 
-        # Normalize SIH headers
-        sih_df.columns = sih_df.columns.astype(str).str.strip().str.lower()
-
-        # --- Load template Excel ---
-        in_memory_file.seek(0)
-        wb = load_workbook(in_memory_file)
-        ws = wb.active
+        final_excel_bytes, sih_report = session_memo(
+            "sih_filled",
+            content_key(sih_key, hashlib.sha256(filled_excel_bytes).hexdigest()),
+            lambda: fill_sih_bytes(filled_excel_bytes, sih_df),
+        )
+        filled_sih_rows = sih_report.filled_rows
 
-        # Normalize template headers
-        header_map = {str(cell.value).strip().lower(): cell.column_letter for cell in ws[1] if cell.value}
-
-        # --- Mapping SIH columns to template headers ---
-        sih_mapping = {
-            "invoice id": "invoice no",
-            "due date": "due date",
-            "usd": "realized amount in remittance currency",
-            "amount": "realized amount in invoice currency",
-            "drawee name": "drawee name",
-            "drawee address": "drawee address"
-            # Add more fields here if needed
-        }
-
-        # --- Fill extracted PDF data first ---
-        for row_idx, row_data in effective_combined_df.iterrows():
-            excel_row = row_idx + 2  # Assuming template starts at row 2
-            for col_name in effective_combined_df.columns:
-                col_key = col_name.strip().lower()
-                if col_key in header_map:
-                    ws[f"{header_map[col_key]}{excel_row}"].value = row_data[col_name]
-
-        # --- Fill SIH data ---
-        filled_sih_rows = 0
-        for row in ws.iter_rows(min_row=2, max_row=ws.max_row):
-            inv_no_cell_letter = header_map.get("invoice no")
-            if not inv_no_cell_letter:
-                continue  # Skip if invoice no column not found
-
-            inv_no_cell = ws[f"{inv_no_cell_letter}{row[0].row}"]
-            inv_no = str(inv_no_cell.value).strip() if inv_no_cell.value else None
-
-            if inv_no and inv_no in sih_df["invoice id"].values:
-                sih_row = sih_df[sih_df["invoice id"] == inv_no].iloc[0]
-
-                for sih_col, template_col in sih_mapping.items():
-                    template_col_letter = header_map.get(template_col.lower())
-                    if template_col_letter and sih_col in sih_row and pd.notna(sih_row[sih_col]):
-                        target_cell = ws[f"{template_col_letter}{row[0].row}"]
-
-                        # Convert due date to datetime if needed
-                        if sih_col.lower() == "due date":
-                            target_cell.value = pd.to_datetime(sih_row[sih_col])
-                        else:
-                            target_cell.value = sih_row[sih_col]
-                filled_sih_rows += 1
+        if sih_report.duplicate_ids:
+            st.warning(
+                f"⚠️ {len(sih_report.duplicate_ids)} invoice id(s) appear more than once in the SIH file; "
+                "the first line was used."
+            )
+            with st.expander("Duplicate SIH invoice ids"):
+                st.dataframe(pd.DataFrame(
+                    sorted(sih_report.duplicate_ids.items()), columns=["invoice id", "SIH lines"]
+                ))
+        if sih_report.missing_ids:
+            st.warning(f"⚠️ {len(sih_report.missing_ids)} template invoice number(s) not found in the SIH file.")
+            with st.expander("Invoice numbers missing from SIH"):
+                st.dataframe(pd.DataFrame({"invoice no": sih_report.missing_ids}))
 
         st.success(f"✅ Filled SIH remittance data for {filled_sih_rows} rows.")
 
         # --- Save updated Excel ---
-        final_excel = BytesIO()
-        wb.save(final_excel)
-        final_excel.seek(0)
         st.download_button(
             label="⬇️ Download Template with Extracted & SIH Data Filled",
-            data=final_excel,
+            data=final_excel_bytes,
             file_name="Filled_SB_Data_with_SIH.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
@@ -616,3 +585,14 @@ if uploaded_sih and effective_combined_df is not None and not effective_combined
     else:
         st.warning("⚠️ Could not find 'Invoice Id' in the first 5 rows of SIH file.")
 
+# Rendered last, so a profile taken during this run is offered straight away
+for label, profile in st.session_state.get("profiles", {}).items():
+    st.sidebar.download_button(
+        f"⬇️ Download {label} extraction profile",
+        data=profile["data"],
+        file_name=f"{label}_extraction.prof",
+        mime="application/octet-stream",
+        key=f"profile_{label}",
+    )
+    with st.sidebar.expander(f"Top functions, {label} extraction"):
+        st.code(profile["stats"])
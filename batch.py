@@ -0,0 +1,373 @@
+"""
+Batch extraction over many PDFs, optionally spread across worker processes.
+
+Each file runs the usual extract_sb_data -> extract_invoice_tables ->
+extract_invoice_details_from_all_pages chain. Results come back in the same
+order the files were given, and a failing file is reported instead of
+aborting the whole batch.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from accumulator import RecordBatchAccumulator
+from extraction import (
+    LayoutTemplate,
+    ParsedDocument,
+    RECORD_COLUMNS,
+    extract_sb_data,
+    extract_invoice_tables,
+    extract_invoice_details_from_all_pages,
+    iter_invoice_tables,
+    print_page_stats,
+)
+from extraction_cache import hash_pdf
+from instrumentation import collect, count, log_file_result, merge, stage
+
+# index: position in the input list, source: the path passed in (None for
+# in-memory input, so PDF bytes are not sent back from worker processes),
+# rows: extracted DataFrame (empty on failure), error: message or None,
+# cached: True when the rows came from the extraction cache,
+# stats: ParsedDocument.page_stats() for parsed files, None otherwise,
+# metrics: instrumentation.StageMetrics.to_dict() of the file's extraction
+FileResult = namedtuple(
+    "FileResult", ["index", "source", "rows", "error", "cached", "stats", "metrics"], defaults=(None,)
+)
+
+# Result of extract_pdf for a single file. tables is None when the file was
+# extracted in layout-template or page-streaming mode, neither of which keeps
+# full page tables.
+PdfExtraction = namedtuple("PdfExtraction", ["rows", "tables", "cached", "stats"])
+
+# SB-level columns that are only on an SB's first row and carried down to its invoices
+SB_FILL_COLUMNS = [
+    "PORT CODE(FROM)", "SHIPPINGBILL NO", "SHIPPING BILL DATE", "IE CODE",
+    "GSTIN/TYPE", "CB CODE", "FINAL DESTINATION"
+]
+
+# A single PDF is only split across processes from this many pages up, and
+# each worker gets at least PAGE_CHUNK_MIN pages; below that, starting the
+# workers costs more than it saves
+PAGE_PARALLEL_MIN_PAGES = 16
+PAGE_CHUNK_MIN = 8
+
+# One LayoutTemplate per process, so each worker learns the layout once and
+# reuses it for every file it handles
+_process_layout_template = None
+
+
+def process_layout_template():
+    global _process_layout_template
+    if _process_layout_template is None:
+        _process_layout_template = LayoutTemplate()
+    return _process_layout_template
+
+
+def default_worker_count():
+    return os.cpu_count() or 1
+
+
+def _page_ranges(page_count, chunks, min_pages=PAGE_CHUNK_MIN):
+    """Split range(page_count) into at most chunks contiguous ranges of at least min_pages pages."""
+    chunks = max(1, min(chunks, page_count // min_pages))
+    size, extra = divmod(page_count, chunks)
+    ranges, start = [], 0
+    for k in range(chunks):
+        stop = start + size + (1 if k < extra else 0)
+        ranges.append(range(start, stop))
+        start = stop
+    return ranges
+
+
+def _invoice_tables_for_range(pdf_source, start, stop):
+    # Opens the PDF itself and extracts one page range
+    with ParsedDocument(pdf_source) as doc:
+        pairs = list(iter_invoice_tables(doc, pages=range(start, stop)))
+        stats = doc.page_stats()
+    return pairs, stats
+
+
+def _invoice_tables_for_range_in_worker(pdf_source, start, stop):
+    # Worker processes collect their own stage timings and send them back
+    with collect() as metrics:
+        pairs, stats = _invoice_tables_for_range(pdf_source, start, stop)
+    return pairs, stats, metrics.to_dict()
+
+
+def extract_invoice_tables_parallel(pdf_path, workers, page_count=None):
+    """
+    extract_invoice_tables for a single PDF with its pages split into
+    contiguous ranges, each handled by a worker process that opens the PDF on
+    its own. Tables are merged back in page order, so sheet names and
+    everything downstream are unchanged. Returns (tables_dict, stats) with
+    stats shaped like ParsedDocument.page_stats().
+
+    Paths are reopened by each worker; bytes are sent to each worker, and
+    buffers or file objects are read into bytes first.
+    """
+    source = pdf_path
+    if hasattr(source, "read"):
+        position = source.tell()
+        source.seek(0)
+        source = source.read()
+        pdf_path.seek(position)
+    elif isinstance(source, (bytearray, memoryview)):
+        source = bytes(source)
+    if page_count is None:
+        with ParsedDocument(source) as doc:
+            page_count = doc.page_count
+
+    ranges = _page_ranges(page_count, workers * 2)
+    if len(ranges) == 1:
+        results = [_invoice_tables_for_range(source, 0, page_count)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+            futures = [
+                pool.submit(_invoice_tables_for_range_in_worker, source, r.start, r.stop) for r in ranges
+            ]
+            results = []
+            for future in futures:
+                # Stage times of the ranges are summed, so they can exceed the wall time
+                pairs, range_stats, range_metrics = future.result()
+                merge(range_metrics)
+                results.append((pairs, range_stats))
+
+    tables_dict = {}
+    stats = {"pages": page_count, "table_pages": 0, "skipped_pages": 0, "region_pages": 0}
+    for pairs, range_stats in results:
+        tables_dict.update(pairs)
+        for key in ("table_pages", "skipped_pages"):
+            stats[key] += range_stats[key]
+    print_page_stats(stats)
+    return tables_dict, stats
+
+
+def extract_pdf(pdf_path, cache=None, layout_template=None, stream_pages=False, page_workers=1):
+    """
+    Run the full extraction chain on one PDF (a path, bytes, buffer or file
+    object) and return a PdfExtraction.
+    With an ExtractionCache, a PDF whose bytes were seen before is answered
+    from the cache without parsing it. With a LayoutTemplate, invoice fields
+    are read from learned page regions instead of full tables. With
+    stream_pages, invoice pages are read one at a time and dropped, so memory
+    does not grow with the page count. page_workers > 1 splits the pages of a
+    PDF with at least PAGE_PARALLEL_MIN_PAGES pages across that many
+    processes (not combined with a LayoutTemplate; replaces stream_pages).
+    """
+    key = None
+    if cache is not None:
+        with stage("cache"):
+            key = cache.key_for(hash_pdf(pdf_path))
+            hit = cache.get(key)
+        # Layout-template and page-streaming runs cache no page tables, so a
+        # run that returns them parses the PDF again and replaces the entry
+        needs_tables = layout_template is None and not stream_pages
+        if hit is not None and (hit[1] is not None or not needs_tables):
+            count("cache_hits")
+            rows, tables_dict = hit
+            return PdfExtraction(rows, tables_dict, True, None)
+
+    with ParsedDocument(pdf_path, layout_template=layout_template) as doc:
+        sb_df = extract_sb_data(doc)
+        stats = None
+        if layout_template is not None:
+            invoice_tables_dict = None
+            rows = extract_invoice_details_from_all_pages(doc, sb_df=sb_df)
+        elif page_workers > 1 and doc.page_count >= PAGE_PARALLEL_MIN_PAGES:
+            invoice_tables_dict, stats = extract_invoice_tables_parallel(
+                pdf_path, page_workers, page_count=doc.page_count
+            )
+            rows = extract_invoice_details_from_all_pages(invoice_tables_dict, sb_df=sb_df)
+        elif stream_pages:
+            invoice_tables_dict = None
+            rows = extract_invoice_details_from_all_pages(iter_invoice_tables(doc), sb_df=sb_df)
+        else:
+            invoice_tables_dict = extract_invoice_tables(doc)
+            rows = extract_invoice_details_from_all_pages(invoice_tables_dict, sb_df=sb_df)
+        stats = stats or doc.page_stats()
+
+    if cache is not None:
+        with stage("cache"):
+            cache.put(key, rows, invoice_tables_dict)
+    return PdfExtraction(rows, invoice_tables_dict, False, stats)
+
+
+def _source_label(pdf_path):
+    return pdf_path if isinstance(pdf_path, (str, os.PathLike)) else None
+
+
+def extract_one(index, pdf_path, cache=None, use_layout_template=False, stream_pages=False, page_workers=1):
+    """
+    extract_pdf for one file of a batch, run inside a worker. Returns a
+    FileResult; errors are reported in it so one bad PDF never takes the
+    batch down.
+    """
+    source = _source_label(pdf_path)
+    with collect() as metrics:
+        try:
+            layout_template = process_layout_template() if use_layout_template else None
+            extraction = extract_pdf(
+                pdf_path,
+                cache=cache,
+                layout_template=layout_template,
+                stream_pages=stream_pages,
+                page_workers=page_workers,
+            )
+        except Exception as e:
+            return FileResult(
+                index, source, pd.DataFrame(), f"{type(e).__name__}: {e}", False, None, metrics.to_dict()
+            )
+    return FileResult(
+        index, source, extraction.rows, None, extraction.cached, extraction.stats, metrics.to_dict()
+    )
+
+
+def iter_extract(pdf_paths, workers=1, on_progress=None, cache=None, use_layout_template=False,
+                 stream_pages=False):
+    """
+    Yield a FileResult for each PDF in pdf_paths, in input order. Entries may
+    be paths or PDF bytes; with workers > 1 they must be picklable.
+
+    workers <= 1 runs in the calling process. Otherwise a process pool of that
+    size is used, with at most 2 * workers files in flight so memory stays
+    bounded on large batches; a batch of one file spreads that file's pages
+    over the workers instead (see extract_invoice_tables_parallel). on_progress(done, total, result) is called as
+    each result is yielded. cache is an optional ExtractionCache.
+    use_layout_template reads invoice fields through a per-process LayoutTemplate;
+    stream_pages is passed on to extract_pdf.
+    """
+    pdf_paths = list(pdf_paths)
+    total = len(pdf_paths)
+
+    def report(done, result):
+        log_file_result(result)
+        if on_progress is not None:
+            on_progress(done, total, result)
+
+    if workers <= 1 or total <= 1:
+        page_workers = workers if total == 1 and not use_layout_template else 1
+        for i, pdf_path in enumerate(pdf_paths):
+            result = extract_one(i, pdf_path, cache, use_layout_template, stream_pages, page_workers)
+            report(i + 1, result)
+            yield result
+        return
+
+    max_in_flight = workers * 2
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending = {}
+    isolated = {}  # file index -> the single-worker pool it runs alone in
+    next_submit = 0
+
+    def submit(i, alone=False):
+        if alone:
+            isolated[i] = ProcessPoolExecutor(max_workers=1)
+        target = isolated[i] if alone else pool
+        pending[i] = target.submit(extract_one, i, pdf_paths[i], cache, use_layout_template, stream_pages)
+
+    def renew_pool(broken=()):
+        # A dead worker breaks the whole pool: every future in it fails, and
+        # which file killed it is unknown. Each file that was in it runs again
+        # alone, so only the one that breaks its own pool as well is reported
+        # failed; new files go to a fresh shared pool.
+        nonlocal pool
+        pool.shutdown(wait=False, cancel_futures=True)
+        pool = ProcessPoolExecutor(max_workers=workers)
+        for i in list(broken) + [i for i in pending if i not in isolated]:
+            submit(i, alone=True)
+
+    def submit_more():
+        nonlocal next_submit
+        while next_submit < total and len(pending) < max_in_flight:
+            try:
+                submit(next_submit)
+            except BrokenProcessPool:
+                renew_pool()
+                continue
+            next_submit += 1
+
+    try:
+        submit_more()
+        for i in range(total):
+            while True:
+                future = pending.pop(i)
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    if i not in isolated:
+                        renew_pool([i])
+                        continue
+                    # Crashed its worker again, running alone
+                    result = FileResult(i, _source_label(pdf_paths[i]), pd.DataFrame(), f"{type(e).__name__}: {e}", False, None)
+                except Exception as e:
+                    result = FileResult(i, _source_label(pdf_paths[i]), pd.DataFrame(), f"{type(e).__name__}: {e}", False, None)
+                break
+            if i in isolated:
+                isolated.pop(i).shutdown(wait=False)
+            submit_more()
+            report(i + 1, result)
+            yield result
+    finally:
+        pool.shutdown()
+        for alone in isolated.values():
+            alone.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_batch(pdf_paths, workers=1, on_progress=None, cache=None, use_layout_template=False,
+                  stream_pages=False):
+    """
+    Extract every PDF and return (combined_df, failures), where failures is a
+    list of FileResult for files that raised. combined_df always has the
+    RECORD_COLUMNS schema.
+    """
+    accumulator = RecordBatchAccumulator()
+    failures = []
+    results = iter_extract(
+        pdf_paths,
+        workers=workers,
+        on_progress=on_progress,
+        cache=cache,
+        use_layout_template=use_layout_template,
+        stream_pages=stream_pages,
+    )
+    for result in results:
+        if result.error:
+            failures.append(result)
+        elif result.rows is not None and not result.rows.empty:
+            accumulator.append_frame(result.rows)
+    return accumulator.to_frame(), failures
+
+
+class CarryDown:
+    """
+    tidy_combined_rows for a batch that arrives file by file: SB-level values
+    carry on from the previous file's rows, so tidying each file in input
+    order gives the same rows as tidying the concatenated batch once.
+    """
+
+    def __init__(self):
+        self.last = {}
+
+    def tidy(self, rows):
+        rows = rows.reindex(columns=RECORD_COLUMNS)
+        if rows.empty:
+            return rows
+        for column in SB_FILL_COLUMNS:
+            filled = rows[column].ffill()
+            if column in self.last:
+                filled = filled.fillna(self.last[column])
+            rows[column] = filled
+            if filled.notna().any():
+                self.last[column] = filled.iloc[-1]
+        return rows[rows["INVOICE NO"].notna() & (rows["INVOICE NO"] != "")]
+
+
+def tidy_combined_rows(combined_df):
+    """
+    Carry SB-level columns down to every invoice row and drop rows without an
+    INVOICE NO, as shown and downloaded by the app. The result always has the
+    RECORD_COLUMNS schema, also for a PDF with invoice pages but no SB header.
+    """
+    return CarryDown().tidy(combined_df)
@@ -0,0 +1,76 @@
+"""
+Scaling benchmark: repeated pd.concat vs RecordBatchAccumulator.
+
+Simulates per-file extraction results (a few SB x invoice rows each) and times
+how long it takes to combine them for growing batch sizes. The accumulator
+should scale linearly with the number of files; repeated concat does not.
+
+    python benchmarks/bench_accumulator.py
+    python benchmarks/bench_accumulator.py --sizes 1000 10000 --max-concat 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from accumulator import RecordBatchAccumulator
+from extraction import RECORD_COLUMNS
+
+
+def make_file_frames(n_files, rows_per_file):
+    frames = []
+    for f in range(n_files):
+        rows = [
+            {col: f"{col[:4]}-{f}-{r}" for col in RECORD_COLUMNS}
+            for r in range(rows_per_file)
+        ]
+        frames.append(pd.DataFrame(rows, columns=RECORD_COLUMNS))
+    return frames
+
+
+def time_repeated_concat(frames):
+    start = time.perf_counter()
+    combined = pd.DataFrame()
+    for df in frames:
+        combined = pd.concat([combined, df], ignore_index=True)
+    return time.perf_counter() - start, len(combined)
+
+
+def time_accumulator(frames):
+    start = time.perf_counter()
+    accumulator = RecordBatchAccumulator()
+    for df in frames:
+        accumulator.append_frame(df)
+    combined = accumulator.to_frame()
+    return time.perf_counter() - start, len(combined)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 2500, 5000, 10000])
+    parser.add_argument("--rows-per-file", type=int, default=3)
+    parser.add_argument(
+        "--max-concat", type=int, default=5000,
+        help="Skip the repeated-concat baseline above this many files (it is quadratic)."
+    )
+    args = parser.parse_args(argv)
+
+    print(f"{'files':>8} {'rows':>8} {'concat s':>10} {'accum s':>10} {'accum us/file':>14}")
+    for n_files in args.sizes:
+        frames = make_file_frames(n_files, args.rows_per_file)
+        acc_time, rows = time_accumulator(frames)
+        if n_files <= args.max_concat:
+            concat_time, concat_rows = time_repeated_concat(frames)
+            assert concat_rows == rows
+            concat_col = f"{concat_time:10.3f}"
+        else:
+            concat_col = f"{'skipped':>10}"
+        print(f"{n_files:>8} {rows:>8} {concat_col} {acc_time:10.3f} {acc_time / n_files * 1e6:14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Memory benchmark: full-table extraction vs page streaming as page count grows.
+
+For each size a synthetic shipping bill is written and extracted in three
+fresh processes:
+  retain  every page's tables and pdfplumber layout objects kept until the
+          document closes (how extraction used to work);
+  tables  extract_invoice_tables: every page's DataFrame kept, layout
+          objects released page by page;
+  stream  iter_invoice_tables consumed by extract_invoice_details_from_all_pages:
+          only Page_1 and the invoice rows kept.
+The growth of the process's peak RSS during extraction is reported; with
+streaming it should stay flat as the page count grows.
+
+    python benchmarks/bench_page_memory.py
+    python benchmarks/bench_page_memory.py --pages 100 400 --tracemalloc
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+MODES = ("retain", "tables", "stream")
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(mode, pdf_path, use_tracemalloc=False):
+    """Extract pdf_path in this process; returns a dict of timings and memory."""
+    from extraction import (
+        PAGE_SKIP,
+        ParsedDocument,
+        extract_invoice_details_from_all_pages,
+        extract_invoice_tables,
+        extract_sb_data,
+        iter_invoice_tables,
+    )
+
+    if use_tracemalloc:
+        import tracemalloc
+
+        tracemalloc.start()
+    rss_before = peak_rss_bytes()
+    start = time.perf_counter()
+    with ParsedDocument(pdf_path) as doc:
+        sb_df = extract_sb_data(doc)
+        if mode == "retain":
+            pages = {
+                f"Page_{i + 1}": doc.page_frame(i)
+                for i in range(doc.page_count) if doc.classify_page(i) != PAGE_SKIP
+            }
+        elif mode == "tables":
+            pages = extract_invoice_tables(doc)
+        else:
+            pages = iter_invoice_tables(doc)
+        rows = extract_invoice_details_from_all_pages(pages, sb_df=sb_df)
+    result = {
+        "mode": mode,
+        "rows": len(rows),
+        "seconds": time.perf_counter() - start,
+        "rss_growth_mb": (peak_rss_bytes() - rss_before) / (1024 * 1024),
+    }
+    if use_tracemalloc:
+        result["traced_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return result
+
+
+def run_child(mode, pdf_path, use_tracemalloc):
+    command = [sys.executable, os.path.abspath(__file__), "--child", mode, pdf_path]
+    if use_tracemalloc:
+        command.append("--tracemalloc")
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 100, 200],
+                        help="invoice pages per synthetic bill")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="also report traced Python allocations (much slower)")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PDF"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        mode, pdf_path = args.child
+        print(json.dumps(measure(mode, pdf_path, args.tracemalloc)))
+        return
+
+    from synthetic_pdf import write_shipping_bill_pdf
+
+    header = f"{'pages':>6} {'mode':>7} {'rows':>6} {'seconds':>8} {'peak RSS +MB':>13}"
+    if args.tracemalloc:
+        header += f" {'traced MB':>10}"
+    print(header)
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_pages in args.pages:
+            pdf_path = write_shipping_bill_pdf(os.path.join(tmp, f"bill_{n_pages}.pdf"), invoices=n_pages)
+            for mode in MODES:
+                result = run_child(mode, pdf_path, args.tracemalloc)
+                line = (
+                    f"{n_pages:>6} {mode:>7} {result['rows']:>6} {result['seconds']:8.2f} "
+                    f"{result['rss_growth_mb']:13.1f}"
+                )
+                if args.tracemalloc:
+                    line += f" {result['traced_peak_mb']:10.1f}"
+                print(line)
+
+
+if __name__ == "__main__":
+    main()
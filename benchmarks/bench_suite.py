@@ -0,0 +1,234 @@
+"""
+Benchmark suite: every stage of a batch run on synthetic shipping bills.
+
+Generates a batch of synthetic PDFs offline (see synthetic_pdf.py), then
+times each stage and saves the results as JSON:
+  extract        iter_extract over every file (wall time); the extractors'
+                 own stages (text, classify, tables, country_match, ...) are
+                 reported separately, summed over files
+  merge          RecordBatchAccumulator + tidy_combined_rows
+  export_<fmt>   export_frame of the combined rows as xlsx, csv and parquet
+  fill_<n>       fill_template on an n-row template from n extracted rows
+  save_<n>       saving that filled workbook
+  sih_<n>        plan_sih_updates + apply_updates of an n-line SIH sheet
+Each stage is run --repeat times and the fastest run is kept. Run it on two
+commits and compare:
+
+    python benchmarks/bench_suite.py -o before.json
+    python benchmarks/bench_suite.py -o after.json --compare before.json
+    python benchmarks/bench_suite.py --files 50 --invoices 20 --fill-rows 1000 10000
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import pandas as pd
+from openpyxl import Workbook
+
+from accumulator import RecordBatchAccumulator
+from batch import iter_extract, tidy_combined_rows
+from export import EXPORT_FORMATS, export_frame
+from extraction import EXTRACTOR_VERSION, RECORD_COLUMNS
+from instrumentation import stage_totals
+from synthetic_pdf import write_batch
+from template_fill import apply_updates, fill_template, plan_sih_updates
+
+TEMPLATE_HEADERS = [
+    "SHIPPINGBILL NO", "INVOICE NO", "DRAWEE NAME", "DRAWEE ADDRESS", "PORT OF DESTINATION",
+    "FINAL DESTINATION", "DUE DATE", "Realized amount in remittance currency",
+    "Realized amount in invoice currency",
+]
+
+
+def best_of(repeat, func):
+    """(fastest seconds, result of the last run) over repeat calls of func()."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR, capture_output=True, text=True
+        ).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def fill_inputs(n_rows, invoices_per_sb=4):
+    """(extracted rows, template workbook, SIH frame) for an n_rows fill."""
+    sb_numbers = [str(2000000 + i // invoices_per_sb) for i in range(n_rows)]
+    invoice_numbers = [f"INV/{i:06d}" for i in range(n_rows)]
+    extracted = pd.DataFrame({col: [f"{col[:6]} {i}" for i in range(n_rows)] for col in RECORD_COLUMNS})
+    extracted["SHIPPINGBILL NO"] = sb_numbers
+    extracted["INVOICE NO"] = invoice_numbers
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(TEMPLATE_HEADERS)
+    for sb_number, invoice_number in zip(sb_numbers, invoice_numbers):
+        sheet.append([sb_number, invoice_number])
+
+    # SIH lines in reverse order, so the join cannot rely on matching positions
+    sih = pd.DataFrame({
+        "invoice id": invoice_numbers[::-1],
+        "due date": [f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}" for i in range(n_rows)],
+        "usd": [round(i * 1.5, 2) for i in range(n_rows)],
+        "amount": [round(i * 1.1, 2) for i in range(n_rows)],
+    })
+    return extracted, workbook, sih
+
+
+def run_extraction(args, tmp):
+    """Time the PDF stages. Returns (stage seconds, extractor stage totals, counts, combined rows)."""
+    stages = {}
+    stages["generate"], paths = best_of(1, lambda: write_batch(
+        os.path.join(tmp, "pdfs"), args.files, args.invoices, args.extra_pages
+    ))
+
+    def extract():
+        # The extractors print a line per page range; keep the report readable
+        with redirect_stdout(StringIO()):
+            return list(iter_extract(paths, workers=args.workers))
+
+    stages["extract"], results = best_of(args.repeat, extract)
+    failures = [result.error for result in results if result.error]
+    if failures:
+        raise RuntimeError(f"Synthetic PDFs failed to extract: {failures[:3]}")
+
+    def merge():
+        accumulator = RecordBatchAccumulator()
+        for result in results:
+            accumulator.append_frame(result.rows)
+        return tidy_combined_rows(accumulator.to_frame())
+
+    stages["merge"], combined = best_of(args.repeat, merge)
+    for fmt in EXPORT_FORMATS:
+        stages[f"export_{fmt}"], _ = best_of(args.repeat, lambda: export_frame(combined, fmt))
+
+    counts = {
+        "files": len(paths),
+        "pages": sum(result.stats["pages"] for result in results if result.stats),
+        "tables": sum((result.metrics or {}).get("counters", {}).get("tables_found", 0) for result in results),
+        "rows": len(combined),
+    }
+    return stages, stage_totals(results), counts, combined
+
+
+def run_fills(args):
+    """Time the template and SIH fills at each --fill-rows size."""
+    stages = {}
+    for n_rows in args.fill_rows:
+        fill_seconds = save_seconds = sih_seconds = None
+        for _ in range(args.repeat):
+            extracted, workbook, sih = fill_inputs(n_rows)
+            sheet = workbook.active
+
+            start = time.perf_counter()
+            report = fill_template(sheet, extracted)
+            elapsed = time.perf_counter() - start
+            fill_seconds = elapsed if fill_seconds is None else min(fill_seconds, elapsed)
+            if report.filled_rows != n_rows:
+                raise RuntimeError(f"fill_{n_rows}: filled {report.filled_rows} row(s)")
+
+            start = time.perf_counter()
+            updates, sih_report = plan_sih_updates(sheet, sih)
+            apply_updates(sheet, updates)
+            elapsed = time.perf_counter() - start
+            sih_seconds = elapsed if sih_seconds is None else min(sih_seconds, elapsed)
+            if sih_report.filled_rows != n_rows:
+                raise RuntimeError(f"sih_{n_rows}: filled {sih_report.filled_rows} row(s)")
+
+            start = time.perf_counter()
+            workbook.save(BytesIO())
+            elapsed = time.perf_counter() - start
+            save_seconds = elapsed if save_seconds is None else min(save_seconds, elapsed)
+        stages[f"fill_{n_rows}"] = fill_seconds
+        stages[f"sih_{n_rows}"] = sih_seconds
+        stages[f"save_{n_rows}"] = save_seconds
+        print(f"  fill {n_rows} rows: {fill_seconds:.2f}s, SIH {sih_seconds:.2f}s, save {save_seconds:.2f}s")
+    return stages
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('commit')}):")
+    print(f"{'stage':>24} {'before s':>10} {'after s':>10} {'ratio':>7}")
+    for group in ("stages", "extract_stages"):
+        for name, seconds in results[group].items():
+            before = baseline.get(group, {}).get(name)
+            if before is None:
+                continue
+            ratio = seconds / before if before else float("inf")
+            print(f"{name:>24} {before:10.3f} {seconds:10.3f} {ratio:7.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=20, help="synthetic PDFs in the batch")
+    parser.add_argument("--invoices", type=int, default=10, help="invoice pages per PDF")
+    parser.add_argument("--extra-pages", type=int, default=2, help="annexure pages per PDF (skipped by the extractor)")
+    parser.add_argument("--workers", type=int, default=1, help="extraction processes")
+    parser.add_argument("--fill-rows", type=int, nargs="*", default=[1000, 10000, 100000],
+                        help="template sizes for the fill stages")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest is kept")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="where to save the JSON results")
+    parser.add_argument("--compare", metavar="JSON", help="print ratios against an earlier results file")
+    args = parser.parse_args(argv)
+
+    commit, dirty = git_revision()
+    print(f"Extracting {args.files} synthetic PDF(s) x {args.invoices} invoice page(s)...")
+    with tempfile.TemporaryDirectory() as tmp:
+        stages, extract_stages, counts, _ = run_extraction(args, tmp)
+    for name, seconds in stages.items():
+        print(f"  {name}: {seconds:.2f}s")
+    print("Filling templates...")
+    stages.update(run_fills(args))
+
+    results = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "extractor_version": EXTRACTOR_VERSION,
+            "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "counts": counts,
+        "stages": stages,
+        "extract_stages": extract_stages,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
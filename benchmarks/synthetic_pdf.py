@@ -0,0 +1,158 @@
+"""
+Synthetic shipping-bill PDFs for benchmarks.
+
+Writes a minimal PDF by hand (no PDF library needed) with the layout the
+extractors expect: page 1 carries the SB-level text and a 30 x 30 grid with
+the port of destination in cell AD14, each invoice page carries the
+"PART - II - INVOICE DETAILS" marker and a grid with the invoice cells, and
+optional annexure pages have neither.
+
+    python benchmarks/synthetic_pdf.py out.pdf --invoices 200 --extra-pages 20
+    python benchmarks/synthetic_pdf.py out_dir --files 50 --invoices 10
+"""
+import argparse
+import os
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+GRID_LEFT, GRID_TOP, ROW_HEIGHT = 20, 700, 20
+# Columns holding long values are wider so their text stays inside the cell
+WIDE_COLUMNS = {2, 4, 9, 29}
+
+# (country as printed, port) pairs cycled through by write_batch; some
+# countries are misspelt the way scanned bills are, so fuzzy matching runs
+DESTINATIONS = [
+    ("SWEDN", "GOTHENBURG"), ("GERMANY", "HAMBURG"), ("UNITED STATE", "NEW YORK"),
+    ("NETHERLNDS", "ROTTERDAM"), ("SINGAPORE", "SINGAPORE"), ("UAE", "JEBEL ALI"),
+]
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _grid_page(lines, cells, rows=30, cols=30):
+    """Content stream: text lines at the top and a ruled grid with small text in the given cells."""
+    wide = WIDE_COLUMNS if cols == 30 else set()
+    narrow_width = (528 - 80 * len(wide)) / (cols - len(wide))
+    xs = [GRID_LEFT]
+    for c in range(cols):
+        xs.append(xs[-1] + (80 if c in wide else narrow_width))
+
+    ops = []
+    y = 820
+    for line in lines:
+        ops.append(f"BT /F1 8 Tf 20 {y} Td ({_escape(line)}) Tj ET")
+        y -= 12
+    ops.append("0.5 w")
+    for r in range(rows + 1):
+        yy = GRID_TOP - r * ROW_HEIGHT
+        ops.append(f"{GRID_LEFT} {yy} m {xs[-1]:.2f} {yy} l S")
+    for x in xs:
+        ops.append(f"{x:.2f} {GRID_TOP} m {x:.2f} {GRID_TOP - rows * ROW_HEIGHT} l S")
+    for (r, c), text in cells.items():
+        ops.append(
+            f"BT /F1 2.5 Tf {xs[c] + 1:.2f} {GRID_TOP - (r + 1) * ROW_HEIGHT + 6} Td ({_escape(text)}) Tj ET"
+        )
+    return "\n".join(ops)
+
+
+def _pdf_bytes(pages):
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, content in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(content.encode('latin-1'))} >>\nstream\n{content}\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def shipping_bill_pdf(invoices=3, extra_pages=0, sb_number="1234567", country="SWEDN", port="GOTHENBURG"):
+    """PDF bytes of a shipping bill with the given number of invoice and annexure pages."""
+    first_page = _grid_page(
+        [
+            "IEC/Br : 0512345678 GSTIN/TYPE : 33AAACA1234A1Z5 CB CODE : AAACB1234",
+            "13.COUNTRY OF FINALDESTINATIO",
+            country,
+            "Port Code SB No SB Date",
+            f"INMAA1 {sb_number} 12-JAN-24",
+        ],
+        {(12, 29): "PORT OF DISCHARGE", (13, 29): port},
+    )
+    pages = [first_page]
+    for k in range(invoices):
+        pages.append(_grid_page(
+            ["PART - II - INVOICE DETAILS"],
+            {
+                (11, 2): f"INV/{k:03d} 01/02/2024",
+                (12, 9): "2.BUYER'S NAME & ADDRESS",
+                (13, 9): f"BUYER {k} AB",
+                (14, 9): "STREET 1",
+                (15, 9): "CITY",
+                (28, 4): "STEEL PARTS",
+            },
+        ))
+    for _ in range(extra_pages):
+        pages.append(_grid_page(["ANNEXURE"], {(1, 1): "x"}, rows=5, cols=5))
+    return _pdf_bytes(pages)
+
+
+def write_shipping_bill_pdf(path, invoices=3, extra_pages=0, sb_number="1234567", **kwargs):
+    with open(path, "wb") as f:
+        f.write(shipping_bill_pdf(invoices, extra_pages, sb_number, **kwargs))
+    return path
+
+
+def write_batch(directory, files, invoices=3, extra_pages=0, first_sb_number=1000000):
+    """
+    Write files shipping bills SB_<number>.pdf into directory, with
+    consecutive SB numbers and destinations cycled from DESTINATIONS.
+    Returns the paths in order.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(files):
+        sb_number = str(first_sb_number + i)
+        country, port = DESTINATIONS[i % len(DESTINATIONS)]
+        paths.append(write_shipping_bill_pdf(
+            os.path.join(directory, f"SB_{sb_number}.pdf"), invoices, extra_pages, sb_number,
+            country=country, port=port,
+        ))
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="output PDF, or output directory with --files")
+    parser.add_argument("--invoices", type=int, default=3)
+    parser.add_argument("--extra-pages", type=int, default=0)
+    parser.add_argument("--sb-number", default="1234567")
+    parser.add_argument("--files", type=int, default=None, help="write this many PDFs into the path directory")
+    args = parser.parse_args(argv)
+    if args.files is not None:
+        paths = write_batch(args.path, args.files, args.invoices, args.extra_pages, int(args.sb_number))
+        print(f"Wrote {len(paths)} PDF(s) to {args.path}")
+        return
+    write_shipping_bill_pdf(args.path, args.invoices, args.extra_pages, args.sb_number)
+    print(f"Wrote {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+"""
+Headless batch runs of the SB extractor, for cron jobs and scripts.
+
+    python cli.py pdfs/ -o output
+    python cli.py "inbox/*.pdf" --template template.xlsx --sih sih.xlsx -o output
+    python cli.py pdfs/ --per-file --dry-run
+    python cli.py new_pdfs/ --store --template template.xlsx -o output
+    python cli.py pdfs/ --metrics-log metrics.jsonl --profile batch.prof
+    python cli.py drop/ --watch -o output
+    python cli.py drop/ --watch --report --format csv -o output
+
+Extracts every PDF into Combined_SB_Data.xlsx (or .csv / .parquet with
+--format), written file by file as the PDFs finish, then optionally fills the
+template and adds SIH remittance data, like the Streamlit app does. With
+--watch it keeps running instead, ingesting new or changed PDFs from the
+input directories into the local store as they arrive (see watch_folder.py),
+until Ctrl+C or SIGTERM (e.g. systemctl stop) ends it; --watch --report then writes the combined output from the store. pandas,
+pdfplumber and openpyxl are only imported once a stage needs them, so --help
+and --dry-run return straight away; nothing here needs a Streamlit runtime.
+"""
+import argparse
+import glob
+import os
+import signal
+import sys
+import threading
+import time
+
+COMBINED_FILE_STEM = "Combined_SB_Data"
+FILLED_FILE_NAME = "Filled_SB_Data_Formatted.xlsx"
+FILLED_SIH_FILE_NAME = "Filled_SB_Data_with_SIH.xlsx"
+WATCH_MANIFEST_NAME = "watch_manifest.json"
+
+
+def resolve_pdfs(inputs):
+    """PDF paths from files, directories (their *.pdf files) and glob patterns, in order, without repeats."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(
+                os.path.join(item, name) for name in os.listdir(item)
+                if name.lower().endswith(".pdf")
+            ))
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            paths.extend(sorted(p for p in glob.glob(item) if p.lower().endswith(".pdf")))
+    return list(dict.fromkeys(os.path.abspath(p) for p in paths))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Extract Shipping Bill data from PDFs and fill an Excel template, without the web UI."
+    )
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories of PDFs or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="output", help="where to write results (default: output)")
+    parser.add_argument("--template", help="Excel template with a 'SHIPPINGBILL NO' column to fill")
+    parser.add_argument("--sih", help="SIH Excel file whose remittance data is added to the filled template")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the on-disk extraction cache")
+    parser.add_argument("--layout-template", action="store_true", help="read invoice fields from learned page regions")
+    parser.add_argument(
+        "--stream-pages", action="store_true",
+        help="read invoice pages one at a time and free them, for very large bills"
+    )
+    parser.add_argument(
+        "--per-file", action="store_true",
+        help="also save each PDF's SB data and invoice tables under <output-dir>/<pdf name>/"
+    )
+    parser.add_argument(
+        "--format", choices=("xlsx", "csv", "parquet"), default="xlsx",
+        help="file format of the combined output (default: xlsx)"
+    )
+    parser.add_argument(
+        "--store", action="store_true",
+        help="save extracted rows to the local store and fill the template from it, "
+             "so bills extracted in earlier runs are filled too"
+    )
+    parser.add_argument("--metrics-log", help="append per-file stage timings to this file as JSON lines")
+    parser.add_argument(
+        "--profile",
+        help="write a cProfile dump of the run to this file (use --workers 1 to profile extraction itself)"
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="keep running: ingest new or changed PDFs from the input directories into the local store"
+    )
+    parser.add_argument("--once", action="store_true", help="with --watch, ingest what is there now and exit")
+    parser.add_argument(
+        "--report", action="store_true",
+        help="with --watch, write the combined output from the store for every ingested PDF, extract nothing"
+    )
+    parser.add_argument(
+        "--settle", type=float, default=2.0,
+        help="with --watch, seconds a PDF must stay unchanged before it is extracted (default: 2)"
+    )
+    parser.add_argument("--poll", type=float, default=5.0, help="with --watch, seconds between polls without file events")
+    parser.add_argument("--recursive", action="store_true", help="with --watch, also watch subdirectories")
+    parser.add_argument(
+        "--manifest",
+        help=f"with --watch, the manifest of ingested PDFs (default: <output-dir>/{WATCH_MANIFEST_NAME})"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="list the PDFs and outputs, extract nothing")
+    return parser
+
+
+def combined_output_path(args):
+    return os.path.join(args.output_dir, f"{COMBINED_FILE_STEM}.{args.format}")
+
+
+def planned_outputs(args):
+    outputs = [combined_output_path(args)]
+    if args.template:
+        outputs.append(os.path.join(args.output_dir, FILLED_SIH_FILE_NAME if args.sih else FILLED_FILE_NAME))
+    return outputs
+
+
+def open_store(args):
+    if not args.store:
+        return None
+    from record_store import RecordStore
+
+    return RecordStore()
+
+
+class CombinedOutput:
+    """
+    Takes each file's rows as it is extracted: tidies them, appends them to
+    the combined output file and the store (if enabled), and keeps them in
+    memory only when the template fill needs them afterwards. SB-level
+    values carry down across files, as in the app; the store gets each
+    file's rows tidied on their own, since it is keyed by PDF.
+    """
+
+    def __init__(self, args):
+        from accumulator import RecordBatchAccumulator
+        from batch import CarryDown
+        from export import RowWriter
+        from extraction import RECORD_COLUMNS
+
+        self.writer = RowWriter(combined_output_path(args), args.format, RECORD_COLUMNS)
+        self.store = open_store(args)
+        self.accumulator = RecordBatchAccumulator() if args.template and not args.store else None
+        self.carry_down = CarryDown()
+        self.timings = []  # FileResults without their rows, for the stage summary
+
+    def add(self, pdf_path, rows):
+        if self.store is not None:
+            from batch import tidy_combined_rows
+            from extraction_cache import hash_pdf
+
+            self.store.put_rows(hash_pdf(pdf_path), tidy_combined_rows(rows), os.path.basename(pdf_path))
+        rows = self.carry_down.tidy(rows)
+        self.writer.write_frame(rows)
+        if self.accumulator is not None:
+            self.accumulator.append_frame(rows)
+
+    def close(self):
+        """Finish the output file; returns the kept rows (None if not kept)."""
+        self.writer.close()
+        return self.accumulator.to_frame() if self.accumulator is not None else None
+
+
+def extract_combined(pdf_paths, args, output):
+    """Batch-extract every PDF into output (a CombinedOutput). Returns the number of failed files."""
+    from batch import default_worker_count, iter_extract
+    from extraction_cache import ExtractionCache
+
+    def on_progress(done, total, result):
+        status = f"❌ {result.error}" if result.error else ("♻️ cached" if result.cached else "✅")
+        print(f"[{done}/{total}] {os.path.basename(result.source)} {status}")
+
+    failed = 0
+    results = iter_extract(
+        pdf_paths,
+        workers=args.workers or default_worker_count(),
+        on_progress=on_progress,
+        cache=None if args.no_cache else ExtractionCache(),
+        use_layout_template=args.layout_template,
+        stream_pages=args.stream_pages,
+    )
+    for result in results:
+        output.timings.append(result._replace(rows=None))
+        if result.error:
+            failed += 1
+            continue
+        try:
+            output.add(result.source, result.rows)
+        except Exception as e:
+            print(f"❌ {os.path.basename(result.source)}: {type(e).__name__}: {e}")
+            failed += 1
+    return failed
+
+
+def extract_per_file(pdf_paths, args, output):
+    """
+    Extract the PDFs one at a time, saving each one's SB data and invoice
+    tables with save_sb_and_tables. Same result as extract_combined.
+    """
+    from batch import FileResult, extract_pdf, process_layout_template
+    from extraction import save_sb_and_tables
+    from extraction_cache import ExtractionCache
+    from instrumentation import collect, log_file_result
+
+    cache = None if args.no_cache else ExtractionCache()
+    layout_template = process_layout_template() if args.layout_template else None
+    failed = 0
+    for i, pdf_path in enumerate(pdf_paths, start=1):
+        name = os.path.splitext(os.path.basename(pdf_path))[0]
+        print(f"[{i}/{len(pdf_paths)}] {os.path.basename(pdf_path)}")
+        try:
+            with collect() as metrics:
+                extraction = extract_pdf(pdf_path, cache=cache, layout_template=layout_template)
+        except Exception as e:
+            print(f"❌ {type(e).__name__}: {e}")
+            failed += 1
+            continue
+        timing = FileResult(i - 1, pdf_path, None, None, extraction.cached, extraction.stats, metrics.to_dict())
+        log_file_result(timing)
+        output.timings.append(timing)
+        file_dir = os.path.join(args.output_dir, name)
+        try:
+            save_sb_and_tables(
+                extraction.rows,
+                extraction.tables,
+                os.path.join(file_dir, "SB_Data.xlsx"),
+                os.path.join(file_dir, "Invoice_Tables.xlsx"),
+            )
+            output.add(pdf_path, extraction.rows)
+        except Exception as e:
+            print(f"❌ {type(e).__name__}: {e}")
+            failed += 1
+    return failed
+
+
+def fill_outputs(combined_df, args):
+    """Fill the template (and SIH data, if given) and save it. Returns the saved path."""
+    from openpyxl import load_workbook
+    from template_fill import apply_updates, fill_template, plan_sih_updates, read_sih_frame
+
+    if args.store:
+        import pandas as pd
+
+        template_df = pd.read_excel(args.template)
+        sb_column = template_df.get("SHIPPINGBILL NO", pd.Series(dtype=object))
+        sb_numbers = sb_column.dropna().astype(str).str.strip().unique()
+        combined_df = open_store(args).rows_for_shipping_bills(sb_numbers)
+        print(f"🗄️ {len(combined_df)} stored row(s) for {len(sb_numbers)} Shipping Bill(s) in the template.")
+
+    wb = load_workbook(args.template)
+    ws = wb.active
+    fill_report = fill_template(ws, combined_df)
+    print(
+        f"🧾 Template: {fill_report.filled_rows} row(s) filled "
+        f"({fill_report.pair_matches} on SB + invoice, {fill_report.sb_matches} on SB only), "
+        f"{fill_report.cells_written} cell(s) written."
+    )
+    output_path = os.path.join(args.output_dir, FILLED_FILE_NAME)
+
+    if args.sih:
+        sih_df, header_row_index = read_sih_frame(args.sih)
+        if header_row_index is None:
+            print("⚠️ Could not find 'Invoice Id' in the first 5 rows of SIH file.")
+        else:
+            sih_updates, sih_report = plan_sih_updates(ws, sih_df)
+            apply_updates(ws, sih_updates)
+            print(
+                f"💵 SIH: {sih_report.filled_rows} row(s) filled, "
+                f"{len(sih_report.duplicate_ids)} duplicate id(s), {len(sih_report.missing_ids)} missing."
+            )
+            output_path = os.path.join(args.output_dir, FILLED_SIH_FILE_NAME)
+
+    wb.save(output_path)
+    return output_path
+
+
+def watch_manifest_path(args):
+    return args.manifest or os.path.join(args.output_dir, WATCH_MANIFEST_NAME)
+
+
+def watch(args):
+    """--watch: ingest the input directories (or, with --report, export what was ingested)."""
+    from record_store import RecordStore
+    from watch_folder import FolderWatcher, Manifest, export_ingested
+
+    directories = [item for item in args.inputs if os.path.isdir(item)]
+    if len(directories) != len(args.inputs):
+        print("⚠️ --watch needs directories as inputs.")
+        return 1
+    manifest_path = watch_manifest_path(args)
+    if args.dry_run:
+        action = "Would export the PDFs listed in" if args.report else "Would watch and record them in"
+        print(f"{action} {manifest_path}:")
+        for directory in directories:
+            print(f"  {os.path.abspath(directory)}")
+        return 0
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest = Manifest(manifest_path)
+    store = RecordStore()
+    if args.report:
+        row_count = export_ingested(manifest, store, combined_output_path(args), args.format)
+        print(f"📊 {row_count} row(s) from {len(manifest.hashes())} PDF(s) saved to: {combined_output_path(args)}")
+        return 0
+
+    from batch import default_worker_count
+    from extraction_cache import ExtractionCache
+
+    watcher = FolderWatcher(
+        directories,
+        store,
+        manifest,
+        workers=args.workers or default_worker_count(),
+        cache=None if args.no_cache else ExtractionCache(),
+        use_layout_template=args.layout_template,
+        stream_pages=args.stream_pages,
+        settle_seconds=args.settle,
+        recursive=args.recursive,
+    )
+    # SIGTERM stops the watcher the way Ctrl+C does, so the file being
+    # extracted is abandoned and the pool shut down instead of left behind
+    handles_sigterm = threading.current_thread() is threading.main_thread()
+    if handles_sigterm:
+        previous_handler = signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        watcher.run(once=args.once, poll_seconds=args.poll)
+    finally:
+        if handles_sigterm:
+            signal.signal(signal.SIGTERM, previous_handler)
+    return 0
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    """Run the CLI; returns the process exit code (1 if no PDFs were found or any file failed)."""
+    args = build_parser().parse_args(argv)
+    if args.watch:
+        from instrumentation import log_to_file
+
+        if args.metrics_log:
+            log_to_file(args.metrics_log)
+        return watch(args)
+
+    pdf_paths = resolve_pdfs(args.inputs)
+    if not pdf_paths:
+        print("⚠️ No PDF files found.")
+        return 1
+
+    if args.dry_run:
+        print(f"Would extract {len(pdf_paths)} PDF(s):")
+        for path in pdf_paths:
+            print(f"  {path}")
+        print("Would write:")
+        for path in planned_outputs(args):
+            print(f"  {path}")
+        if args.per_file:
+            print(f"  plus SB_Data.xlsx / Invoice_Tables.xlsx per PDF under {args.output_dir}")
+        return 0
+
+    from instrumentation import log_to_file, profile_to
+
+    if args.metrics_log:
+        log_to_file(args.metrics_log)
+    if args.profile:
+        with profile_to(args.profile):
+            exit_code = run(pdf_paths, args)
+        print(f"🔬 Profile saved to: {args.profile}")
+        return exit_code
+    return run(pdf_paths, args)
+
+
+def print_stage_totals(timings):
+    from instrumentation import stage_totals
+
+    totals = stage_totals(timings)
+    if totals:
+        print("⏱️ Stage totals: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in totals.items()))
+
+
+def run(pdf_paths, args):
+    """Extract, save and fill; returns the exit code."""
+    start = time.perf_counter()
+    os.makedirs(args.output_dir, exist_ok=True)
+    output = CombinedOutput(args)
+    try:
+        if args.per_file:
+            failed = extract_per_file(pdf_paths, args, output)
+        else:
+            failed = extract_combined(pdf_paths, args, output)
+    finally:
+        combined_df = output.close()
+    print_stage_totals(output.timings)
+
+    combined_path = combined_output_path(args)
+    if output.writer.row_count == 0:
+        os.remove(combined_path)
+        print("⚠️ No SB Data found in the PDFs.")
+    else:
+        print(f"📊 {output.writer.row_count} row(s) saved to: {combined_path}")
+
+    if args.template:
+        if output.writer.row_count == 0 and not args.store:
+            print("❌ No extracted data available to fill into the template.")
+        else:
+            print(f"✅ Filled template saved to: {fill_outputs(combined_df, args)}")
+
+    print(f"⏱️ Done in {time.perf_counter() - start:.1f}s ({failed} failed file(s)).")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,567 @@
+"""
+Country and port reference data, and a resolver for the destination fields.
+
+FINAL DESTINATION and PORT OF DESTINATION come off the bill as free text
+with OCR-style misspellings ("SWEDN", "UNITED STATE", "NHAVA SHEVA").
+resolve_country and resolve_port map such text to one canonical name.
+Exact names, aliases and codes are a dict lookup. Anything else goes to a
+trigram index (Dice similarity over padded character trigrams), which picks
+a short list of names for difflib to score, so fuzzy matching no longer
+compares the text against every name. A fuzzy match needs both a close
+difflib score and real trigram overlap; when there is none the resolvers
+return None and the caller keeps the raw text. Results are memoized in a bounded
+LRU, so a batch full of the same destinations pays for each string once.
+"""
+import re
+from collections import namedtuple
+from difflib import get_close_matches
+from functools import lru_cache
+
+# Distinct strings remembered per resolver
+MEMO_SIZE = 4096
+
+# Names scored by difflib per fuzzy lookup, after the trigram index
+SHORTLIST_SIZE = 8
+
+# Minimum difflib similarity for a fuzzy match. Loose cutoffs turn other
+# words on the bill into places (HAMBURG -> LUXEMBOURG, EXPORTER -> PORTUGAL);
+# unresolved text is kept as it is, a wrong place is worse.
+COUNTRY_CUTOFF = 0.85
+PORT_CUTOFF = 0.85
+
+# Minimum trigram (Dice) similarity for a name to be scored at all
+MIN_TRIGRAM_SIMILARITY = 0.5
+
+# Alpha-3 codes that are also words or abbreviations found on a bill; they
+# only match as part of a country name, never on their own
+_WORD_CODES = {
+    "AND", "ARE", "ARM", "BEN", "CAN", "COD", "COG", "COM", "CUB", "DOM", "EST", "FIN", "GAB",
+    "GEO", "GIN", "GUM", "GUY", "JAM", "LIE", "MAC", "MAR", "NOR", "PAN", "SEN", "TON", "VAT",
+}
+
+# ISO 3166-1: alpha-2 | alpha-3 | name used in the output | other names
+_COUNTRY_TABLE = """
+AF|AFG|AFGHANISTAN|
+AX|ALA|ALAND ISLANDS|
+AL|ALB|ALBANIA|
+DZ|DZA|ALGERIA|
+AS|ASM|AMERICAN SAMOA|
+AD|AND|ANDORRA|
+AO|AGO|ANGOLA|
+AI|AIA|ANGUILLA|
+AQ|ATA|ANTARCTICA|
+AG|ATG|ANTIGUA AND BARBUDA|ANTIGUA
+AR|ARG|ARGENTINA|
+AM|ARM|ARMENIA|
+AW|ABW|ARUBA|
+AU|AUS|AUSTRALIA|
+AT|AUT|AUSTRIA|
+AZ|AZE|AZERBAIJAN|
+BS|BHS|BAHAMAS|THE BAHAMAS
+BH|BHR|BAHRAIN|
+BD|BGD|BANGLADESH|
+BB|BRB|BARBADOS|
+BY|BLR|BELARUS|
+BE|BEL|BELGIUM|
+BZ|BLZ|BELIZE|
+BJ|BEN|BENIN|
+BM|BMU|BERMUDA|
+BT|BTN|BHUTAN|
+BO|BOL|BOLIVIA|PLURINATIONAL STATE OF BOLIVIA
+BQ|BES|BONAIRE SINT EUSTATIUS AND SABA|BONAIRE
+BA|BIH|BOSNIA AND HERZEGOVINA|BOSNIA
+BW|BWA|BOTSWANA|
+BV|BVT|BOUVET ISLAND|
+BR|BRA|BRAZIL|BRASIL
+IO|IOT|BRITISH INDIAN OCEAN TERRITORY|
+BN|BRN|BRUNEI|BRUNEI DARUSSALAM
+BG|BGR|BULGARIA|
+BF|BFA|BURKINA FASO|
+BI|BDI|BURUNDI|
+CV|CPV|CABO VERDE|CAPE VERDE
+KH|KHM|CAMBODIA|
+CM|CMR|CAMEROON|
+CA|CAN|CANADA|
+KY|CYM|CAYMAN ISLANDS|
+CF|CAF|CENTRAL AFRICAN REPUBLIC|
+TD|TCD|CHAD|
+CL|CHL|CHILE|
+CN|CHN|CHINA|PEOPLES REPUBLIC OF CHINA;PR CHINA
+CX|CXR|CHRISTMAS ISLAND|
+CC|CCK|COCOS KEELING ISLANDS|COCOS ISLANDS
+CO|COL|COLOMBIA|
+KM|COM|COMOROS|
+CG|COG|CONGO|REPUBLIC OF THE CONGO;CONGO BRAZZAVILLE
+CD|COD|DEMOCRATIC REPUBLIC OF THE CONGO|DR CONGO;CONGO KINSHASA;ZAIRE
+CK|COK|COOK ISLANDS|
+CR|CRI|COSTA RICA|
+CI|CIV|COTE D IVOIRE|IVORY COAST;COTE DIVOIRE
+HR|HRV|CROATIA|
+CU|CUB|CUBA|
+CW|CUW|CURACAO|
+CY|CYP|CYPRUS|
+CZ|CZE|CZECH REPUBLIC|CZECHIA
+DK|DNK|DENMARK|
+DJ|DJI|DJIBOUTI|
+DM|DMA|DOMINICA|
+DO|DOM|DOMINICAN REPUBLIC|
+EC|ECU|ECUADOR|
+EG|EGY|EGYPT|
+SV|SLV|EL SALVADOR|
+GQ|GNQ|EQUATORIAL GUINEA|
+ER|ERI|ERITREA|
+EE|EST|ESTONIA|
+SZ|SWZ|ESWATINI|SWAZILAND
+ET|ETH|ETHIOPIA|
+FK|FLK|FALKLAND ISLANDS|
+FO|FRO|FAROE ISLANDS|
+FJ|FJI|FIJI|
+FI|FIN|FINLAND|
+FR|FRA|FRANCE|
+GF|GUF|FRENCH GUIANA|
+PF|PYF|FRENCH POLYNESIA|
+TF|ATF|FRENCH SOUTHERN TERRITORIES|
+GA|GAB|GABON|
+GM|GMB|GAMBIA|THE GAMBIA
+GE|GEO|GEORGIA|
+DE|DEU|GERMANY|DEUTSCHLAND
+GH|GHA|GHANA|
+GI|GIB|GIBRALTAR|
+GR|GRC|GREECE|
+GL|GRL|GREENLAND|
+GD|GRD|GRENADA|
+GP|GLP|GUADELOUPE|
+GU|GUM|GUAM|
+GT|GTM|GUATEMALA|
+GG|GGY|GUERNSEY|
+GN|GIN|GUINEA|
+GW|GNB|GUINEA BISSAU|
+GY|GUY|GUYANA|
+HT|HTI|HAITI|
+HM|HMD|HEARD ISLAND AND MCDONALD ISLANDS|
+VA|VAT|HOLY SEE|VATICAN;VATICAN CITY
+HN|HND|HONDURAS|
+HK|HKG|HONG KONG|
+HU|HUN|HUNGARY|
+IS|ISL|ICELAND|
+IN|IND|INDIA|BHARAT
+ID|IDN|INDONESIA|
+IR|IRN|IRAN|ISLAMIC REPUBLIC OF IRAN
+IQ|IRQ|IRAQ|
+IE|IRL|IRELAND|EIRE
+IM|IMN|ISLE OF MAN|
+IL|ISR|ISRAEL|
+IT|ITA|ITALY|
+JM|JAM|JAMAICA|
+JP|JPN|JAPAN|
+JE|JEY|JERSEY|
+JO|JOR|JORDAN|
+KZ|KAZ|KAZAKHSTAN|
+KE|KEN|KENYA|
+KI|KIR|KIRIBATI|
+KP|PRK|NORTH KOREA|DEMOCRATIC PEOPLES REPUBLIC OF KOREA;DPRK
+KR|KOR|SOUTH KOREA|KOREA;REPUBLIC OF KOREA;KOREA REPUBLIC
+KW|KWT|KUWAIT|
+KG|KGZ|KYRGYZSTAN|
+LA|LAO|LAOS|LAO PEOPLES DEMOCRATIC REPUBLIC
+LV|LVA|LATVIA|
+LB|LBN|LEBANON|
+LS|LSO|LESOTHO|
+LR|LBR|LIBERIA|
+LY|LBY|LIBYA|
+LI|LIE|LIECHTENSTEIN|
+LT|LTU|LITHUANIA|
+LU|LUX|LUXEMBOURG|
+MO|MAC|MACAO|MACAU
+MG|MDG|MADAGASCAR|
+MW|MWI|MALAWI|
+MY|MYS|MALAYSIA|
+MV|MDV|MALDIVES|
+ML|MLI|MALI|
+MT|MLT|MALTA|
+MH|MHL|MARSHALL ISLANDS|
+MQ|MTQ|MARTINIQUE|
+MR|MRT|MAURITANIA|
+MU|MUS|MAURITIUS|
+YT|MYT|MAYOTTE|
+MX|MEX|MEXICO|
+FM|FSM|MICRONESIA|FEDERATED STATES OF MICRONESIA
+MD|MDA|MOLDOVA|REPUBLIC OF MOLDOVA
+MC|MCO|MONACO|
+MN|MNG|MONGOLIA|
+ME|MNE|MONTENEGRO|
+MS|MSR|MONTSERRAT|
+MA|MAR|MOROCCO|
+MZ|MOZ|MOZAMBIQUE|
+MM|MMR|MYANMAR|BURMA
+NA|NAM|NAMIBIA|
+NR|NRU|NAURU|
+NP|NPL|NEPAL|
+NL|NLD|NETHERLANDS|HOLLAND;THE NETHERLANDS
+NC|NCL|NEW CALEDONIA|
+NZ|NZL|NEW ZEALAND|
+NI|NIC|NICARAGUA|
+NE|NER|NIGER|
+NG|NGA|NIGERIA|
+NU|NIU|NIUE|
+NF|NFK|NORFOLK ISLAND|
+MK|MKD|NORTH MACEDONIA|MACEDONIA
+MP|MNP|NORTHERN MARIANA ISLANDS|
+NO|NOR|NORWAY|
+OM|OMN|OMAN|
+PK|PAK|PAKISTAN|
+PW|PLW|PALAU|
+PS|PSE|PALESTINE|STATE OF PALESTINE
+PA|PAN|PANAMA|
+PG|PNG|PAPUA NEW GUINEA|
+PY|PRY|PARAGUAY|
+PE|PER|PERU|
+PH|PHL|PHILIPPINES|
+PN|PCN|PITCAIRN|
+PL|POL|POLAND|
+PT|PRT|PORTUGAL|
+PR|PRI|PUERTO RICO|
+QA|QAT|QATAR|
+RE|REU|REUNION|
+RO|ROU|ROMANIA|
+RU|RUS|RUSSIA|RUSSIAN FEDERATION
+RW|RWA|RWANDA|
+BL|BLM|SAINT BARTHELEMY|
+SH|SHN|SAINT HELENA|
+KN|KNA|SAINT KITTS AND NEVIS|ST KITTS AND NEVIS
+LC|LCA|SAINT LUCIA|ST LUCIA
+MF|MAF|SAINT MARTIN|
+PM|SPM|SAINT PIERRE AND MIQUELON|
+VC|VCT|SAINT VINCENT AND THE GRENADINES|ST VINCENT AND THE GRENADINES
+WS|WSM|SAMOA|
+SM|SMR|SAN MARINO|
+ST|STP|SAO TOME AND PRINCIPE|
+SA|SAU|SAUDI ARABIA|KSA;KINGDOM OF SAUDI ARABIA
+SN|SEN|SENEGAL|
+RS|SRB|SERBIA|
+SC|SYC|SEYCHELLES|
+SL|SLE|SIERRA LEONE|
+SG|SGP|SINGAPORE|
+SX|SXM|SINT MAARTEN|
+SK|SVK|SLOVAKIA|
+SI|SVN|SLOVENIA|
+SB|SLB|SOLOMON ISLANDS|
+SO|SOM|SOMALIA|
+ZA|ZAF|SOUTH AFRICA|RSA;REPUBLIC OF SOUTH AFRICA
+GS|SGS|SOUTH GEORGIA AND THE SOUTH SANDWICH ISLANDS|
+SS|SSD|SOUTH SUDAN|
+ES|ESP|SPAIN|ESPANA
+LK|LKA|SRI LANKA|CEYLON
+SD|SDN|SUDAN|
+SR|SUR|SURINAME|
+SJ|SJM|SVALBARD AND JAN MAYEN|
+SE|SWE|SWEDEN|SVERIGE
+CH|CHE|SWITZERLAND|
+SY|SYR|SYRIA|SYRIAN ARAB REPUBLIC
+TW|TWN|TAIWAN|
+TJ|TJK|TAJIKISTAN|
+TZ|TZA|TANZANIA|UNITED REPUBLIC OF TANZANIA
+TH|THA|THAILAND|
+TL|TLS|TIMOR LESTE|EAST TIMOR
+TG|TGO|TOGO|
+TK|TKL|TOKELAU|
+TO|TON|TONGA|
+TT|TTO|TRINIDAD AND TOBAGO|
+TN|TUN|TUNISIA|
+TR|TUR|TURKEY|TURKIYE
+TM|TKM|TURKMENISTAN|
+TC|TCA|TURKS AND CAICOS ISLANDS|
+TV|TUV|TUVALU|
+UG|UGA|UGANDA|
+UA|UKR|UKRAINE|
+AE|ARE|UNITED ARAB EMIRATES|UAE;U A E;EMIRATES
+GB|GBR|UNITED KINGDOM|UK;U K;GREAT BRITAIN;BRITAIN;ENGLAND;SCOTLAND;WALES;NORTHERN IRELAND
+US|USA|UNITED STATES|US;U S A;UNITED STATES OF AMERICA;AMERICA
+UM|UMI|UNITED STATES MINOR OUTLYING ISLANDS|
+UY|URY|URUGUAY|
+UZ|UZB|UZBEKISTAN|
+VU|VUT|VANUATU|
+VE|VEN|VENEZUELA|
+VN|VNM|VIETNAM|VIET NAM
+VG|VGB|BRITISH VIRGIN ISLANDS|
+VI|VIR|US VIRGIN ISLANDS|
+WF|WLF|WALLIS AND FUTUNA|
+EH|ESH|WESTERN SAHARA|
+YE|YEM|YEMEN|
+ZM|ZMB|ZAMBIA|
+ZW|ZWE|ZIMBABWE|
+"""
+
+# UN/LOCODE | port name used in the output | other names. Indian customs
+# codes add a digit for the port type (INMAA1 sea, INDEL4 ICD); the resolver
+# drops it.
+_PORT_TABLE = """
+INMAA|CHENNAI|MADRAS;CHENNAI SEA
+INENR|ENNORE|KAMARAJAR
+INKAT|KATTUPALLI|
+INNSA|NHAVA SHEVA|JAWAHARLAL NEHRU PORT;JNPT;JNPA;NHAVASHEVA
+INBOM|MUMBAI|BOMBAY;MUMBAI PORT
+INMUN|MUNDRA|
+INIXY|KANDLA|DEENDAYAL;KANDLA SEZ
+INPAV|PIPAVAV|
+INHZA|HAZIRA|
+INCCU|KOLKATA|CALCUTTA
+INHAL|HALDIA|
+INVTZ|VISAKHAPATNAM|VIZAG
+INKAK|KAKINADA|
+INKRI|KRISHNAPATNAM|
+INTUT|TUTICORIN|THOOTHUKUDI;VOC PORT
+INCOK|COCHIN|KOCHI
+INMRM|MORMUGAO|GOA
+INNML|NEW MANGALORE|MANGALORE
+INPRT|PARADIP|
+INDEL|DELHI|NEW DELHI;TUGHLAKABAD;ICD TUGHLAKABAD
+INPPG|PATPARGANJ|ICD PATPARGANJ
+INBLR|BANGALORE|BENGALURU;ICD WHITEFIELD
+INHYD|HYDERABAD|
+INAMD|AHMEDABAD|
+INPNQ|PUNE|
+INLDH|LUDHIANA|
+INTKD|TUGHLAKABAD|
+INCOB|COIMBATORE|
+INMAQ|MADURAI|
+INNAG|NAGPUR|
+INJAI|JAIPUR|
+SEGOT|GOTHENBURG|GOTEBORG;GOETEBORG
+SESTO|STOCKHOLM|
+SEMMA|MALMO|
+SEHEL|HELSINGBORG|
+DEHAM|HAMBURG|
+DEBRV|BREMERHAVEN|
+DEBRE|BREMEN|
+NLRTM|ROTTERDAM|
+NLAMS|AMSTERDAM|
+BEANR|ANTWERP|ANTWERPEN
+BEZEE|ZEEBRUGGE|
+FRLEH|LE HAVRE|
+FRMRS|MARSEILLE|MARSEILLES;FOS
+GBFXT|FELIXSTOWE|
+GBSOU|SOUTHAMPTON|
+GBLGP|LONDON GATEWAY|
+GBLON|LONDON|
+GBLIV|LIVERPOOL|
+ITGOA|GENOA|GENOVA
+ITSPE|LA SPEZIA|
+ITNAP|NAPLES|NAPOLI
+ITVCE|VENICE|VENEZIA
+ESVLC|VALENCIA|
+ESBCN|BARCELONA|
+ESALG|ALGECIRAS|
+PTLIS|LISBON|LISBOA
+PLGDN|GDANSK|
+PLGDY|GDYNIA|
+DKAAR|AARHUS|
+DKCPH|COPENHAGEN|
+NOOSL|OSLO|
+FIHEL|HELSINKI|
+FIKTK|KOTKA|
+GRPIR|PIRAEUS|
+TRIST|ISTANBUL|AMBARLI
+TRMER|MERSIN|
+SIKOP|KOPER|
+USNYC|NEW YORK|NEW YORK NEW JERSEY
+USSAV|SAVANNAH|
+USCHS|CHARLESTON|
+USORF|NORFOLK|
+USBAL|BALTIMORE|
+USHOU|HOUSTON|
+USMIA|MIAMI|
+USLAX|LOS ANGELES|
+USLGB|LONG BEACH|
+USOAK|OAKLAND|
+USSEA|SEATTLE|
+USTIW|TACOMA|
+USCHI|CHICAGO|
+CAMTR|MONTREAL|
+CAVAN|VANCOUVER|
+CAHAL|HALIFAX|
+CATOR|TORONTO|
+MXVER|VERACRUZ|
+MXZLO|MANZANILLO|
+BRSSZ|SANTOS|
+ARBUE|BUENOS AIRES|
+CLSAI|SAN ANTONIO|
+AEJEA|JEBEL ALI|JEBELALI
+AEDXB|DUBAI|
+AEAUH|ABU DHABI|
+AESHJ|SHARJAH|
+AEKLF|KHOR FAKKAN|
+OMSOH|SOHAR|
+OMSLL|SALALAH|
+QAHMD|HAMAD|
+SAJED|JEDDAH|
+SADMM|DAMMAM|
+KWSAA|SHUWAIKH|
+BHKBS|KHALIFA BIN SALMAN|
+EGPSD|PORT SAID|
+EGALY|ALEXANDRIA|
+KEMBA|MOMBASA|
+TZDAR|DAR ES SALAAM|
+ZADUR|DURBAN|
+ZACPT|CAPE TOWN|
+NGAPP|APAPA|LAGOS
+GHTEM|TEMA|
+MAPTM|TANGER MED|TANGIER
+SGSIN|SINGAPORE|
+MYPKG|PORT KLANG|KLANG
+MYPEN|PENANG|
+MYTPP|TANJUNG PELEPAS|
+LKCMB|COLOMBO|
+BDCGP|CHITTAGONG|CHATTOGRAM
+PKKHI|KARACHI|
+THLCH|LAEM CHABANG|
+THBKK|BANGKOK|
+VNSGN|HO CHI MINH CITY|SAIGON;HO CHI MINH
+VNHPH|HAIPHONG|HAI PHONG
+IDJKT|JAKARTA|TANJUNG PRIOK
+PHMNL|MANILA|
+CNSHA|SHANGHAI|
+CNNGB|NINGBO|
+CNSZX|SHENZHEN|YANTIAN
+CNTAO|QINGDAO|
+CNTXG|TIANJIN|XINGANG
+CNXMN|XIAMEN|
+CNCAN|GUANGZHOU|
+HKHKG|HONG KONG|
+TWKHH|KAOHSIUNG|
+KRPUS|BUSAN|PUSAN
+KRINC|INCHEON|
+JPTYO|TOKYO|
+JPYOK|YOKOHAMA|
+JPUKB|KOBE|
+JPOSA|OSAKA|
+JPNGO|NAGOYA|
+AUSYD|SYDNEY|
+AUMEL|MELBOURNE|
+AUBNE|BRISBANE|
+AUFRE|FREMANTLE|
+NZAKL|AUCKLAND|
+"""
+
+Place = namedtuple("Place", ["name", "code"])
+
+
+def normalize_place(text):
+    """Upper-case letters, digits and single spaces; '' for blank input."""
+    if not text:
+        return ""
+    return " ".join(re.sub(r"[^A-Z0-9]+", " ", str(text).upper()).split())
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Fuzzy lookup of names: every name's trigrams are indexed once, and a
+    query only scores the names it shares a trigram with.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        self._sizes = []
+        self._postings = {}
+        for position, name in enumerate(self.names):
+            grams = _trigrams(name)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(position)
+
+    def candidates(self, text, limit, min_similarity=0.0):
+        """
+        Up to limit names sharing the most trigrams with text (Dice
+        similarity), best first, leaving out names below min_similarity.
+        """
+        grams = _trigrams(text)
+        shared = {}
+        for gram in grams:
+            for position in self._postings.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        similarity = {
+            position: 2 * count / (len(grams) + self._sizes[position]) for position, count in shared.items()
+        }
+        ranked = sorted(
+            (position for position in similarity if similarity[position] >= min_similarity),
+            key=lambda position: -similarity[position],
+        )
+        return [self.names[position] for position in ranked[:limit]]
+
+
+class PlaceResolver:
+    """
+    Resolves free text to a Place: exact names, aliases and codes first,
+    then the trigram index. Memoized per normalized string.
+    """
+
+    def __init__(self, places, cutoff, memo_size=MEMO_SIZE):
+        # places: (Place, names to match in full, codes to match exactly)
+        self.cutoff = cutoff
+        self._exact = {}
+        fuzzy = {}
+        for place, names, codes in places:
+            for key in list(names) + list(codes):
+                self._exact.setdefault(normalize_place(key), place)
+            for name in names:
+                fuzzy.setdefault(normalize_place(name), place)
+        self._fuzzy_places = fuzzy
+        self._index = TrigramIndex(fuzzy)
+        self._resolve = lru_cache(maxsize=memo_size)(self._resolve_normalized)
+
+    def _resolve_normalized(self, text):
+        place = self._exact.get(text)
+        if place is not None:
+            return place
+        # The index narrows ~300 names to a shortlist; difflib picks from it
+        shortlist = self._index.candidates(text, SHORTLIST_SIZE, MIN_TRIGRAM_SIMILARITY)
+        match = get_close_matches(text, shortlist, n=1, cutoff=self.cutoff)
+        return self._fuzzy_places[match[0]] if match else None
+
+    def resolve(self, text):
+        """The Place for text, or None when nothing is close enough."""
+        text = normalize_place(text)
+        return self._resolve(text) if text else None
+
+    def cache_info(self):
+        return self._resolve.cache_info()
+
+
+def _country_places():
+    for line in _COUNTRY_TABLE.strip().splitlines():
+        alpha2, alpha3, name, aliases = line.split("|")
+        names = [name] + [alias for alias in aliases.split(";") if alias]
+        # Two-letter codes are too easy to hit by accident; only alpha-3 matches exactly
+        yield Place(name, alpha2), names, [] if alpha3 in _WORD_CODES else [alpha3]
+
+
+def _port_places():
+    for line in _PORT_TABLE.strip().splitlines():
+        code, name, aliases = line.split("|")
+        names = [name] + [alias for alias in aliases.split(";") if alias]
+        yield Place(name, code), names, [code]
+
+
+COUNTRIES = PlaceResolver(_country_places(), COUNTRY_CUTOFF)
+PORTS = PlaceResolver(_port_places(), PORT_CUTOFF)
+
+_INDIAN_PORT_CODE = re.compile(r"^(IN[A-Z]{3})\d$")
+
+
+def resolve_country(text):
+    """Canonical country name for text (name, alias or ISO alpha-3 code, misspelt or not), or None."""
+    place = COUNTRIES.resolve(text)
+    return place.name if place else None
+
+
+def resolve_port(text):
+    """Canonical port name for text (name, alias or UN/LOCODE, e.g. INMAA1 or SEGOT), or None."""
+    normalized = normalize_place(text)
+    code = _INDIAN_PORT_CODE.match(normalized)
+    place = PORTS.resolve(code.group(1) if code else normalized)
+    return place.name if place else None
@@ -0,0 +1,185 @@
+"""
+Streaming export of extracted rows to Excel, CSV and Parquet.
+
+DataFrame.to_excel builds the whole workbook in memory before saving it.
+The writers here take rows chunk by chunk as they are produced (e.g. one
+file's rows at a time from iter_extract) and hand them straight on: xlsx
+through openpyxl's write-only mode, CSV through the csv module and Parquet
+through pyarrow's ParquetWriter, one row group per chunk. Every writer
+accepts a path or a binary file object such as BytesIO.
+"""
+import csv
+import io
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _cell_values(df):
+    """Row lists for df with NaN/NA turned into None (empty cells)."""
+    values = df.astype(object)
+    return values.where(values.notna(), None).to_numpy().tolist()
+
+
+class _XlsxRowWriter:
+    def __init__(self, target, columns, sheet_name="Sheet1"):
+        self.target = target
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(sheet_name)
+        self.sheet.append(_header_cells(self.sheet, columns))
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.target)
+
+
+class _CsvRowWriter:
+    def __init__(self, target, columns):
+        self._owned = isinstance(target, (str, bytes)) or hasattr(target, "__fspath__")
+        self._binary = open(target, "wb") if self._owned else target
+        # utf-8-sig so Excel opens the CSV with the right encoding
+        self._text = io.TextIOWrapper(self._binary, encoding="utf-8-sig", newline="")
+        self._csv = csv.writer(self._text)
+        self._csv.writerow(columns)
+
+    def write_rows(self, rows):
+        self._csv.writerows(rows)
+
+    def close(self):
+        self._text.flush()
+        # Detach so closing the wrapper does not close a caller's BytesIO
+        self._text.detach()
+        if self._owned:
+            self._binary.close()
+
+
+class _ParquetRowWriter:
+    def __init__(self, target, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("pyarrow is required for Arrow/Parquet output: pip install pyarrow") from e
+        self._pa = pa
+        self.columns = [str(col) for col in columns]
+        # Extracted values are text, so every column is stored as a nullable string
+        self.schema = pa.schema([(col, pa.string()) for col in self.columns])
+        self._writer = pq.ParquetWriter(target, self.schema)
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        arrays = [
+            self._pa.array([None if row[j] is None else str(row[j]) for row in rows], type=self._pa.string())
+            for j in range(len(self.columns))
+        ]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _header_cells(sheet, columns):
+    # Bold header row, like DataFrame.to_excel writes
+    cells = []
+    for col in columns:
+        cell = WriteOnlyCell(sheet, value=col)
+        cell.font = Font(bold=True)
+        cells.append(cell)
+    return cells
+
+
+class RowWriter:
+    """
+    Writes rows under a fixed column list to one output file, in chunks.
+
+        with RowWriter("combined.csv", "csv", RECORD_COLUMNS) as writer:
+            for result in iter_extract(paths):
+                writer.write_frame(result.rows)
+
+    Columns missing from a chunk are written empty; columns not in the list
+    raise ValueError. Rows are counted in self.row_count.
+    """
+
+    def __init__(self, target, fmt, columns):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {fmt!r}; expected one of {sorted(EXPORT_FORMATS)}")
+        self.columns = list(columns)
+        self.row_count = 0
+        if fmt == "xlsx":
+            self._writer = _XlsxRowWriter(target, self.columns)
+        elif fmt == "csv":
+            self._writer = _CsvRowWriter(target, self.columns)
+        else:
+            self._writer = _ParquetRowWriter(target, self.columns)
+
+    def write_frame(self, df):
+        if df is None or df.empty:
+            return
+        unexpected = [col for col in df.columns if col not in self.columns]
+        if unexpected:
+            raise ValueError(f"Columns not in the export schema: {unexpected}")
+        rows = _cell_values(df.reindex(columns=self.columns))
+        self._writer.write_rows(rows)
+        self.row_count += len(rows)
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def export_frame(df, fmt="xlsx", chunk_rows=50_000):
+    """Bytes of df in the given format, written chunk_rows rows at a time."""
+    out = io.BytesIO()
+    with RowWriter(out, fmt, df.columns) as writer:
+        for start in range(0, len(df), chunk_rows):
+            writer.write_frame(df.iloc[start:start + chunk_rows])
+    return out.getvalue()
+
+
+def write_tables_workbook(tables_dict, target):
+    """
+    One sheet per table (e.g. the Page_N invoice tables), written in
+    write-only mode. Sheets keep each table's own columns.
+    """
+    workbook = Workbook(write_only=True)
+    for sheet_name, df in tables_dict.items():
+        sheet = workbook.create_sheet(sheet_name)
+        sheet.append(_header_cells(sheet, list(df.columns)))
+        for row in _cell_values(df):
+            sheet.append(row)
+    workbook.save(target)
+
+
+def worksheet_frame(ws):
+    """
+    DataFrame of an in-memory worksheet, first row as the header, so a
+    filled workbook can be previewed without saving and re-reading it.
+    """
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    body = list(rows)
+    # Formatted but empty rows at the bottom are not data
+    while body and all(value is None for value in body[-1]):
+        body.pop()
+    columns = [f"Unnamed: {j}" if name is None else name for j, name in enumerate(header)]
+    return pd.DataFrame(body, columns=columns)
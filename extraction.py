@@ -0,0 +1,862 @@
+"""
+PDF extraction for shipping bills: SB-level fields from page 1 and the
+PART - II invoice tables. Kept free of Streamlit so it can be imported by
+worker processes.
+"""
+import io
+import mmap
+import os
+import re
+from collections import namedtuple
+from collections.abc import Iterator
+
+import pandas as pd
+import pdfplumber
+
+from destinations import resolve_country, resolve_port
+from export import RowWriter, write_tables_workbook
+from instrumentation import count, stage, timed
+
+# Bump whenever a change alters what the extractors return, so cached
+# results from older code are not reused.
+EXTRACTOR_VERSION = 3
+
+INVOICE_DETAILS_MARKER = "PART - II - INVOICE DETAILS"
+_COMPACT_INVOICE_MARKER = re.sub(r"\s+", "", INVOICE_DETAILS_MARKER)
+
+# Page kinds from ParsedDocument.classify_page
+PAGE_FIRST = "first"      # page 1, always table-extracted
+PAGE_INVOICE = "invoice"  # carries the invoice-details marker
+PAGE_SKIP = "skip"        # no table extraction needed
+
+BUYER_HEADER = "2.BUYER'S NAME & ADDRESS"
+
+# Columns of the rows extract_invoice_details_from_all_pages returns, in order
+SB_COLUMNS = [
+    "PORT CODE(FROM)", "SHIPPINGBILL NO", "SHIPPING BILL DATE", "IE CODE",
+    "GSTIN/TYPE", "CB CODE", "FINAL DESTINATION", "INVOICE NO"
+]
+INVOICE_COLUMNS = [
+    "INVOICE NO", "INVOICE DATE", "DRAWEE NAME", "DRAWEE ADDRESS",
+    "GOODS DESCRIPTION", "PORT OF DESTINATION"
+]
+RECORD_COLUMNS = SB_COLUMNS + INVOICE_COLUMNS[1:]
+
+# (row, column) cells of the concatenated page table that the extractors read,
+# per page kind. Anchors are cells whose text must match the page the layout
+# was learned from before a LayoutTemplate read is trusted.
+LAYOUT_FIELDS = {
+    PAGE_FIRST: {
+        "cells": [(12, 29), (13, 29)],           # label above / PORT OF DESTINATION (AD14)
+        "anchors": [(12, 29)],
+    },
+    PAGE_INVOICE: {
+        "cells": [(11, 2), (12, 9)]              # invoice no & date / buyer header
+                 + [(r, 9) for r in range(13, 19)]  # drawee name and address
+                 + [(28, 4)],                    # goods description
+        "anchors": [(12, 9)],
+    },
+}
+
+
+# Files at least this large are memory-mapped rather than read through a buffered file
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+
+# ---------------- PDF sources (paths, bytes, buffers, file objects) ----------------
+class _BufferReader(io.RawIOBase):
+    """Read-only, seekable file over a bytes-like buffer; only the ranges read are copied."""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def read(self, size=-1):
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def open_pdf_source(source):
+    """
+    Open a PDF given as a path, bytes, bytearray/memoryview or binary file
+    object. Returns (pdfplumber PDF, resources to close after it).
+
+    bytes are wrapped without copying, other buffers are read in place, and
+    files of MMAP_THRESHOLD bytes or more are memory-mapped.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        if os.path.getsize(source) < MMAP_THRESHOLD:
+            return pdfplumber.open(source), []
+        with open(source, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return pdfplumber.open(mapped), [mapped]
+    if isinstance(source, bytes):
+        return pdfplumber.open(io.BytesIO(source)), []
+    if isinstance(source, (bytearray, memoryview)):
+        reader = _BufferReader(source)
+        return pdfplumber.open(reader), [reader]
+    if hasattr(source, "read"):
+        return pdfplumber.open(source), []
+    raise TypeError(f"Unsupported PDF source: {type(source).__name__}")
+
+
+# ---------------- Parsed document (opened once, shared by all extractors) ----------------
+def _chars_spell_marker(chars):
+    """
+    False when the page's characters cannot make up the invoice-details marker
+    in its layout text: they spell it neither in drawing order nor sorted into
+    lines the way the layout text is. A True still has to be confirmed.
+    """
+    def spells(ordered):
+        return _COMPACT_INVOICE_MARKER in "".join(c["text"] for c in ordered if not c["text"].isspace())
+
+    return spells(chars) or spells(sorted(chars, key=lambda c: (round(c["top"]), c["x0"])))
+
+
+class ParsedDocument:
+    """
+    Opens a PDF a single time and works out each page's text and tables lazily,
+    the first time an extractor asks for them. Hand the same instance to
+    extract_sb_data, extract_invoice_tables, extract_invoice_details_from_all_pages
+    and get_port_of_destination so the file is parsed only once.
+    pdf_path may be anything open_pdf_source accepts.
+    """
+
+    def __init__(self, pdf_path, layout_template=None):
+        self.pdf_path = pdf_path
+        self.layout_template = layout_template
+        with stage("open"):
+            self._pdf, self._resources = open_pdf_source(pdf_path)
+        self._page_text = {}
+        self._page_tables = {}
+        self._tabled_pages = set()  # pages whose tables were extracted, even if since released
+        self._page_kind = {}
+        self._template_values = {}
+        self._invoice_tables = None
+        self._last_found_tables = None
+
+    @property
+    def page_count(self):
+        return len(self._pdf.pages)
+
+    def page_text(self, index):
+        """Text of the page at 0-based index (cached after the first call)."""
+        if index not in self._page_text:
+            with stage("text"):
+                self._page_text[index] = self._pdf.pages[index].extract_text() or ""
+        return self._page_text[index]
+
+    def page_tables(self, index):
+        """Tables of the page at 0-based index (cached after the first call)."""
+        if index not in self._page_tables:
+            # Same as page.extract_tables(), but keeps the Table objects of the
+            # latest page around so a LayoutTemplate can learn cell positions
+            with stage("tables"):
+                found = self._pdf.pages[index].find_tables()
+                self._page_tables[index] = [table.extract() for table in found]
+            count("tables_found", len(found))
+            self._tabled_pages.add(index)
+            if self.layout_template is not None:
+                self._last_found_tables = (index, found)
+        return self._page_tables[index]
+
+    def page_frame(self, index):
+        """All tables of a page concatenated into one DataFrame, or None if it has none."""
+        tables = self.page_tables(index)
+        if not tables:
+            return None
+        with stage("concat"):
+            return pd.concat([pd.DataFrame(tbl) for tbl in tables], ignore_index=True)
+
+    def template_cells(self, index, kind):
+        """
+        Read the LAYOUT_FIELDS cells of a page from its learned regions, without
+        table extraction. Returns {(row, col): text}, or None when there is no
+        template, nothing learned yet, or the page does not validate.
+        """
+        if self.layout_template is None:
+            return None
+        if index not in self._template_values:
+            with stage("layout_read"):
+                self._template_values[index] = self.layout_template.read(kind, self._pdf.pages[index])
+        return self._template_values[index]
+
+    def learn_layout(self, index, kind):
+        """Teach the layout template the cell regions of a page whose tables were just extracted."""
+        if self.layout_template is None or self.layout_template.has_layout(kind):
+            return
+        if self._last_found_tables is None or self._last_found_tables[0] != index:
+            return
+        self.layout_template.learn(kind, self._pdf.pages[index], self._last_found_tables[1])
+        self._last_found_tables = None
+
+    def classify_page(self, index):
+        """
+        Decide whether the page at 0-based index needs table extraction, using
+        the cheapest check that settles it:
+          1. page 1 always qualifies;
+          2. a page whose raw characters (no layout analysis) do not spell
+             the invoice-details marker is skipped;
+          3. otherwise the layout text is checked for the marker, as
+             extract_invoice_tables always did, so the result is the same.
+        """
+        if index not in self._page_kind:
+            self._page_kind[index] = self._classify_page(index)
+        return self._page_kind[index]
+
+    @timed("classify")
+    def _classify_page(self, index):
+        if index == 0:
+            return PAGE_FIRST
+        if index in self._page_text:
+            return PAGE_INVOICE if INVOICE_DETAILS_MARKER in self._page_text[index] else PAGE_SKIP
+
+        chars = self._pdf.pages[index].chars
+        if not chars or not _chars_spell_marker(chars):
+            return PAGE_SKIP
+        return PAGE_INVOICE if INVOICE_DETAILS_MARKER in self.page_text(index) else PAGE_SKIP
+
+    def page_stats(self):
+        """
+        Page counts for the pages classified so far:
+        {"pages", "table_pages", "skipped_pages", "region_pages"}, where
+        region_pages were read through the layout template instead of tables.
+        """
+        skipped = sum(1 for kind in self._page_kind.values() if kind == PAGE_SKIP)
+        region_pages = sum(
+            1 for index, values in self._template_values.items()
+            if values is not None and index not in self._tabled_pages
+        )
+        return {
+            "pages": self.page_count,
+            "table_pages": len(self._tabled_pages),
+            "skipped_pages": skipped,
+            "region_pages": region_pages,
+        }
+
+    def release_page(self, index):
+        """
+        Drop the cached text and tables of a page and pdfplumber's layout
+        objects for it. Its classification and page_stats are kept; asking
+        for the page again parses it again.
+        """
+        self._page_text.pop(index, None)
+        self._page_tables.pop(index, None)
+        if self._last_found_tables is not None and self._last_found_tables[0] == index:
+            self._last_found_tables = None
+        self._pdf.pages[index].close()
+
+    def close(self):
+        self._pdf.close()
+        for resource in self._resources:
+            resource.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _borrowed_document:
+    """
+    Context manager yielding a ParsedDocument for a PDF source (path, bytes,
+    buffer or file object) or an already open ParsedDocument. Only documents
+    opened here are closed on exit.
+    """
+
+    def __init__(self, source):
+        self._owned = not isinstance(source, ParsedDocument)
+        self._doc = ParsedDocument(source) if self._owned else source
+
+    def __enter__(self):
+        return self._doc
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._owned:
+            self._doc.close()
+
+
+# ---------------- Layout template (read known cells without table extraction) ----------------
+# How far (in points) a ruling line may sit from a learned cell border; the
+# snap tolerance of pdfplumber's table finder
+BORDER_TOLERANCE = 3
+
+
+def _has_cell_borders(h_edges, v_edges, bbox, tolerance=BORDER_TOLERANCE):
+    """True when ruling lines run along all four sides of the cell bbox, each through its midpoint."""
+    x0, top, x1, bottom = bbox
+    mid_x, mid_y = (x0 + x1) / 2, (top + bottom) / 2
+
+    def horizontal(y):
+        return any(abs(e["top"] - y) <= tolerance and e["x0"] <= mid_x <= e["x1"] for e in h_edges)
+
+    def vertical(x):
+        return any(abs(e["x0"] - x) <= tolerance and e["top"] <= mid_y <= e["bottom"] for e in v_edges)
+
+    return horizontal(top) and horizontal(bottom) and vertical(x0) and vertical(x1)
+
+
+def _region_text(chars, bbox):
+    """Text of the chars whose midpoint falls in bbox, exactly as pdfplumber fills a table cell."""
+    x0, top, x1, bottom = bbox
+    cell_chars = [
+        char for char in chars
+        if x0 <= (char["x0"] + char["x1"]) / 2 < x1 and top <= (char["top"] + char["bottom"]) / 2 < bottom
+    ]
+    return pdfplumber.utils.extract_text(cell_chars) if cell_chars else ""
+
+
+class LayoutTemplate:
+    """
+    Maps the LAYOUT_FIELDS cells of each page kind to page regions. The regions
+    are learned once, from the first page whose full table extraction passed
+    validation, and later pages of that kind (in any document) are read by
+    pulling text only from those regions. A page whose anchor cells do not
+    match, whose ruling lines do not outline the learned cells (down to the
+    goods row), or whose size differs, is reported as not validated so the
+    caller falls back to full table extraction.
+    """
+
+    def __init__(self, fields=LAYOUT_FIELDS):
+        self.fields = fields
+        self._layouts = {}
+        self.region_reads = 0
+        self.fallbacks = 0
+
+    def has_layout(self, kind):
+        return kind in self._layouts
+
+    def learn(self, kind, page, found_tables):
+        """
+        Record the cell regions from a page's pdfplumber Table objects. Row and
+        column numbers follow the concatenated page DataFrame. Returns False if
+        an anchor cell is empty, since it could not validate later pages.
+        """
+        grid = [row.cells for table in found_tables for row in table.rows]
+        width = max((len(cells) for cells in grid), default=0)
+        spec = self.fields[kind]
+
+        regions = {}
+        for r, c in spec["cells"]:
+            if r < len(grid) and c < width:
+                # None = merged or missing cell, which reads as "" in the DataFrame
+                regions[(r, c)] = grid[r][c] if c < len(grid[r]) else None
+
+        chars = page.chars
+        anchors = {}
+        for cell in spec["anchors"]:
+            bbox = regions.get(cell)
+            text = _region_text(chars, bbox).strip() if bbox else ""
+            if not text:
+                return False
+            anchors[cell] = text
+
+        # Cells outlined by ruling lines on this page must be outlined on every
+        # page read through the template, so a table whose rows shift below
+        # the anchor is caught
+        h_edges, v_edges = page.horizontal_edges, page.vertical_edges
+        bordered = [
+            cell for cell, bbox in regions.items()
+            if bbox and _has_cell_borders(h_edges, v_edges, bbox)
+        ]
+
+        self._layouts[kind] = {
+            "page_size": (page.width, page.height),
+            "regions": regions,
+            "anchors": anchors,
+            "bordered": bordered,
+        }
+        return True
+
+    def read(self, kind, page):
+        """Return {(row, col): text} for the learned cells of page, or None if it does not validate."""
+        layout = self._layouts.get(kind)
+        if layout is None:
+            return None
+        if (page.width, page.height) != layout["page_size"]:
+            self.fallbacks += 1
+            return None
+
+        chars = page.chars
+        values = {
+            cell: _region_text(chars, bbox) if bbox else ""
+            for cell, bbox in layout["regions"].items()
+        }
+        for cell, expected in layout["anchors"].items():
+            if values[cell].strip() != expected:
+                self.fallbacks += 1
+                return None
+        h_edges, v_edges = page.horizontal_edges, page.vertical_edges
+        for cell in layout["bordered"]:
+            if not _has_cell_borders(h_edges, v_edges, layout["regions"][cell]):
+                self.fallbacks += 1
+                return None
+        self.region_reads += 1
+        return values
+
+
+def _frame_cell_reader(page_df):
+    """cell(row, col) over a page DataFrame: text, "" for empty cells, None outside the table."""
+    n_rows, n_cols = page_df.shape
+
+    def cell(r, c):
+        if r >= n_rows or c >= n_cols:
+            return None
+        value = page_df.iat[r, c]
+        return "" if pd.isna(value) else str(value)
+
+    return cell
+
+
+def _as_tables_dict(tables_dict):
+    """Accept either a {sheet_name: DataFrame} dict or a ParsedDocument."""
+    if isinstance(tables_dict, ParsedDocument):
+        return extract_invoice_tables(tables_dict)
+    return tables_dict
+
+
+# ---------------- Your existing extraction functions ----------------
+# ---------------- SB-level field rules (page 1) ----------------
+# name: field the rule fills
+# marker: literal text every anchor line contains, checked before the anchor
+#         (upper-case when the anchor ignores case)
+# anchor: compiled regex a line must match before the rule looks at it, or
+#         None when the marker is enough
+# pattern: compiled regex for parse to use, or None
+# lookahead: lines after the anchor line handed to parse along with it
+# parse: (rule, window lines, page text, offset of the anchor line in it)
+#        -> value, or None to keep scanning
+# repeat: collect a value for every anchor line instead of stopping at the first
+FieldRule = namedtuple(
+    "FieldRule", ["name", "marker", "anchor", "pattern", "lookahead", "parse", "repeat"]
+)
+
+
+class FieldRuleSet:
+    """
+    FieldRules applied to a page's lines in a single pass; rules stop being
+    checked once they have their value.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._ignore_case = {
+            rule.name for rule in self.rules
+            if rule.anchor is not None and rule.anchor.flags & re.IGNORECASE
+        }
+
+    def scan(self, text):
+        """
+        Returns {rule name: value} with the first value found on the page (a
+        list of every value for repeat rules); rules that never matched are
+        left out.
+        """
+        lines = text.split('\n')
+        found = {rule.name: [] for rule in self.rules if rule.repeat}
+        pending = list(self.rules)
+        offset = 0
+        for i, line in enumerate(lines):
+            if not pending:
+                break
+            line_offset, offset = offset, offset + len(line) + 1
+            upper = None
+            for rule in list(pending):
+                if rule.name in self._ignore_case:
+                    upper = line.upper() if upper is None else upper
+                    if rule.marker not in upper:
+                        continue
+                elif rule.marker not in line:
+                    continue
+                if rule.anchor is not None and not rule.anchor.search(line):
+                    continue
+                value = rule.parse(rule, lines[i:i + 1 + rule.lookahead], text, line_offset)
+                if value is None:
+                    continue
+                if rule.repeat:
+                    found[rule.name].append(value)
+                else:
+                    found[rule.name] = value
+                    pending.remove(rule)
+        return found
+
+
+_SB_NUMBER_RE = re.compile(r'\b\d{5,8}\b')
+_SB_DATE_RE = re.compile(r'\b\d{2}-[A-Z]{3}-\d{2}\b')
+_NON_LETTER_RE = re.compile(r'[^A-Z\s]')
+_FINAL_DESTINATION_LABEL = "13.COUNTRY OF FINALDESTINATIO"
+
+
+def _first_group(rule, window, text, offset):
+    # Searched from the anchor line on, so the value may sit on a later line,
+    # exactly as a search over the whole page finds it
+    match = rule.pattern.search(text, offset)
+    return match.group(1) if match else None
+
+
+def _final_destination(rule, window, text, offset):
+    """Resolved country from the text after the label and the next non-empty lines."""
+    after = window[0].split(_FINAL_DESTINATION_LABEL)[-1].strip()
+    candidates = [after] if after else []
+    candidates.extend(line.strip() for line in window[1:] if line.strip())
+
+    for cand in candidates:
+        cand_clean = _NON_LETTER_RE.sub('', cand.upper()).strip()
+        if not cand_clean:
+            continue
+        with stage("country_match"):
+            match = resolve_country(cand_clean)
+        if match:
+            return match
+    # Only the first header counts, even when nothing follows it
+    return candidates[0].strip() if candidates else ""
+
+
+def _sb_numbers_line(rule, window, text, offset):
+    """(port code, SB numbers, SB dates) from the line under the SB header."""
+    if len(window) < 2:
+        return None
+    next_line = window[1]
+    sb_numbers = _SB_NUMBER_RE.findall(next_line)
+    dates = _SB_DATE_RE.findall(next_line)
+
+    # Port Code (before SB No)
+    port_code = ""
+    if sb_numbers:
+        port_code_candidate = next_line[:next_line.find(sb_numbers[0])].strip()
+        port_code = port_code_candidate.split()[-1] if port_code_candidate else ""
+    return port_code, sb_numbers, dates
+
+
+SB_FIELDS = FieldRuleSet([
+    FieldRule("IE CODE", "IEC/Br", None,
+              re.compile(r'IEC/Br\s*[:\-]?\s*([A-Z0-9]+)'), 0, _first_group, False),
+    FieldRule("GSTIN/TYPE", "GSTIN/TYPE", None,
+              re.compile(r'GSTIN/TYPE\s*[:\-]?\s*([A-Z0-9]+)'), 0, _first_group, False),
+    FieldRule("CB CODE", "CB CODE", None,
+              re.compile(r'CB CODE\s*[:\-]?\s*([A-Z0-9]+)'), 0, _first_group, False),
+    FieldRule("FINAL DESTINATION", "FINALDESTINATIO",
+              re.compile(r'13\.*\s*COUNTRY\s*OF\s*FINALDESTINATIO', re.IGNORECASE),
+              None, 4, _final_destination, False),
+    FieldRule("SB LINES", "Port Code SB No SB Date", None, None, 1, _sb_numbers_line, True),
+])
+
+
+@timed("sb_fields")
+def extract_sb_data(pdf_path):
+    """
+    Extract SB-level fields from page 1. pdf_path may be a file path, the PDF's
+    bytes or a file object, or a ParsedDocument shared with the other extractors.
+    """
+    with _borrowed_document(pdf_path) as doc:
+        fields = SB_FIELDS.scan(doc.page_text(0))
+
+    # One row per SB number / date under each SB header line
+    sb_data = []
+    for port_code, sb_numbers, dates in fields["SB LINES"]:
+        for j in range(max(len(sb_numbers), len(dates))):
+            sb_data.append({
+                "PORT CODE(FROM)": port_code,
+                "SHIPPINGBILL NO": sb_numbers[j] if j < len(sb_numbers) else "",
+                "SHIPPING BILL DATE": dates[j] if j < len(dates) else "",
+                "IE CODE": fields.get("IE CODE", ""),
+                "GSTIN/TYPE": fields.get("GSTIN/TYPE", ""),
+                "CB CODE": fields.get("CB CODE", ""),
+                "FINAL DESTINATION": fields.get("FINAL DESTINATION", ""),
+                "INVOICE NO": ""   # Placeholder (will be filled later)
+            })
+
+    sb_df = pd.DataFrame(sb_data) if sb_data else None
+    return sb_df
+
+
+def print_page_stats(stats):
+    print(
+        f"📑 Table extraction on {stats['table_pages']} of {stats['pages']} pages "
+        f"({stats['skipped_pages']} skipped)"
+    )
+
+
+def iter_invoice_tables(pdf_path, pages=None):
+    """
+    Yield (sheet_name, DataFrame) for Page_1 and every "PART - II - INVOICE
+    DETAILS" page, one page at a time. Each page's cached layout objects are
+    released once the consumer asks for the next page, so memory stays flat
+    however many pages the PDF has. pdf_path is anything
+    extract_invoice_tables accepts.
+    pages limits the walk to a range of 0-based page indexes; the summary
+    line is only printed for a full walk.
+    """
+    with _borrowed_document(pdf_path) as doc:
+        for index in range(doc.page_count) if pages is None else pages:
+            if doc.classify_page(index) != PAGE_SKIP:
+                page_df = doc.page_frame(index)
+                if page_df is None:
+                    page_df = pd.DataFrame([["No table found on this page"]])
+                yield f"Page_{index + 1}", page_df
+                page_df = None
+            doc.release_page(index)
+
+        if pages is None:
+            print_page_stats(doc.page_stats())
+
+
+def extract_invoice_tables(pdf_path):
+    """
+    Extract tables from all pages that contain "PART - II - INVOICE DETAILS",
+    and also include the first page even if it doesn't contain that text.
+    Returns a dictionary: {sheet_name: DataFrame}
+    pdf_path may be a file path, the PDF's bytes or a file object, or a
+    ParsedDocument; the result is kept on the document so later callers reuse it.
+    Pages are classified first (see ParsedDocument.classify_page) so table
+    extraction only runs on the pages that are kept.
+    """
+    if isinstance(pdf_path, ParsedDocument) and pdf_path._invoice_tables is not None:
+        return pdf_path._invoice_tables
+
+    page_tables_dict = dict(iter_invoice_tables(pdf_path))
+
+    if isinstance(pdf_path, ParsedDocument):
+        pdf_path._invoice_tables = page_tables_dict
+
+    return page_tables_dict
+
+def _invoice_row_from_cells(cell, port_of_dest):
+    """
+    Build one invoice row from a PART - II page, or None if the page has no
+    buyer header. cell(row, col) returns the cell text, or None outside the table.
+    """
+    check_cell = cell(12, 9)
+    if check_cell is None or BUYER_HEADER.upper() not in check_cell.strip().upper():
+        return None
+
+    # Extract invoice number and date
+    invoice_no, invoice_date = "", ""
+    cell_val = cell(11, 2).strip()
+    match = re.match(r"([A-Za-z0-9/\\-]+)\s+(\d{2}/\d{2}/\d{4})", cell_val)
+    if match:
+        invoice_no = match.group(1)
+        invoice_date = match.group(2)
+    else:
+        invoice_no = cell_val
+
+    # Extract drawee name
+    drawee_name = (cell(13, 9) or "").strip()
+
+    # Extract drawee address (next few rows)
+    drawee_address_parts = []
+    for r in range(14, 19):
+        val = cell(r, 9)
+        if val is None:
+            break
+        val = val.strip()
+        if len(val) > 2:
+            drawee_address_parts.append(val)
+    drawee_address = " ".join(drawee_address_parts)
+
+    # Goods description
+    goods_desc = (cell(28, 4) or "").strip()
+
+    return {
+        "INVOICE NO": invoice_no,
+        "INVOICE DATE": invoice_date,
+        "DRAWEE NAME": drawee_name,
+        "DRAWEE ADDRESS": drawee_address,
+        "GOODS DESCRIPTION": goods_desc,
+        "PORT OF DESTINATION": port_of_dest
+    }
+
+
+def _canonical_port(raw):
+    """Known ports (by name, alias or code) by their canonical name; other text as it is."""
+    if not raw:
+        return raw
+    with stage("port_match"):
+        return resolve_port(raw) or raw
+
+
+def _port_of_destination_from_cells(cell):
+    """PORT OF DESTINATION from Page_1 cell AD14 (row 13, column 29)."""
+    return _canonical_port((cell(13, 29) or "").strip())
+
+
+def _invoice_rows_from_pages(pages):
+    """
+    Invoice rows from (sheet_name, DataFrame) pairs with Page_1 first. Only
+    Page_1's port of destination is kept; other pages are dropped once read.
+    """
+    port_of_dest = ""
+    invoice_rows = []
+    for page_name, page_df in pages:
+        if page_name == "Page_1":
+            port_of_dest = _port_of_destination_from_cells(_frame_cell_reader(page_df))
+            continue
+        try:
+            row = _invoice_row_from_cells(_frame_cell_reader(page_df), port_of_dest)
+            if row is not None:
+                invoice_rows.append(row)
+        except Exception as e:
+            print(f"Error processing {page_name}: {e}")
+    return invoice_rows
+
+
+def _invoice_rows_from_tables(tables_dict):
+    # Page_1 first, whatever order the dict was built in
+    return _invoice_rows_from_pages(sorted(tables_dict.items(), key=lambda item: item[0] != "Page_1"))
+
+
+def _page_cell_reader(doc, index, kind):
+    """
+    cell(row, col) for a page: from the layout template regions when they
+    validate, otherwise from full table extraction (which also teaches the
+    template). Returns None if the page has no tables.
+    """
+    values = doc.template_cells(index, kind)
+    if values is not None:
+        return lambda r, c: values.get((r, c))
+
+    page_df = doc.page_frame(index)
+    if page_df is None:
+        return None
+    cell = _frame_cell_reader(page_df)
+    if kind == PAGE_FIRST or _invoice_row_from_cells(cell, "") is not None:
+        doc.learn_layout(index, kind)
+    return cell
+
+
+def _invoice_rows_from_layout(doc):
+    """Invoice rows for a ParsedDocument in layout-template mode."""
+    port_of_dest = ""
+    page1_cell = _page_cell_reader(doc, 0, PAGE_FIRST)
+    if page1_cell is not None:
+        port_of_dest = _port_of_destination_from_cells(page1_cell)
+
+    invoice_rows = []
+    for index in range(1, doc.page_count):
+        if doc.classify_page(index) != PAGE_INVOICE:
+            continue
+        try:
+            cell = _page_cell_reader(doc, index, PAGE_INVOICE)
+            row = _invoice_row_from_cells(cell, port_of_dest) if cell is not None else None
+            if row is not None:
+                invoice_rows.append(row)
+        except Exception as e:
+            print(f"Error processing Page_{index + 1}: {e}")
+    return invoice_rows
+
+
+@timed("invoice_rows")
+def extract_invoice_details_from_all_pages(tables_dict, sb_df=None):
+    """
+    Extracts *all* invoices from all 'PART - II - INVOICE DETAILS' pages,
+    and duplicates SB-level info for each invoice.
+    tables_dict may also be a ParsedDocument; if it was opened with a
+    LayoutTemplate, only the known cells are read from each page. It may also
+    be the iterator from iter_invoice_tables, which is consumed page by page.
+    """
+    if sb_df is None or sb_df.empty:
+        sb_df = pd.DataFrame()
+
+    if isinstance(tables_dict, ParsedDocument) and tables_dict.layout_template is not None:
+        invoice_rows = _invoice_rows_from_layout(tables_dict)
+    elif isinstance(tables_dict, Iterator):
+        invoice_rows = _invoice_rows_from_pages(tables_dict)
+    else:
+        invoice_rows = _invoice_rows_from_tables(_as_tables_dict(tables_dict))
+
+    # ✅ Combine SB data with *all* invoices
+    return _combine_sb_with_invoices(sb_df, invoice_rows)
+
+
+def _combine_sb_with_invoices(sb_df, invoice_rows):
+    """
+    Every SB row paired with every invoice row (SB-major order), as one cross
+    merge. Invoice values win where both sides share a column (INVOICE NO),
+    and the columns keep the SB order followed by the new invoice columns.
+    """
+    if sb_df.empty:
+        return pd.DataFrame(invoice_rows)
+    if not invoice_rows:
+        return pd.DataFrame()
+
+    invoice_df = pd.DataFrame(invoice_rows)
+    shared = [col for col in invoice_df.columns if col in sb_df.columns]
+    combined = sb_df.drop(columns=shared).merge(invoice_df, how="cross")
+    columns = list(sb_df.columns) + [col for col in invoice_df.columns if col not in shared]
+    return combined[columns]
+
+def get_port_of_destination(tables_dict):
+    """
+    Extract PORT OF DESTINATION from Page_1 cell AD14
+    tables_dict may also be a ParsedDocument; with a LayoutTemplate only the
+    learned AD14 region is read.
+    """
+    if isinstance(tables_dict, ParsedDocument) and tables_dict.layout_template is not None:
+        page1_cell = _page_cell_reader(tables_dict, 0, PAGE_FIRST)
+        port_of_dest_value = _port_of_destination_from_cells(page1_cell) if page1_cell else ""
+        print(f"🔍 Port of Destination (AD14): '{port_of_dest_value}'")
+        return port_of_dest_value
+
+    tables_dict = _as_tables_dict(tables_dict)
+    port_of_dest_value = ""
+
+    if "Page_1" in tables_dict:
+        page1_df = tables_dict["Page_1"].fillna("").astype(str)
+        try:
+            # Check if row 14 and column AD exist
+            if page1_df.shape[0] >= 14 and page1_df.shape[1] >= 30:
+                port_of_dest_value = _canonical_port(page1_df.iat[13, 29].strip())
+                print(f"🔍 Port of Destination (AD14): '{port_of_dest_value}'")
+        except Exception as e:
+            print(f"Error extracting Port of Destination from Page_1: {e}")
+    else:
+        print("⚠️ Page_1 not found in tables_dict.")
+
+    return port_of_dest_value
+
+
+def save_sb_and_tables(sb_df, tables_dict, sb_output_path, tables_output_path):
+    os.makedirs(os.path.dirname(sb_output_path), exist_ok=True)
+    os.makedirs(os.path.dirname(tables_output_path), exist_ok=True)
+
+    if sb_df is not None and not sb_df.empty:
+        with RowWriter(sb_output_path, "xlsx", sb_df.columns) as writer:
+            writer.write_frame(sb_df)
+        print(f"SB Data saved to: {sb_output_path}")
+    else:
+        print("No SB Data found to save.")
+
+    if tables_dict:
+        write_tables_workbook(tables_dict, tables_output_path)
+        print(f"Invoice Tables saved to: {tables_output_path}")
+    else:
+        print("No Invoice Tables found to save.")
@@ -0,0 +1,146 @@
+"""
+On-disk cache of per-PDF extraction results, keyed by the SHA-256 of the PDF
+bytes plus EXTRACTOR_VERSION. A hit returns the SB/invoice rows and the raw
+page tables without opening the PDF at all.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+from extraction import EXTRACTOR_VERSION
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("SB_CACHE_DIR", Path.home() / ".cache" / "sb_extractor"))
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bytes in each cache directory as this process last counted them, plus what
+# it has written since; put() only rescans the directory once this passes
+# max_bytes. Kept per process, not on ExtractionCache, so pool workers keep
+# their count from one file to the next.
+_known_sizes = {}
+
+
+def hash_pdf(pdf_path):
+    """
+    SHA-256 hex digest of a PDF's bytes. pdf_path may be a file path, bytes or
+    another buffer, or a binary file object (read from the start, then
+    returned to where it was).
+    """
+    digest = hashlib.sha256()
+    if isinstance(pdf_path, (str, os.PathLike)):
+        with open(pdf_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    elif hasattr(pdf_path, "read"):
+        position = pdf_path.tell()
+        pdf_path.seek(0)
+        for chunk in iter(lambda: pdf_path.read(1024 * 1024), b""):
+            digest.update(chunk)
+        pdf_path.seek(position)
+    else:
+        digest.update(pdf_path)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Directory of pickled {"rows": DataFrame, "tables": {sheet_name: DataFrame}}
+    entries. Reads touch the entry's mtime, and writes evict the least recently
+    used entries once the directory grows past max_bytes. Writes from other
+    processes are only counted at the next rescan, so a pool of workers can
+    overshoot max_bytes until one of them passes it.
+
+    Only the directory and size limit are stored on the instance, so it can be
+    passed to worker processes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key_for(self, pdf_hash):
+        return f"{pdf_hash}-v{EXTRACTOR_VERSION}"
+
+    def _entry_path(self, key):
+        return self.cache_dir / f"{key}.pkl"
+
+    def get(self, key):
+        """Return (rows, tables_dict) for key, or None on a miss."""
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # Truncated or unreadable entry: drop it and treat as a miss
+            print(f"⚠️ Dropping unreadable cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return entry["rows"], entry["tables"]
+
+    def put(self, key, rows, tables_dict):
+        path = self._entry_path(key)
+        size = self._known_size()
+        try:
+            size -= path.stat().st_size  # replaced below
+        except FileNotFoundError:
+            pass
+        # Write to a temp file and rename so concurrent workers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump({"rows": rows, "tables": tables_dict}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size += f.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+        if size > self.max_bytes:
+            self.evict()
+        else:
+            _known_sizes[self.cache_dir] = size
+
+    def _known_size(self):
+        if self.cache_dir not in _known_sizes:
+            _known_sizes[self.cache_dir] = self.size_bytes()
+        return _known_sizes[self.cache_dir]
+
+    def _entries(self):
+        entries = []
+        for path in self.cache_dir.glob("*.pkl"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def entry_count(self):
+        return len(self._entries())
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        _known_sizes[self.cache_dir] = total
+
+    def clear(self):
+        """Invalidate every cached entry."""
+        for _, _, path in self._entries():
+            path.unlink(missing_ok=True)
+        _known_sizes[self.cache_dir] = 0
@@ -0,0 +1,220 @@
+"""
+Per-file stage timings and counters for the extraction chain.
+
+Extractors mark their work with stage("tables") blocks or @timed("text")
+and call count("tables_found", n). Nothing is recorded unless a collect()
+block is active (extract_one opens one per file), so the hooks cost next to
+nothing elsewhere. Stage times are exclusive: while a nested stage runs the
+enclosing one is paused, so a file's stage times add up to its total.
+
+Results are emitted as one JSON object per line on the "sb_extractor.metrics"
+logger (send it to a file with log_to_file, or set SB_METRICS_LOG) and
+summarised by timing_table. profile_to wraps a batch in cProfile.
+"""
+import cProfile
+import contextvars
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+logger = logging.getLogger("sb_extractor.metrics")
+
+_current = contextvars.ContextVar("sb_extractor_metrics", default=None)
+
+
+class StageMetrics:
+    """Exclusive seconds and call counts per stage, plus named counters."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+        self._stack = []  # [stage name, time it last started or resumed]
+        self._started = time.perf_counter()
+
+    def _add(self, name, seconds):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def enter(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self._add(outer[0], now - outer[1])
+        self._stack.append([name, now])
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def exit(self):
+        now = time.perf_counter()
+        name, started = self._stack.pop()
+        self._add(name, now - started)
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def merge(self, other):
+        """Add a to_dict() result (e.g. from a page-range worker) into these metrics."""
+        for name, seconds in other["stages"].items():
+            self._add(name, seconds)
+        for name, calls in other["calls"].items():
+            self.calls[name] = self.calls.get(name, 0) + calls
+        for name, n in other["counters"].items():
+            self.count(name, n)
+
+    def to_dict(self):
+        return {
+            "seconds": time.perf_counter() - self._started,
+            "stages": dict(self.seconds),
+            "calls": dict(self.calls),
+            "counters": dict(self.counters),
+        }
+
+
+@contextmanager
+def collect():
+    """Record the stages run inside the block; yields the StageMetrics."""
+    metrics = StageMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Time the block as stage name, if metrics are being collected."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.enter(name)
+    try:
+        yield
+    finally:
+        metrics.exit()
+
+
+def timed(name):
+    """Decorator form of stage(name)."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, n=1):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.count(name, n)
+
+
+def merge(metrics_dict):
+    """Fold metrics collected elsewhere (another process) into the active collect() block."""
+    metrics = _current.get()
+    if metrics is not None and metrics_dict is not None:
+        metrics.merge(metrics_dict)
+
+
+def log_event(event, **fields):
+    """Emit one structured JSON log line on the metrics logger."""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": event, "time": time.time(), **fields}, default=str))
+
+
+def log_file_result(result, name=None):
+    """JSON log line for a batch FileResult."""
+    log_event(
+        "file_extracted",
+        file=name or result.source,
+        index=result.index,
+        cached=result.cached,
+        error=result.error,
+        rows=0 if result.rows is None else len(result.rows),
+        pages=result.stats,
+        metrics=result.metrics,
+    )
+
+
+def log_to_file(path):
+    """Append the JSON log lines to path (one object per line); once per path."""
+    path = os.path.abspath(path)
+    for handler in logger.handlers:
+        if getattr(handler, "baseFilename", None) == path:
+            return handler
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return handler
+
+
+def log_to_env_file():
+    """log_to_file($SB_METRICS_LOG) when that variable is set."""
+    path = os.environ.get("SB_METRICS_LOG")
+    return log_to_file(path) if path else None
+
+
+def timing_table(results, names=None):
+    """
+    One row per FileResult: file, cache hit, pages, tables found, total
+    seconds and the seconds spent in each stage.
+    """
+    records = []
+    for result in results:
+        metrics = result.metrics or {"seconds": None, "stages": {}, "counters": {}}
+        record = {
+            "file": names[result.index] if names else result.source,
+            "cached": result.cached,
+            "pages": (result.stats or {}).get("pages"),
+            "tables": metrics["counters"].get("tables_found", 0),
+            "total s": metrics["seconds"],
+        }
+        record.update({f"{name} s": seconds for name, seconds in sorted(metrics["stages"].items())})
+        records.append(record)
+    table = pd.DataFrame(records)
+    stage_columns = [col for col in table.columns if col.endswith(" s")]
+    table[stage_columns] = table[stage_columns].fillna(0.0).round(3)
+    return table
+
+
+def stage_totals(results):
+    """{stage: seconds} summed over all FileResults, slowest first."""
+    totals = {}
+    for result in results:
+        for name, seconds in ((result.metrics or {}).get("stages") or {}).items():
+            totals[name] = totals.get(name, 0.0) + seconds
+    return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+
+@contextmanager
+def profile_to(path=None, top=25):
+    """
+    Run the block under cProfile. Yields a dict that afterwards holds
+    "stats" (the pstats text of the top entries by cumulative time) and,
+    with a path, has the raw profile dumped there for snakeviz/pstats.
+    Only this process is profiled, not extraction worker processes.
+    """
+    profiler = cProfile.Profile()
+    report = {}
+    profiler.enable()
+    try:
+        yield report
+    finally:
+        profiler.disable()
+        if path is not None:
+            profiler.dump_stats(path)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(top)
+        report["stats"] = text.getvalue()
@@ -0,0 +1,386 @@
+"""
+Shared extraction service for every session of one Streamlit server.
+
+Without it, each session parses PDFs in its own script thread, so sessions
+fight over the same cores. ExtractionService runs one bounded process pool
+for all of them:
+
+- Fair scheduling. Each session has its own queue, and the dispatcher takes
+  files from the session queues in turn. A 500-file backfill gets one slot
+  per round, so another session's two-file lookup starts on the next free
+  worker.
+- De-duplication. Files are keyed by content hash and extraction options.
+  Identical PDFs submitted while one is queued or running are extracted once,
+  and the result goes to every job that asked for it. PDF bytes (uploads)
+  are sent to the workers as they are and never written to disk.
+- Crash isolation. A PDF that kills its worker breaks the shared pool for
+  everyone, so the tasks that were in it run again one at a time in their
+  own pools, and only the file that crashes again is reported failed.
+- Workspaces. Every session gets its own directory (workspace()) for files
+  it has to keep on disk, such as its mailbox downloads, instead of shared
+  temp paths. Workspaces left
+  unused for a day are removed as the service is used.
+
+Jobs can grow while they run (add()), so a mailbox download can feed a job
+file by file. Callers poll results() or block in wait() until new results
+arrive. run_job wraps this in the run_pipeline interface.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pandas as pd
+
+from accumulator import RecordBatchAccumulator
+from batch import FileResult, default_worker_count, extract_one
+from extraction_cache import hash_pdf
+from instrumentation import log_event, log_file_result
+from pipeline import PipelineResult
+
+DEFAULT_WORKSPACE_DIR = Path(
+    os.environ.get("SB_WORKSPACE_DIR", Path(tempfile.gettempdir()) / "sb_extractor_sessions")
+)
+
+# Workspaces not touched for this long are removed, checked at most every
+# WORKSPACE_PRUNE_INTERVAL_SECONDS
+WORKSPACE_MAX_AGE_SECONDS = 24 * 60 * 60
+WORKSPACE_PRUNE_INTERVAL_SECONDS = 60 * 60
+
+# Per-job extraction options; part of the de-duplication key
+JobOptions = namedtuple(
+    "JobOptions", ["use_cache", "use_layout_template", "stream_pages"], defaults=(True, False, False)
+)
+
+# total: files added so far, done: results delivered (failed included),
+# queued: files not yet started, finished: closed and every file delivered
+JobStatus = namedtuple("JobStatus", ["job_id", "session_id", "total", "done", "failed", "queued", "finished"])
+
+
+class _Task:
+    """One PDF to extract, shared by every job that submitted the same content and options."""
+
+    def __init__(self, key, source, options):
+        self.key = key
+        self.source = source  # path or PDF bytes
+        self.options = options
+        self.waiters = []  # (job, file index)
+        self.started = False
+        self.alone = False  # runs in its own single-worker pool after a shared pool broke
+
+
+class _Job:
+    def __init__(self, job_id, session_id, options):
+        self.job_id = job_id
+        self.session_id = session_id
+        self.options = options
+        self.sources = []  # path per file index, None for PDF bytes
+        self.results = []  # FileResults in completion order
+        self.pending = 0
+        self.closed = False
+
+
+class ExtractionService:
+    """
+    Bounded process pool shared by all sessions; see the module docstring.
+    Thread-safe. Keep one per server process, e.g. behind st.cache_resource.
+    workers defaults to $SB_SERVICE_WORKERS, else default_worker_count().
+    """
+
+    def __init__(self, workers=None, cache=None, workspace_dir=DEFAULT_WORKSPACE_DIR, max_in_flight=None):
+        self.workers = max(1, workers or int(os.environ.get("SB_SERVICE_WORKERS", 0)) or default_worker_count())
+        self.max_in_flight = max_in_flight or self.workers * 2
+        self.cache = cache
+        self.workspace_dir = Path(workspace_dir)
+        self._cond = threading.Condition()
+        self._queues = OrderedDict()  # session id -> deque of _Task, in round-robin order
+        self._retries = deque()  # tasks from a broken pool, to run alone before anything else
+        self._tasks = {}  # key -> _Task, while queued or running
+        self._jobs = {}
+        self._running = 0
+        self._pool = None
+        self._stopped = False
+        self._pruned_at = None
+        self._dispatcher = threading.Thread(target=self._dispatch, name="extraction-service", daemon=True)
+        self._dispatcher.start()
+
+    # ---------------- Workspaces ----------------
+    def workspace(self, session_id):
+        """This session's private directory (created on first use)."""
+        self._prune_if_due()
+        path = self.workspace_dir / _safe_session_id(session_id)
+        path.mkdir(parents=True, exist_ok=True)
+        os.utime(path)
+        return path
+
+    def prune_workspaces(self, max_age=WORKSPACE_MAX_AGE_SECONDS):
+        """Remove session workspaces not used for max_age seconds."""
+        if not self.workspace_dir.is_dir():
+            return
+        cutoff = time.time() - max_age
+        for path in self.workspace_dir.iterdir():
+            if path.is_dir() and path.stat().st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _prune_if_due(self):
+        # Sessions never say goodbye, so their workspaces are swept while the service is used
+        now = time.monotonic()
+        with self._cond:
+            if self._pruned_at is not None and now - self._pruned_at < WORKSPACE_PRUNE_INTERVAL_SECONDS:
+                return
+            self._pruned_at = now
+        self.prune_workspaces()
+
+    def end_session(self, session_id):
+        """Cancel the session's jobs and remove its workspace."""
+        with self._cond:
+            job_ids = [job.job_id for job in self._jobs.values() if job.session_id == session_id]
+        for job_id in job_ids:
+            self.forget(job_id)
+        shutil.rmtree(self.workspace_dir / _safe_session_id(session_id), ignore_errors=True)
+
+    # ---------------- Jobs ----------------
+    def submit(self, session_id, sources=(), options=JobOptions(), close=True):
+        """
+        Start a job for PDF paths or bytes and return its id. With close=False
+        more files can be added later; close() the job once they are all in.
+        """
+        job_id = uuid.uuid4().hex
+        with self._cond:
+            self._jobs[job_id] = _Job(job_id, session_id, options)
+        log_event("job_submitted", job=job_id, session=session_id)
+        self.add(job_id, sources)
+        if close:
+            self.close(job_id)
+        return job_id
+
+    def add(self, job_id, sources):
+        """Add files to an open job; returns their file indexes within the job."""
+        with self._cond:
+            job = self._jobs[job_id]
+        keyed = []
+        for source in sources:
+            if isinstance(source, os.PathLike):
+                source = str(source)
+            keyed.append((source, hash_pdf(source)))
+        indexes = []
+        with self._cond:
+            if job.closed:
+                raise ValueError(f"Job {job_id} is closed")
+            for source, digest in keyed:
+                index = len(job.sources)
+                job.sources.append(source if isinstance(source, str) else None)
+                job.pending += 1
+                indexes.append(index)
+                key = (digest, job.options)
+                task = self._tasks.get(key)
+                if task is None:
+                    task = self._tasks[key] = _Task(key, source, job.options)
+                # Queued for each session that wants it, so a duplicate never
+                # waits behind another session's backlog; whichever turn comes
+                # first runs it
+                if not task.started and not any(waiter[0].session_id == job.session_id for waiter in task.waiters):
+                    self._queues.setdefault(job.session_id, deque()).append(task)
+                task.waiters.append((job, index))
+            self._cond.notify_all()
+        return indexes
+
+    def close(self, job_id):
+        """Mark the job complete: no more files will be added."""
+        with self._cond:
+            self._jobs[job_id].closed = True
+            self._cond.notify_all()
+
+    def status(self, job_id):
+        with self._cond:
+            job = self._jobs[job_id]
+            queued = sum(
+                1 for task in self._tasks.values() if not task.started
+                for waiter in task.waiters if waiter[0] is job
+            )
+            return JobStatus(
+                job.job_id, job.session_id, len(job.sources), len(job.results),
+                sum(1 for result in job.results if result.error), queued, job.closed and job.pending == 0,
+            )
+
+    def results(self, job_id, start=0):
+        """The job's FileResults in completion order, from position start on."""
+        with self._cond:
+            return self._jobs[job_id].results[start:]
+
+    def wait(self, job_id, start=0, timeout=None):
+        """
+        Block until the job has more than start results or is finished (or
+        timeout seconds pass); returns results(job_id, start).
+        """
+        with self._cond:
+            job = self._jobs[job_id]
+            self._cond.wait_for(
+                lambda: len(job.results) > start or (job.closed and job.pending == 0) or self._stopped,
+                timeout=timeout,
+            )
+            return job.results[start:]
+
+    def forget(self, job_id):
+        """Drop a job and its results. Its files that no other job wants are not extracted."""
+        with self._cond:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return
+            for task in list(self._tasks.values()):
+                task.waiters = [waiter for waiter in task.waiters if waiter[0] is not job]
+                if not task.waiters and not task.started:
+                    del self._tasks[task.key]
+            self._cond.notify_all()
+
+    def shutdown(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._dispatcher.join(timeout=5)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---------------- Dispatcher ----------------
+    def _next_task(self):
+        """
+        Next runnable task: retries from a broken pool first, then one from
+        each session's queue in turn; None if all are empty.
+        """
+        while self._retries:
+            task = self._retries.popleft()
+            if not task.started and self._tasks.get(task.key) is task:
+                return task
+        while self._queues:
+            session_id, tasks = next(iter(self._queues.items()))
+            task = tasks.popleft()
+            if tasks:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+            # Already started from another session's queue, or forgotten by every job
+            if not task.started and self._tasks.get(task.key) is task:
+                return task
+        return None
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                task = None
+                while not self._stopped:
+                    if self._running < self.max_in_flight:
+                        task = self._next_task()
+                        if task is not None:
+                            break
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                task.started = True
+                self._running += 1
+                if task.alone:
+                    pool = ProcessPoolExecutor(max_workers=1)
+                else:
+                    if self._pool is None:
+                        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                    pool = self._pool
+            try:
+                future = pool.submit(
+                    extract_one, 0, task.source, self.cache if task.options.use_cache else None,
+                    task.options.use_layout_template, task.options.stream_pages,
+                )
+            except Exception as e:
+                self._finish(task, pool, error=e)
+                continue
+            future.add_done_callback(lambda future, task=task, pool=pool: self._finish(task, pool, future=future))
+
+    def _finish(self, task, pool, future=None, error=None):
+        if future is not None:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+        if task.alone:
+            pool.shutdown(wait=False)
+        elif isinstance(error, BrokenProcessPool):
+            # A dead worker fails every task in the shared pool, whichever
+            # session's file killed it. Each of them runs again alone, and
+            # only one that breaks its own pool as well is reported failed.
+            with self._cond:
+                if self._pool is pool:
+                    pool.shutdown(wait=False)
+                    self._pool = None
+                self._running -= 1
+                task.started = False
+                task.alone = True
+                self._retries.append(task)
+                self._cond.notify_all()
+            return
+        if error is not None:
+            result = FileResult(0, None, pd.DataFrame(), f"{type(error).__name__}: {error}", False, None)
+        log_file_result(result)
+        with self._cond:
+            self._running -= 1
+            if self._tasks.get(task.key) is task:
+                del self._tasks[task.key]
+            for job, index in task.waiters:
+                job.results.append(result._replace(index=index, source=job.sources[index]))
+                job.pending -= 1
+                if job.closed and job.pending == 0:
+                    log_event("job_finished", job=job.job_id, session=job.session_id, files=len(job.sources))
+            self._cond.notify_all()
+
+
+def _safe_session_id(session_id):
+    return "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in str(session_id)) or "session"
+
+
+def run_job(service, session_id, fetch, options=JobOptions(), on_result=None, poll_seconds=0.2):
+    """
+    run_pipeline on the shared service: submit every PDF from fetch (paths or
+    bytes) as one job and merge the results. on_result(done, result,
+    accumulator) is called as results arrive, while fetch is still being
+    consumed. The returned PipelineResult lists files in fetch order. The job
+    is forgotten on the way out, also when the caller is interrupted.
+    """
+    job_id = service.submit(session_id, options=options, close=False)
+    preview = RecordBatchAccumulator()
+    received = []
+    error = None
+
+    def deliver(results):
+        for result in results:
+            received.append(result)
+            if not result.error:
+                preview.append_frame(result.rows)
+            if on_result is not None:
+                on_result(len(received), result, preview)
+
+    try:
+        try:
+            for source in fetch:
+                service.add(job_id, [source])
+                deliver(service.results(job_id, len(received)))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        service.close(job_id)
+        while not service.status(job_id).finished:
+            deliver(service.wait(job_id, len(received), timeout=poll_seconds))
+        deliver(service.results(job_id, len(received)))
+    finally:
+        service.forget(job_id)
+
+    accumulator = RecordBatchAccumulator()
+    failures = []
+    ordered = sorted(received, key=lambda result: result.index)
+    for result in ordered:
+        if result.error:
+            failures.append(result)
+        else:
+            accumulator.append_frame(result.rows)
+    return PipelineResult(accumulator.to_frame(), failures, [result.source for result in ordered], error)
@@ -0,0 +1,368 @@
+"""
+Mailbox sources for fetching shipping-bill PDFs attached to e-mails.
+
+A MailboxSource lists messages (with the names of their attachments) and
+fetches a single attachment's bytes on demand. download_matching_pdfs keeps a
+small JSON state file in its state directory (the download directory unless
+given) with:
+  - a watermark (latest received time) and the ids of messages received
+    just before it, so repeat runs only list new mail;
+  - an index of every PDF attachment seen, so Shipping Bill numbers asked for
+    later are matched against it without walking old mail again;
+and one next to the downloads with the SHA-256 of every attachment saved
+there, so identical content is never written twice. Several download
+directories (e.g. one per Streamlit session) can share one state directory;
+threads take turns on each state file, so one session's sync or download
+never overwrites another's.
+
+Backends: OutlookSource (win32com, Windows only) and MaildirSource (a Maildir
+or a plain directory of .eml files, works anywhere).
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from email import policy
+from email.parser import BytesParser
+from pathlib import Path
+
+DEFAULT_DOWNLOAD_DIR = Path.home() / "Documents" / "temp_pdfs"
+STATE_FILE_NAME = ".mailbox_state.json"
+WATERMARK_LOOKBACK = timedelta(minutes=1)
+
+# message_id: stable id used to skip repeats, location: what fetch_attachment
+# needs to find the message again, received: naive datetime,
+# attachment_names: file names of all attachments
+MessageRef = namedtuple("MessageRef", ["message_id", "location", "received", "attachment_names"])
+
+
+class MailboxSource:
+    """Interface implemented by every mailbox backend."""
+
+    # Identifies the mailbox in the state file, e.g. "outlook:abc"
+    key = None
+
+    def iter_messages(self, since=None):
+        """Yield a MessageRef for each message received at or after since (all if None)."""
+        raise NotImplementedError
+
+    def fetch_attachment(self, location, filename):
+        """Return the bytes of one attachment of the message at location."""
+        raise NotImplementedError
+
+
+class OutlookSource(MailboxSource):
+    """A subfolder of the default Outlook Inbox, read through win32com."""
+
+    def __init__(self, folder_name):
+        self.folder_name = folder_name
+        self.key = f"outlook:{folder_name.lower()}"
+        self._namespace = None
+        self._folder = None
+
+    def _open(self):
+        if self._folder is not None:
+            return self._folder
+        try:
+            import pythoncom
+            import win32com.client
+        except ImportError as e:
+            raise RuntimeError("Outlook access needs pywin32 (win32com) on Windows.") from e
+
+        # COM must be initialised on each thread that uses it (the pipeline
+        # fetches from a background thread)
+        pythoncom.CoInitialize()
+
+        self._namespace = win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI")
+        inbox = self._namespace.GetDefaultFolder(6)  # 6 = Inbox
+
+        # Try to find the subfolder (case-insensitive)
+        for folder in inbox.Folders:
+            if folder.Name.lower() == self.folder_name.lower():
+                self._folder = folder
+                break
+        if self._folder is None:
+            raise FileNotFoundError(f"Folder '{self.folder_name}' not found in Outlook Inbox.")
+        return self._folder
+
+    @staticmethod
+    def _as_naive(value):
+        # pywintypes datetimes may carry a timezone; the watermark is naive local time
+        return datetime(value.year, value.month, value.day, value.hour, value.minute, value.second)
+
+    def iter_messages(self, since=None):
+        items = self._open().Items
+        if since is not None:
+            # Restrict only has minute resolution; recent_ids removes repeats
+            items = items.Restrict(f"[ReceivedTime] >= '{since:%m/%d/%Y %I:%M %p}'")
+        for msg in items:
+            names = [att.FileName for att in msg.Attachments]
+            yield MessageRef(msg.EntryID, msg.EntryID, self._as_naive(msg.ReceivedTime), names)
+
+    def fetch_attachment(self, location, filename):
+        import tempfile
+
+        self._open()
+        msg = self._namespace.GetItemFromID(location)
+        for att in msg.Attachments:
+            if att.FileName == filename:
+                fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
+                os.close(fd)
+                try:
+                    att.SaveAsFile(tmp_path)
+                    with open(tmp_path, "rb") as f:
+                        return f.read()
+                finally:
+                    os.remove(tmp_path)
+        raise FileNotFoundError(f"Attachment '{filename}' no longer on message {location}.")
+
+
+class MaildirSource(MailboxSource):
+    """
+    A Maildir (new/ and cur/ subfolders) or a plain directory of .eml files.
+    A message's received time is its file's modification time, which is the
+    delivery time in a Maildir.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.key = f"maildir:{self.path.resolve()}"
+        self.is_maildir = (self.path / "cur").is_dir() or (self.path / "new").is_dir()
+
+    def _message_files(self):
+        if self.is_maildir:
+            for sub in ("new", "cur"):
+                folder = self.path / sub
+                if folder.is_dir():
+                    yield from (p for p in folder.iterdir() if p.is_file())
+        else:
+            yield from sorted(self.path.glob("*.eml"))
+
+    def _location(self, path):
+        # Maildir files get ":2,<flags>" appended when read; the part before is stable
+        return path.name.split(":", 1)[0] if self.is_maildir else path.name
+
+    def _parse(self, path):
+        with open(path, "rb") as f:
+            return BytesParser(policy=policy.default).parse(f)
+
+    def iter_messages(self, since=None):
+        for path in self._message_files():
+            received = datetime.fromtimestamp(path.stat().st_mtime)
+            if since is not None and received < since:
+                continue
+            msg = self._parse(path)
+            location = self._location(path)
+            message_id = (msg.get("Message-ID") or "").strip() or location
+            names = [part.get_filename() for part in msg.iter_attachments() if part.get_filename()]
+            yield MessageRef(message_id, location, received, names)
+
+    def fetch_attachment(self, location, filename):
+        for path in self._message_files():
+            if self._location(path) == location:
+                for part in self._parse(path).iter_attachments():
+                    if part.get_filename() == filename:
+                        return part.get_payload(decode=True)
+        raise FileNotFoundError(f"Attachment '{filename}' not found in message {location}.")
+
+
+def build_sb_matcher(sb_numbers):
+    """
+    One compiled regex matching any of the Shipping Bill numbers as a
+    substring of a file name (longest first), or None for an empty list.
+    """
+    numbers = sorted({str(sb).strip() for sb in sb_numbers if str(sb).strip()}, key=len, reverse=True)
+    if not numbers:
+        return None
+    return re.compile("|".join(re.escape(n) for n in numbers))
+
+
+_state_locks = {}
+_state_locks_guard = threading.Lock()
+
+
+def _state_lock(state_path):
+    """The lock for one state file, shared by every thread of this process."""
+    with _state_locks_guard:
+        return _state_locks.setdefault(os.path.abspath(state_path), threading.Lock())
+
+
+def _safe_filename(name):
+    return name.replace(":", "_").replace("\\", "_").replace("/", "_")
+
+
+def _load_state(state_path, source_key):
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            all_state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        all_state = {}
+    state = all_state.get(source_key) or {}
+    state.setdefault("watermark", None)
+    state.setdefault("recent_ids", {})
+    state.setdefault("attachments", [])
+    state.setdefault("saved", {})
+    return all_state, state
+
+
+def _save_state(state_path, all_state, source_key, state):
+    all_state[source_key] = state
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(all_state, f, indent=1)
+    os.replace(tmp_path, state_path)
+
+
+def sync_mailbox(source, state_dir=DEFAULT_DOWNLOAD_DIR):
+    """
+    List messages received since the last sync and add their PDF attachments
+    to the index in the state file. Returns the number of new messages.
+    """
+    base_path = Path(state_dir)
+    base_path.mkdir(parents=True, exist_ok=True)
+    state_path = base_path / STATE_FILE_NAME
+    with _state_lock(state_path):
+        all_state, state = _load_state(state_path, source.key)
+
+        # {message id: received} for messages near the watermark; older ids are
+        # never listed again, so they can be forgotten
+        recent = dict(state["recent_ids"])
+        watermark = datetime.fromisoformat(state["watermark"]) if state["watermark"] else None
+        # Look back a minute so messages sharing the watermark's timestamp are not missed
+        since = watermark - WATERMARK_LOOKBACK if watermark else None
+
+        new_messages = 0
+        for ref in source.iter_messages(since=since):
+            if ref.message_id in recent:
+                continue
+            recent[ref.message_id] = ref.received.isoformat()
+            new_messages += 1
+            for name in ref.attachment_names:
+                if name.lower().endswith(".pdf"):
+                    state["attachments"].append({
+                        "message_id": ref.message_id,
+                        "location": ref.location,
+                        "filename": name,
+                        "sha256": None,
+                    })
+            if watermark is None or ref.received > watermark:
+                watermark = ref.received
+
+        if watermark is not None:
+            cutoff = (watermark - WATERMARK_LOOKBACK).isoformat()
+            recent = {mid: received for mid, received in recent.items() if received >= cutoff}
+        state["recent_ids"] = recent
+        state["watermark"] = watermark.isoformat() if watermark else None
+        _save_state(state_path, all_state, source.key, state)
+        return new_messages
+
+
+def iter_matching_pdfs(source, sb_numbers, download_dir=DEFAULT_DOWNLOAD_DIR, state_dir=None):
+    """
+    Sync the mailbox, then yield the local path of every indexed PDF
+    attachment whose file name contains one of sb_numbers, as soon as it is
+    saved into download_dir. Attachments already saved there with the same
+    content are not fetched or written again, and each path is yielded once.
+    The watermark and index live in state_dir (default: download_dir); the
+    state files are updated as each attachment is saved.
+    """
+    base_path = Path(download_dir)
+    base_path.mkdir(parents=True, exist_ok=True)
+    index_path = Path(state_dir or download_dir) / STATE_FILE_NAME
+    new_messages = sync_mailbox(source, index_path.parent)
+    print(f"📂 {new_messages} new message(s) in '{source.key}'.")
+
+    matcher = build_sb_matcher(sb_numbers)
+    if matcher is None:
+        return
+
+    with _state_lock(index_path):
+        _, index = _load_state(index_path, source.key)
+    saved_path = base_path / STATE_FILE_NAME
+    with _state_lock(saved_path):
+        _, saved_state = _load_state(saved_path, source.key)
+    saved = saved_state["saved"]
+
+    yielded = set()
+    written = 0
+    try:
+        for entry in index["attachments"]:
+            if not matcher.search(entry["filename"]):
+                continue
+
+            known_path = saved.get(entry["sha256"]) if entry["sha256"] else None
+            if not (known_path and os.path.exists(known_path)):
+                try:
+                    data = source.fetch_attachment(entry["location"], entry["filename"])
+                except Exception as e:
+                    print(f"⚠️ Could not fetch {entry['filename']}: {e}")
+                    continue
+                known_path, is_new = _save_attachment(base_path, index_path, source.key, entry, data)
+                if is_new:
+                    written += 1
+                    print(f"✅ Downloaded: {entry['filename']}")
+
+            if known_path not in yielded:
+                yielded.add(known_path)
+                yield known_path
+    finally:
+        if not yielded:
+            print("⚠️ No matching PDF attachments found.")
+        else:
+            print(f"📦 {len(yielded)} matching PDFs in '{base_path}' ({written} newly written).")
+
+
+def _save_attachment(base_path, index_path, source_key, entry, data):
+    """
+    Write a fetched attachment into base_path unless the same content is
+    already saved there, and record it in the state files as they are now.
+    Returns (local path, True if written by this call).
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    state_path = base_path / STATE_FILE_NAME
+    with _state_lock(state_path):
+        all_state, state = _load_state(state_path, source_key)
+        saved = state["saved"]
+        known_path = saved.get(digest)
+        is_new = not (known_path and os.path.exists(known_path))
+        if is_new:
+            save_path = base_path / _safe_filename(entry["filename"])
+            if save_path.exists():
+                # Same name, different content: keep both
+                save_path = save_path.with_name(f"{save_path.stem}_{digest[:8]}{save_path.suffix}")
+            with open(save_path, "wb") as f:
+                f.write(data)
+            known_path = saved[digest] = str(save_path)
+        _save_state(state_path, all_state, source_key, state)
+    with _state_lock(index_path):
+        all_state, state = _load_state(index_path, source_key)
+        for indexed in state["attachments"]:
+            if indexed["message_id"] == entry["message_id"] and indexed["filename"] == entry["filename"]:
+                indexed["sha256"] = digest
+        _save_state(index_path, all_state, source_key, state)
+    return known_path, is_new
+
+
+def download_matching_pdfs(source, sb_numbers, download_dir=DEFAULT_DOWNLOAD_DIR, state_dir=None):
+    """
+    Save every matching PDF attachment (see iter_matching_pdfs) and return
+    the local paths of all of them.
+    """
+    return list(iter_matching_pdfs(source, sb_numbers, download_dir, state_dir))
+
+
+def download_pdfs_from_outlook(folder_name, sb_numbers, download_dir="temp_pdfs"):
+    """
+    Connects to Outlook, searches the given folder for emails that have PDF attachments
+    containing any of the specified Shipping Bill Numbers in their filename.
+    Downloads those attachments into download_dir (under the user's Documents).
+    """
+    source = OutlookSource(folder_name)
+    try:
+        return download_matching_pdfs(source, sb_numbers, Path.home() / "Documents" / download_dir)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return []
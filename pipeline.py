@@ -0,0 +1,196 @@
+"""
+Download -> extract -> merge pipeline for the template flow.
+
+The fetcher (e.g. mailbox_sources.iter_matching_pdfs) runs in a background
+thread and hands each saved PDF to the extraction stage through a bounded
+queue, so mailbox I/O overlaps PDF parsing. The extraction stage keeps at
+most 2 * workers files in flight, and the merge stage (the caller) receives
+results in fetch order as they finish. When extraction falls behind, the
+queue fills up and the fetcher waits, so no more than
+max_pending + 2 * workers downloaded PDFs are ever waiting to be parsed.
+"""
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from accumulator import RecordBatchAccumulator
+from batch import FileResult, extract_one
+from instrumentation import log_file_result
+
+DEFAULT_MAX_PENDING = 4
+
+# rows: combined DataFrame (RECORD_COLUMNS), failures: FileResult list,
+# sources: fetched PDF paths in order, error: fetcher error message or None
+PipelineResult = namedtuple("PipelineResult", ["rows", "failures", "sources", "error"])
+
+_FETCH_DONE = object()
+
+
+class _FetchFailed:
+    def __init__(self, error):
+        self.error = error
+
+
+def _put(stage_queue, item, stop):
+    """Put item on the queue, waiting for room unless the pipeline is stopped."""
+    while not stop.is_set():
+        try:
+            stage_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _fetch_into(stage_queue, fetch, stop):
+    # Fetcher thread: pull PDFs from the source until it runs out or the pipeline stops
+    iterator = iter(fetch)
+    try:
+        for pdf_path in iterator:
+            if not _put(stage_queue, pdf_path, stop):
+                return
+        final = _FETCH_DONE
+    except Exception as e:
+        final = _FetchFailed(e)
+    finally:
+        if hasattr(iterator, "close"):
+            iterator.close()
+    _put(stage_queue, final, stop)
+
+
+def iter_pipeline(fetch, workers=1, max_pending=DEFAULT_MAX_PENDING, cache=None,
+                  use_layout_template=False, stream_pages=False):
+    """
+    Yield a FileResult per PDF from fetch (an iterable of paths, consumed in a
+    background thread), in fetch order, as soon as each is extracted.
+
+    workers <= 1 extracts in the calling thread while the fetcher keeps
+    downloading; otherwise a process pool of that size is used. max_pending
+    bounds the fetched PDFs waiting for an extraction slot. If fetch raises,
+    the PDFs fetched before the error are still extracted and yielded, then
+    the error is raised.
+    """
+    fetched = queue.Queue(maxsize=max(1, max_pending))
+    stop = threading.Event()
+    fetcher = threading.Thread(target=_fetch_into, args=(fetched, fetch, stop), name="pdf-fetcher", daemon=True)
+    fetcher.start()
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    max_in_flight = workers * 2 if pool is not None else 1
+    pending = {}
+    isolated = {}  # file index -> the single-worker pool it runs alone in
+    sources = []
+    fetch_error = None
+    fetch_done = False
+
+    def submit(index, pdf_path, alone=False):
+        if alone:
+            isolated[index] = ProcessPoolExecutor(max_workers=1)
+            return isolated[index].submit(extract_one, index, pdf_path, cache, use_layout_template, stream_pages)
+        if pool is not None:
+            return pool.submit(extract_one, index, pdf_path, cache, use_layout_template, stream_pages)
+        future = Future()
+        future.set_result(extract_one(index, pdf_path, cache, use_layout_template, stream_pages))
+        return future
+
+    def renew_pool(broken=()):
+        # A dead worker breaks the whole pool: every future in it fails, and
+        # which file killed it is unknown. Each file that was in it runs again
+        # alone, so only the one that breaks its own pool as well is reported
+        # failed; new files go to a fresh shared pool.
+        nonlocal pool
+        pool.shutdown(wait=False, cancel_futures=True)
+        pool = ProcessPoolExecutor(max_workers=workers)
+        for index in list(broken) + [index for index in pending if index not in isolated]:
+            pending[index] = submit(index, sources[index], alone=True)
+
+    try:
+        next_index = 0
+        while True:
+            # Take fetched PDFs while there is room; only wait for the fetcher when idle
+            while not fetch_done and len(pending) < max_in_flight:
+                try:
+                    item = fetched.get(block=not pending)
+                except queue.Empty:
+                    break
+                if item is _FETCH_DONE or isinstance(item, _FetchFailed):
+                    fetch_done = True
+                    fetch_error = item.error if isinstance(item, _FetchFailed) else None
+                    break
+                sources.append(item)
+                try:
+                    pending[len(sources) - 1] = submit(len(sources) - 1, item)
+                except BrokenProcessPool:
+                    renew_pool()
+                    pending[len(sources) - 1] = submit(len(sources) - 1, item)
+
+            if not pending:
+                break
+            future = pending.pop(next_index)
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                if next_index not in isolated:
+                    renew_pool([next_index])
+                    continue
+                # Crashed its worker again, running alone
+                result = FileResult(
+                    next_index, sources[next_index], pd.DataFrame(), f"{type(e).__name__}: {e}", False, None
+                )
+            except Exception as e:
+                result = FileResult(
+                    next_index, sources[next_index], pd.DataFrame(), f"{type(e).__name__}: {e}", False, None
+                )
+            if next_index in isolated:
+                isolated.pop(next_index).shutdown(wait=False)
+            next_index += 1
+            log_file_result(result)
+            yield result
+    finally:
+        stop.set()
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        for alone in isolated.values():
+            alone.shutdown(wait=False, cancel_futures=True)
+        fetcher.join(timeout=5)
+
+    if fetch_error is not None:
+        raise fetch_error
+
+
+def run_pipeline(fetch, workers=1, max_pending=DEFAULT_MAX_PENDING, on_result=None, cache=None,
+                 use_layout_template=False, stream_pages=False):
+    """
+    Run the whole pipeline and merge the results. on_result(done, result,
+    accumulator) is called after each file is merged, so a caller can show
+    partial results. Returns a PipelineResult; a fetcher error is reported in
+    it rather than raised, alongside everything extracted before it.
+    """
+    accumulator = RecordBatchAccumulator()
+    failures = []
+    sources = []
+    error = None
+    results = iter_pipeline(
+        fetch,
+        workers=workers,
+        max_pending=max_pending,
+        cache=cache,
+        use_layout_template=use_layout_template,
+        stream_pages=stream_pages,
+    )
+    try:
+        for done, result in enumerate(results, start=1):
+            sources.append(result.source)
+            if result.error:
+                failures.append(result)
+            elif result.rows is not None and not result.rows.empty:
+                accumulator.append_frame(result.rows)
+            if on_result is not None:
+                on_result(done, result, accumulator)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return PipelineResult(accumulator.to_frame(), failures, sources, error)
@@ -0,0 +1,159 @@
+"""
+Local SQLite store of every extracted SB/invoice row.
+
+Rows are kept per source PDF (by the SHA-256 of its bytes), so extracting
+the same PDF again replaces its rows instead of duplicating them. Each row
+also stores its normalized SHIPPINGBILL NO and INVOICE NO (see
+template_fill.normalize_key) under an index on (sb_key, invoice_key); SB
+lookups use the index prefix, so a template fill only reads the rows for
+the bills it lists, however much history the store holds.
+"""
+import os
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+import pandas as pd
+
+from extraction import RECORD_COLUMNS
+from template_fill import normalize_key
+
+DEFAULT_STORE_PATH = Path(
+    os.environ.get("SB_STORE_PATH", Path.home() / ".local" / "share" / "sb_extractor" / "records.sqlite3")
+)
+
+# Keys per query; keeps each statement well under SQLite's parameter limit
+QUERY_CHUNK = 500
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _bump_revision(conn):
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+
+
+class RecordStore:
+    """
+    SB/invoice rows under the RECORD_COLUMNS schema, plus one line per source
+    PDF. Every call opens its own connection, so one store object can be
+    shared by Streamlit sessions and threads.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        columns = ", ".join(f"{_quote(col)} TEXT" for col in RECORD_COLUMNS)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS sources (
+                    pdf_hash TEXT PRIMARY KEY,
+                    source_name TEXT,
+                    row_count INTEGER NOT NULL,
+                    stored_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY,
+                    pdf_hash TEXT NOT NULL,
+                    sb_key TEXT,
+                    invoice_key TEXT,
+                    {columns}
+                );
+                CREATE INDEX IF NOT EXISTS records_sb_invoice ON records (sb_key, invoice_key);
+                CREATE INDEX IF NOT EXISTS records_pdf ON records (pdf_hash);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+                INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0);
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def put_rows(self, pdf_hash, rows, source_name=None):
+        """
+        Store the rows extracted from one PDF, replacing any rows stored for
+        the same pdf_hash before. Returns the number of rows stored.
+        """
+        rows = pd.DataFrame(columns=RECORD_COLUMNS) if rows is None else rows
+        unexpected = [col for col in rows.columns if col not in RECORD_COLUMNS]
+        if unexpected:
+            raise ValueError(f"Columns not in the store schema: {unexpected}")
+
+        values = rows.reindex(columns=RECORD_COLUMNS).astype(object)
+        values = values.where(values.notna(), None).to_numpy().tolist()
+        sb_idx = RECORD_COLUMNS.index("SHIPPINGBILL NO")
+        inv_idx = RECORD_COLUMNS.index("INVOICE NO")
+        records = [
+            (pdf_hash, normalize_key(row[sb_idx]), normalize_key(row[inv_idx]),
+             *[None if v is None else str(v) for v in row])
+            for row in values
+        ]
+
+        placeholders = ", ".join("?" * (3 + len(RECORD_COLUMNS)))
+        columns = ", ".join(["pdf_hash", "sb_key", "invoice_key"] + [_quote(col) for col in RECORD_COLUMNS])
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM records WHERE pdf_hash = ?", (pdf_hash,))
+            conn.executemany(f"INSERT INTO records ({columns}) VALUES ({placeholders})", records)
+            conn.execute(
+                "INSERT OR REPLACE INTO sources (pdf_hash, source_name, row_count, stored_at) VALUES (?, ?, ?, ?)",
+                (pdf_hash, source_name, len(records), time.time()),
+            )
+            _bump_revision(conn)
+        return len(records)
+
+    def delete_pdf(self, pdf_hash):
+        """Remove the rows stored for one PDF; returns how many there were."""
+        with closing(self._connect()) as conn, conn:
+            deleted = conn.execute("DELETE FROM records WHERE pdf_hash = ?", (pdf_hash,)).rowcount
+            conn.execute("DELETE FROM sources WHERE pdf_hash = ?", (pdf_hash,))
+            _bump_revision(conn)
+        return deleted
+
+    def has_pdf(self, pdf_hash):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT 1 FROM sources WHERE pdf_hash = ?", (pdf_hash,)).fetchone() is not None
+
+    def _select(self, source, params_list):
+        """
+        Rows of "SELECT ... FROM <source(params)>" for each parameter chunk,
+        as one DataFrame in storage order.
+        """
+        columns = ", ".join(["records.id"] + [f"records.{_quote(col)}" for col in RECORD_COLUMNS])
+        found = []
+        with closing(self._connect()) as conn:
+            for params in params_list:
+                found.extend(conn.execute(f"SELECT {columns} FROM {source(params)}", params))
+        found.sort(key=lambda row: row[0])
+        return pd.DataFrame([row[1:] for row in found], columns=RECORD_COLUMNS)
+
+    def rows_for_shipping_bills(self, sb_numbers):
+        """All stored rows whose SHIPPINGBILL NO is one of sb_numbers, oldest first."""
+        keys = sorted({key for key in map(normalize_key, sb_numbers) if key is not None})
+        chunks = [keys[i:i + QUERY_CHUNK] for i in range(0, len(keys), QUERY_CHUNK)]
+        return self._select(lambda params: f"records WHERE sb_key IN ({', '.join('?' * len(params))})", chunks)
+
+    def rows_for_pdfs(self, pdf_hashes):
+        """All stored rows extracted from the PDFs with these hashes, oldest first."""
+        hashes = sorted(set(pdf_hashes))
+        chunks = [hashes[i:i + QUERY_CHUNK] for i in range(0, len(hashes), QUERY_CHUNK)]
+        return self._select(lambda params: f"records WHERE pdf_hash IN ({', '.join('?' * len(params))})", chunks)
+
+    def revision(self):
+        """
+        A counter bumped in the same transaction as every put_rows and
+        delete_pdf, so it changes whenever rows do (row ids alone can be
+        reused after a delete); cheap enough to call on every rerun.
+        """
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def stats(self):
+        """{"pdfs": number of source PDFs, "rows": number of stored rows}."""
+        with closing(self._connect()) as conn:
+            pdfs, rows = conn.execute("SELECT COUNT(*), COALESCE(SUM(row_count), 0) FROM sources").fetchone()
+        return {"pdfs": pdfs, "rows": rows}
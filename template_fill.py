@@ -0,0 +1,321 @@
+"""
+Filling the user's Excel template (openpyxl worksheet) from extracted data.
+
+Each step first works out every cell update as a plan of
+(row, column, value) tuples, then writes them into the worksheet in one pass,
+so the lookups never run inside the openpyxl row loop.
+"""
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+# SIH column -> template header (both lower-case)
+SIH_MAPPING = {
+    "invoice id": "invoice no",
+    "due date": "due date",
+    "usd": "realized amount in remittance currency",
+    "amount": "realized amount in invoice currency",
+    "drawee name": "drawee name",
+    "drawee address": "drawee address"
+    # Add more fields here if needed
+}
+
+# Columns used to match template rows to extracted rows; never overwritten
+KEY_COLUMNS = ("SHIPPINGBILL NO", "INVOICE NO")
+
+# filled_rows: template rows matched to extracted data
+# pair_matches / sb_matches: matched on (SB, invoice) / on SB alone
+# cells_written: template cells that were empty and got a value
+# peak_memory_bytes: peak traced allocation during the fill, or None if not tracked
+FillReport = namedtuple(
+    "FillReport", ["filled_rows", "pair_matches", "sb_matches", "cells_written", "peak_memory_bytes"]
+)
+
+# filled_rows: template rows matched to an SIH line
+# duplicate_ids: {invoice id: number of SIH lines}, only the first line is used
+# missing_ids: template invoice numbers with no SIH line, in template order
+SihJoinReport = namedtuple("SihJoinReport", ["filled_rows", "duplicate_ids", "missing_ids"])
+
+
+def normalize_key(value):
+    """
+    Canonical form of a shipping bill or invoice number for matching: stripped,
+    upper-case, and with integral floats (Excel's 12345.0) written as integers.
+    Blank -> None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if pd.isna(value):
+            return None
+        if value.is_integer():
+            value = int(value)
+    key = str(value).strip().upper()
+    return key or None
+
+
+def header_columns(ws, lower=False):
+    """{header text: 1-based column index} from the worksheet's first row."""
+    headers = {}
+    for cell in ws[1]:
+        if cell.value:
+            name = str(cell.value).strip()
+            headers[name.lower() if lower else name] = cell.column
+    return headers
+
+
+def find_sih_header_row(sih_raw, max_rows=5):
+    """Index of the first row (within max_rows) containing 'Invoice Id', or None."""
+    for i in range(min(max_rows, len(sih_raw))):
+        row_values = sih_raw.iloc[i].astype(str).str.strip().tolist()
+        if any("Invoice Id" in val for val in row_values):
+            return i
+    return None
+
+
+def read_sih_frame(source, sheet_name="SIH"):
+    """
+    Read the SIH sheet without assuming where its header is. Returns
+    (sih_df with stripped lower-case headers, header row index), or
+    (None, None) when no 'Invoice Id' header is found.
+    """
+    # --- Read SIH without assuming header ---
+    sih_df = pd.read_excel(source, sheet_name=sheet_name, header=None)
+
+    # --- Find header row in first 5 rows ---
+    header_row_index = find_sih_header_row(sih_df)
+    if header_row_index is None:
+        return None, None
+
+    # Set proper headers
+    sih_df.columns = sih_df.iloc[header_row_index]
+    sih_df = sih_df.iloc[header_row_index + 1:].reset_index(drop=True)
+
+    # Normalize SIH headers
+    sih_df.columns = sih_df.columns.astype(str).str.strip().str.lower()
+    return sih_df, header_row_index
+
+
+def build_sih_index(sih_df, key_column="invoice id"):
+    """
+    Hash index over the SIH lines: {normalized invoice id: first row position}.
+    Returns (index, duplicates) where duplicates maps ids seen more than once
+    to their line count.
+    """
+    index = {}
+    counts = {}
+    for position, value in enumerate(sih_df[key_column].tolist()):
+        key = normalize_key(value)
+        if key is None:
+            continue
+        counts[key] = counts.get(key, 0) + 1
+        index.setdefault(key, position)
+    duplicates = {key: n for key, n in counts.items() if n > 1}
+    return index, duplicates
+
+
+@timed("sih_join")
+def plan_sih_updates(ws, sih_df, mapping=SIH_MAPPING):
+    """
+    Work out every SIH cell update for the template worksheet.
+    Returns (updates, report): updates is a list of (row, column, value) and
+    report is a SihJoinReport.
+    """
+    headers = header_columns(ws, lower=True)
+    inv_col = headers.get("invoice no")
+    if inv_col is None or "invoice id" not in sih_df.columns:
+        return [], SihJoinReport(0, {}, [])
+
+    index, duplicates = build_sih_index(sih_df)
+
+    # Column values pulled out once, so each match is a list lookup
+    targets = []
+    for sih_col, template_col in mapping.items():
+        target_col = headers.get(template_col.lower())
+        if target_col and sih_col in sih_df.columns:
+            targets.append((target_col, sih_df[sih_col].tolist(), sih_col.lower() == "due date"))
+
+    updates = []
+    missing = []
+    parsed_dates = {}  # raw due date -> parsed value, so each distinct date is parsed once
+    filled_rows = 0
+    for row_number, (inv_value,) in enumerate(
+        ws.iter_rows(min_row=2, min_col=inv_col, max_col=inv_col, values_only=True), start=2
+    ):
+        key = normalize_key(inv_value) if inv_value else None
+        if key is None:
+            continue
+        position = index.get(key)
+        if position is None:
+            missing.append(str(inv_value).strip())
+            continue
+        for target_col, values, is_date in targets:
+            value = values[position]
+            if pd.notna(value):
+                if is_date:
+                    if value not in parsed_dates:
+                        parsed_dates[value] = pd.to_datetime(value)
+                    value = parsed_dates[value]
+                updates.append((row_number, target_col, value))
+        filled_rows += 1
+
+    return updates, SihJoinReport(filled_rows, duplicates, list(dict.fromkeys(missing)))
+
+
+def apply_updates(ws, updates):
+    """Write a plan of (row, column, value) updates into the worksheet."""
+    for row_number, column, value in updates:
+        ws.cell(row=row_number, column=column).value = value
+
+
+# ---------------- Extracted-data fill ----------------
+def _blank_mask(values):
+    """True where a value is None/NaN or only whitespace."""
+    series = pd.Series(values, dtype=object)
+    return series.isna().to_numpy() | (series.astype(str).str.strip() == "").to_numpy()
+
+
+def _first_positions(keys):
+    """pd.Index of unique keys and the row position of each key's first occurrence."""
+    first = pd.Series(np.arange(len(keys))).groupby(keys, sort=False, dropna=True).first()
+    return first.index, first.to_numpy()
+
+
+class _FillLookup:
+    """
+    Extracted rows indexed by normalized (SB, invoice) pairs and by SB alone.
+    For both, the first extracted row with a given key wins.
+    """
+
+    def __init__(self, extracted_df, fields):
+        sb_keys = pd.Series(extracted_df["SHIPPINGBILL NO"].map(normalize_key).to_numpy(), dtype=object)
+        self.fields = fields
+        self.values = {field: np.array(extracted_df[field].tolist() + [None], dtype=object) for field in fields}
+
+        self.sb_index, self.sb_positions = _first_positions(sb_keys)
+        self.pair_index = None
+        if "INVOICE NO" in extracted_df.columns:
+            inv_keys = pd.Series(extracted_df["INVOICE NO"].map(normalize_key).to_numpy(), dtype=object)
+            keep = sb_keys.notna() & inv_keys.notna()
+            pairs = pd.MultiIndex.from_arrays([sb_keys[keep], inv_keys[keep]])
+            positions = np.flatnonzero(keep.to_numpy())
+            first = ~pairs.duplicated(keep="first")
+            self.pair_index = pairs[first]
+            self.pair_positions = positions[first]
+
+    def match(self, sb_keys, inv_keys):
+        """
+        Row positions into the extracted data for each template row (-1 if no
+        match), trying (SB, invoice) first and falling back to SB alone.
+        Returns (positions, matched_on_pair).
+        """
+        n = len(sb_keys)
+        positions = np.full(n, -1)
+        on_pair = np.zeros(n, dtype=bool)
+
+        if self.pair_index is not None and inv_keys is not None:
+            found = self.pair_index.get_indexer(pd.MultiIndex.from_arrays([sb_keys, inv_keys]))
+            hit = (found >= 0) & pd.notna(sb_keys) & pd.notna(inv_keys)
+            positions[hit] = self.pair_positions[found[hit]]
+            on_pair = hit
+
+        pending = (positions < 0) & pd.notna(sb_keys)
+        # No extracted row has an SB number: nothing to fall back to
+        if pending.any() and len(self.sb_positions):
+            found = self.sb_index.get_indexer(pd.Index(sb_keys[pending]))
+            sb_positions = np.where(found >= 0, self.sb_positions[np.maximum(found, 0)], -1)
+            positions[pending] = sb_positions
+        return positions, on_pair
+
+
+def _plan_fill_chunk(lookup, headers, row_numbers, sb_values, inv_values, current):
+    """(row, column, value) updates for one chunk of template rows."""
+    sb_keys = np.array([normalize_key(v) if v else None for v in sb_values], dtype=object)
+    inv_keys = None
+    if inv_values is not None:
+        inv_keys = np.array([normalize_key(v) if v else None for v in inv_values], dtype=object)
+
+    positions, on_pair = lookup.match(sb_keys, inv_keys)
+    matched = positions >= 0
+    row_numbers = np.asarray(row_numbers)
+
+    updates = []
+    for field in lookup.fields:
+        # Extra trailing None in lookup.values makes position -1 read as blank
+        new_values = lookup.values[field][positions]
+        write = matched & _blank_mask(current[field]) & ~_blank_mask(new_values)
+        column = headers[field]
+        updates.extend(zip(row_numbers[write].tolist(), [column] * int(write.sum()), new_values[write].tolist()))
+    return updates, int(matched.sum()), int(on_pair.sum())
+
+
+@timed("fill")
+def fill_template(ws, extracted_df, chunk_rows=20000, track_memory=False):
+    """
+    Fill empty template cells from extracted_df, preserving the template's
+    formatting. Rows match on (SHIPPINGBILL NO, INVOICE NO) and fall back to
+    SHIPPINGBILL NO alone; the key columns themselves are never written.
+
+    Header columns are resolved once, the match is a vectorized index lookup,
+    and the worksheet is read and written chunk_rows rows at a time so the
+    working set stays bounded for very large templates. Returns a FillReport.
+    """
+    if track_memory:
+        tracemalloc.start()
+    try:
+        headers = header_columns(ws)
+        if (
+            extracted_df.empty
+            or "SHIPPINGBILL NO" not in headers
+            or "SHIPPINGBILL NO" not in extracted_df.columns
+        ):
+            return FillReport(0, 0, 0, 0, None)
+
+        fields = [
+            col for col in extracted_df.columns
+            if col in headers and col not in KEY_COLUMNS
+        ]
+        lookup = _FillLookup(extracted_df, fields)
+
+        sb_idx = headers["SHIPPINGBILL NO"] - 1
+        inv_idx = headers["INVOICE NO"] - 1 if "INVOICE NO" in headers else None
+        field_idx = {field: headers[field] - 1 for field in fields}
+
+        totals = [0, 0, 0]  # matched rows, pair matches, cells written
+
+        def flush(first_row, chunk):
+            row_numbers = range(first_row, first_row + len(chunk))
+            updates, matched, pairs = _plan_fill_chunk(
+                lookup,
+                headers,
+                row_numbers,
+                [row[sb_idx].value for row in chunk],
+                [row[inv_idx].value for row in chunk] if inv_idx is not None else None,
+                {field: [row[idx].value for row in chunk] for field, idx in field_idx.items()},
+            )
+            # The chunk already holds the cell objects, so write straight to them
+            for row_number, column, value in updates:
+                chunk[row_number - first_row][column - 1].value = value
+            totals[0] += matched
+            totals[1] += pairs
+            totals[2] += len(updates)
+
+        width = max([sb_idx, inv_idx or 0] + list(field_idx.values())) + 1
+        first_row, chunk = 2, []
+        for row in ws.iter_rows(min_row=2, max_col=width):
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                flush(first_row, chunk)
+                first_row, chunk = first_row + len(chunk), []
+        if chunk:
+            flush(first_row, chunk)
+
+        peak = tracemalloc.get_traced_memory()[1] if track_memory else None
+        return FillReport(totals[0], totals[1], totals[0] - totals[1], totals[2], peak)
+    finally:
+        if track_memory:
+            tracemalloc.stop()
@@ -0,0 +1,147 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+GRID_LEFT, GRID_TOP, ROW_HEIGHT = 20, 700, 20
+# Columns holding long values are wider so their text stays inside the cell
+WIDE_COLUMNS = {2, 4, 9, 29}
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf_bytes(pages):
+    """A minimal PDF with one page per content stream, in Helvetica."""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, content in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(content.encode('latin-1'))} >>\nstream\n{content}\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+class PdfFactory:
+    """Builds shipping-bill shaped PDFs in a test's tmp_path, with the layout the extractors expect."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def grid_page(self, lines, cells, rows=30, cols=30):
+        """Content stream: text lines at the top and a ruled grid with small text in the given cells."""
+        wide = WIDE_COLUMNS if cols == 30 else set()
+        narrow_width = (528 - 80 * len(wide)) / (cols - len(wide))
+        xs = [GRID_LEFT]
+        for c in range(cols):
+            xs.append(xs[-1] + (80 if c in wide else narrow_width))
+
+        ops = []
+        y = 820
+        for line in lines:
+            ops.append(f"BT /F1 8 Tf 20 {y} Td ({_escape(line)}) Tj ET")
+            y -= 12
+        ops.append("0.5 w")
+        for r in range(rows + 1):
+            yy = GRID_TOP - r * ROW_HEIGHT
+            ops.append(f"{GRID_LEFT} {yy} m {xs[-1]:.2f} {yy} l S")
+        for x in xs:
+            ops.append(f"{x:.2f} {GRID_TOP} m {x:.2f} {GRID_TOP - rows * ROW_HEIGHT} l S")
+        for (r, c), text in cells.items():
+            ops.append(
+                f"BT /F1 2.5 Tf {xs[c] + 1:.2f} {GRID_TOP - (r + 1) * ROW_HEIGHT + 6} Td ({_escape(text)}) Tj ET"
+            )
+        return "\n".join(ops)
+
+    def chars_page(self, text, order):
+        """A page drawing text one character at a time, in the given order of positions."""
+        return "\n".join(f"BT /F1 8 Tf {20 + 5 * i} 780 Td ({_escape(text[i])}) Tj ET" for i in order)
+
+    def first_page(self, sb_number="1234567", country="SWEDN", port="GOTHENBURG"):
+        return self.grid_page(
+            [
+                "IEC/Br : 0512345678 GSTIN/TYPE : 33AAACA1234A1Z5 CB CODE : AAACB1234",
+                "13.COUNTRY OF FINALDESTINATIO",
+                country,
+                "Port Code SB No SB Date",
+                f"INMAA1 {sb_number} 12-JAN-24",
+            ],
+            {(12, 29): "PORT OF DISCHARGE", (13, 29): port},
+        )
+
+    def invoice_page(self, k, rows=30):
+        cells = {
+            (11, 2): f"INV/{k:03d} 01/02/2024",
+            (12, 9): "2.BUYER'S NAME & ADDRESS",
+            (13, 9): f"BUYER {k} AB",
+            (14, 9): "STREET 1",
+            (15, 9): "CITY",
+        }
+        if rows > 28:
+            cells[(28, 4)] = "STEEL PARTS"
+        return self.grid_page(["PART - II - INVOICE DETAILS"], cells, rows=rows)
+
+    def write(self, name, pages):
+        """Write the pages as <tmp_path>/<name>; returns the path as a str."""
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(_pdf_bytes(pages))
+        return path
+
+    def shipping_bill(self, name="SB.pdf", invoices=3, sb_number="1234567", **first_page):
+        """A shipping bill: the SB-level first page, then one page per invoice."""
+        pages = [self.first_page(sb_number, **first_page)] + [self.invoice_page(k) for k in range(invoices)]
+        return self.write(name, pages)
+
+    def invoice_only(self, name="invoices.pdf", invoices=2):
+        """Invoice pages without an SB-level first page."""
+        return self.write(name, [self.invoice_page(k) for k in range(invoices)])
+
+    def batch(self, files, invoices=3, first_sb_number=1000000):
+        """files shipping bills with consecutive SB numbers; returns their paths in order."""
+        return [
+            self.shipping_bill(f"SB_{first_sb_number + i}.pdf", invoices, str(first_sb_number + i))
+            for i in range(files)
+        ]
+
+
+class CrashingPdf(bytes):
+    """PDF bytes that kill the worker process they are sent to."""
+
+    def __reduce__(self):
+        return os._exit, (1,)
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    return PdfFactory(str(tmp_path))
+
+
+@pytest.fixture
+def crashing_pdf():
+    return CrashingPdf(b"%PDF")
@@ -0,0 +1,78 @@
+import pandas as pd
+
+from batch import CarryDown, extract_one, extract_pdf, iter_extract, tidy_combined_rows
+from extraction import RECORD_COLUMNS
+from extraction_cache import ExtractionCache
+
+
+def test_tidy_invoice_rows_without_sb_columns():
+    rows = pd.DataFrame({"INVOICE NO": ["INV/1", None], "DRAWEE NAME": ["BUYER", None]})
+    tidy = tidy_combined_rows(rows)
+    assert list(tidy.columns) == RECORD_COLUMNS
+    assert tidy["INVOICE NO"].tolist() == ["INV/1"]
+    assert tidy["SHIPPINGBILL NO"].isna().all()
+
+
+def test_tidy_empty_frame_has_record_columns():
+    assert list(tidy_combined_rows(pd.DataFrame()).columns) == RECORD_COLUMNS
+
+
+def test_tidy_carries_sb_columns_down():
+    rows = pd.DataFrame({
+        "SHIPPINGBILL NO": ["111", None, None],
+        "INVOICE NO": [None, "INV/1", "INV/2"],
+    })
+    tidy = tidy_combined_rows(rows)
+    assert tidy["SHIPPINGBILL NO"].tolist() == ["111", "111"]
+    assert tidy["INVOICE NO"].tolist() == ["INV/1", "INV/2"]
+
+
+def test_invoice_only_pdf_tidies(pdfs):
+    result = extract_one(0, pdfs.invoice_only())
+    assert result.error is None
+    tidy = tidy_combined_rows(result.rows)
+    assert list(tidy.columns) == RECORD_COLUMNS
+    assert not tidy.empty
+    assert tidy["INVOICE NO"].tolist() == result.rows["INVOICE NO"].tolist()
+
+
+def test_carry_down_matches_whole_batch_tidy():
+    files = [
+        pd.DataFrame({"SHIPPINGBILL NO": ["111", None], "IE CODE": ["A", None], "INVOICE NO": [None, "INV/1"]}),
+        pd.DataFrame({"INVOICE NO": ["INV/2", "INV/3"]}),
+        pd.DataFrame(),
+        pd.DataFrame({"SHIPPINGBILL NO": ["222", None], "INVOICE NO": [None, "INV/4"]}),
+    ]
+    carry_down = CarryDown()
+    streamed = pd.concat([carry_down.tidy(rows) for rows in files], ignore_index=True)
+    whole = tidy_combined_rows(pd.concat(files, ignore_index=True)).reset_index(drop=True)
+    pd.testing.assert_frame_equal(streamed, whole, check_dtype=False)
+    assert streamed["SHIPPINGBILL NO"].tolist() == ["111", "111", "111", "222"]
+    assert streamed["IE CODE"].tolist() == ["A", "A", "A", "A"]
+
+
+def test_worker_crash_fails_only_the_crashing_file(pdfs, crashing_pdf):
+    paths = pdfs.batch(files=7, invoices=1)
+    sources = paths[:3] + [crashing_pdf] + paths[3:]
+    results = list(iter_extract(sources, workers=4))
+    assert [result.index for result in results] == list(range(8))
+    assert "BrokenProcessPool" in results[3].error
+    for result in results[:3] + results[4:]:
+        assert result.error is None
+        assert not result.rows.empty
+
+
+def test_cache_entry_without_tables_is_a_miss_when_tables_are_needed(pdfs, tmp_path):
+    pdf_path = pdfs.shipping_bill(invoices=2)
+    cache = ExtractionCache(tmp_path / "cache")
+
+    streamed = extract_pdf(pdf_path, cache=cache, stream_pages=True)
+    assert not streamed.cached and streamed.tables is None
+
+    full = extract_pdf(pdf_path, cache=cache)
+    assert not full.cached and full.tables
+
+    again = extract_pdf(pdf_path, cache=cache)
+    assert again.cached and again.tables
+    # An entry with tables answers table-less runs too
+    assert extract_pdf(pdf_path, cache=cache, stream_pages=True).cached
@@ -0,0 +1,27 @@
+import os
+import signal
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def test_sigterm_stops_watch(tmp_path):
+    drop = tmp_path / "drop"
+    drop.mkdir()
+    daemon = subprocess.Popen(
+        [sys.executable, "-u", os.path.join(ROOT, "cli.py"), str(drop), "--watch", "-o", str(tmp_path / "out")],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    try:
+        for line in daemon.stdout:
+            if "Watching" in line:
+                break
+        daemon.send_signal(signal.SIGTERM)
+        output, _ = daemon.communicate(timeout=30)
+    finally:
+        daemon.kill()
+    assert daemon.returncode == 0
+    assert "Stopped watching" in output
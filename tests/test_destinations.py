@@ -0,0 +1,39 @@
+import pytest
+
+from destinations import resolve_country, resolve_port
+
+
+@pytest.mark.parametrize("text, country", [
+    ("SWEDN", "SWEDEN"),
+    ("UNITED STATE", "UNITED STATES"),
+    ("NETHERLNDS", "NETHERLANDS"),
+    ("UAE", "UNITED ARAB EMIRATES"),
+    ("USA", "UNITED STATES"),
+    ("IND", "INDIA"),
+])
+def test_country_names_codes_and_misspellings_resolve(text, country):
+    assert resolve_country(text) == country
+
+
+@pytest.mark.parametrize("text", [
+    "GOTHENBURG", "HAMBURG", "ROTTERDAM", "CONSIGNEE", "EXPORTER", "TOKYO", "TORONTO",
+    "LOS ANGELES", "OSLO", "MALMO", "AND", "CAN", "MAR",
+])
+def test_other_words_are_not_countries(text):
+    assert resolve_country(text) is None
+
+
+@pytest.mark.parametrize("text, port", [
+    ("GOTHENBURG", "GOTHENBURG"),
+    ("INMAA1", "CHENNAI"),
+    ("SEGOT", "GOTHENBURG"),
+    ("NAHVA SHEVA", "NHAVA SHEVA"),
+    ("JEBAL ALI", "JEBEL ALI"),
+])
+def test_port_names_codes_and_misspellings_resolve(text, port):
+    assert resolve_port(text) == port
+
+
+@pytest.mark.parametrize("text", ["USA", "SWEDEN", "CONSIGNEE"])
+def test_other_words_are_not_ports(text):
+    assert resolve_port(text) is None
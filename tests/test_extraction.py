@@ -0,0 +1,174 @@
+import random
+import re
+
+import pandas as pd
+import pdfplumber
+
+from destinations import resolve_country
+from extraction import (
+    INVOICE_DETAILS_MARKER,
+    PAGE_FIRST,
+    PAGE_INVOICE,
+    PAGE_SKIP,
+    LayoutTemplate,
+    ParsedDocument,
+    _as_tables_dict,
+    _combine_sb_with_invoices,
+    _invoice_rows_from_tables,
+    extract_sb_data,
+)
+
+
+def test_classification_matches_layout_text(pdfs):
+    marker = INVOICE_DETAILS_MARKER
+    pages = [
+        pdfs.grid_page(["IEC/Br : 0512345678"], {}),
+        pdfs.grid_page([marker], {(11, 2): "INV/1 01/02/2024"}),
+        # Same characters without the spaces: the layout text lacks the marker
+        pdfs.grid_page([marker.replace(" ", "")], {}),
+        # Drawn back to front: only the layout text reads it in order
+        pdfs.chars_page(marker, reversed(range(len(marker)))),
+        pdfs.grid_page(["ANNEXURE"], {(1, 1): "x"}, rows=5, cols=5),
+        "",
+    ]
+    path = pdfs.write("pages.pdf", pages)
+
+    with pdfplumber.open(path) as pdf:
+        expected = [
+            PAGE_INVOICE if marker in (page.extract_text() or "") else PAGE_SKIP for page in pdf.pages
+        ]
+    expected[0] = PAGE_FIRST
+    assert expected == [PAGE_FIRST, PAGE_INVOICE, PAGE_SKIP, PAGE_INVOICE, PAGE_SKIP, PAGE_SKIP]
+
+    with ParsedDocument(path) as doc:
+        assert [doc.classify_page(i) for i in range(doc.page_count)] == expected
+
+
+def test_layout_template_checks_the_rows_below_the_anchor(pdfs):
+    # Same layout, then one whose table ends above the goods row
+    path = pdfs.write("invoices.pdf", [pdfs.invoice_page(0), pdfs.invoice_page(1), pdfs.invoice_page(2, rows=25)])
+
+    template = LayoutTemplate()
+    with pdfplumber.open(path) as pdf:
+        assert template.learn(PAGE_INVOICE, pdf.pages[0], pdf.pages[0].find_tables())
+        values = template.read(PAGE_INVOICE, pdf.pages[1])
+        assert values[(13, 9)] == "BUYER 1 AB" and values[(28, 4)] == "STEEL PARTS"
+        assert template.read(PAGE_INVOICE, pdf.pages[2]) is None
+    assert (template.region_reads, template.fallbacks) == (1, 1)
+
+
+class TextDocument(ParsedDocument):
+    """A ParsedDocument whose first page is the given text; no PDF behind it."""
+
+    def __init__(self, text):
+        self._page_text = {0: text}
+
+
+def line_by_line_sb_data(text):
+    """
+    extract_sb_data as it was before SB_FIELDS: one full-text search per code
+    and a pass over the lines per section. The country match is the
+    resolver's, as it is in the rules.
+    """
+    iec = re.search(r'IEC/Br\s*[:\-]?\s*([A-Z0-9]+)', text)
+    gstin = re.search(r'GSTIN/TYPE\s*[:\-]?\s*([A-Z0-9]+)', text)
+    cbcode = re.search(r'CB CODE\s*[:\-]?\s*([A-Z0-9]+)', text)
+    lines = text.split('\n')
+
+    final_dest_value = ""
+    for i, line in enumerate(lines):
+        if re.search(r'13\.*\s*COUNTRY\s*OF\s*FINALDESTINATIO', line, re.IGNORECASE):
+            after = line.split("13.COUNTRY OF FINALDESTINATIO")[-1].strip()
+            candidates = [after] if after else []
+            candidates.extend(next_line.strip() for next_line in lines[i + 1:i + 5] if next_line.strip())
+            for cand in candidates:
+                cand_clean = re.sub(r'[^A-Z\s]', '', cand.upper()).strip()
+                if cand_clean and resolve_country(cand_clean):
+                    final_dest_value = resolve_country(cand_clean)
+                    break
+            if not final_dest_value and candidates:
+                final_dest_value = candidates[0].strip()
+            break
+
+    sb_data = []
+    for i, line in enumerate(lines):
+        if "Port Code SB No SB Date" in line and i + 1 < len(lines):
+            next_line = lines[i + 1]
+            sb_numbers = re.findall(r'\b\d{5,8}\b', next_line)
+            dates = re.findall(r'\b\d{2}-[A-Z]{3}-\d{2}\b', next_line)
+            port_code = ""
+            if sb_numbers:
+                port_code_candidate = next_line[:next_line.find(sb_numbers[0])].strip()
+                port_code = port_code_candidate.split()[-1] if port_code_candidate else ""
+            for j in range(max(len(sb_numbers), len(dates))):
+                sb_data.append({
+                    "PORT CODE(FROM)": port_code,
+                    "SHIPPINGBILL NO": sb_numbers[j] if j < len(sb_numbers) else "",
+                    "SHIPPING BILL DATE": dates[j] if j < len(dates) else "",
+                    "IE CODE": iec.group(1) if iec else "",
+                    "GSTIN/TYPE": gstin.group(1) if gstin else "",
+                    "CB CODE": cbcode.group(1) if cbcode else "",
+                    "FINAL DESTINATION": final_dest_value,
+                    "INVOICE NO": "",
+                })
+    return pd.DataFrame(sb_data) if sb_data else None
+
+
+PAGE_ONE_LINES = [
+    "IEC/Br : 0512345678 GSTIN/TYPE : 33AAACA1234A1Z5 CB CODE : AAACB1234",
+    "IEC/Br", "0598765432", "GSTIN/TYPE -", "27BBBCB9876B1Z9", "CB CODE:AAACB9999", "cb code : lower",
+    "13.COUNTRY OF FINALDESTINATIO", "13.COUNTRY OF FINALDESTINATIO SWEDN", "13 country of finaldestinatio",
+    "13..COUNTRY  OF FINALDESTINATIO GERMNY", "SWEDN", "UNITED STATE", "NETHERLNDS", "HAMBURG", "UAE",
+    "CONSIGNEE", "12345", "",
+    "Port Code SB No SB Date", "INMAA1 1234567 12-JAN-24", "INNSA1 7654321 8765432 03-FEB-24",
+    "1111111 22222 01-MAR-24 02-MAR-24", "12-JAN-24", "no numbers here",
+    "EXPORTER DETAILS", "5.NAME OF CONSIGNEE", "PORT OF DISCHARGE GOTHENBURG",
+    # The SB header mostly comes with its numbers line
+    "Port Code SB No SB Date\nINMAA1 1234567 12-JAN-24",
+    "Port Code SB No SB Date\nINDEL4 2345678 3456789 05-MAY-24 06-MAY-24",
+]
+
+
+def test_sb_field_rules_match_the_line_by_line_extractor():
+    rng = random.Random(21)
+    for _ in range(2000):
+        text = "\n".join(rng.choice(PAGE_ONE_LINES) for _ in range(rng.randint(0, 25)))
+        expected = line_by_line_sb_data(text)
+        found = extract_sb_data(TextDocument(text))
+        if expected is None:
+            assert found is None, text
+        else:
+            pd.testing.assert_frame_equal(found, expected, obj=text)
+
+
+def iterrows_combine(sb_df, invoice_rows):
+    """_combine_sb_with_invoices as it was before the cross merge: a dict merge per pair."""
+    combined_rows = []
+    if not sb_df.empty:
+        for _, sb_row in sb_df.iterrows():
+            for inv in invoice_rows:
+                combined_rows.append({**sb_row.to_dict(), **inv})
+    else:
+        combined_rows = invoice_rows
+    return pd.DataFrame(combined_rows)
+
+
+def test_cross_merge_matches_the_iterrows_combine(pdfs):
+    # Two SB numbers on the bill give two SB rows
+    path = pdfs.shipping_bill(invoices=3, sb_number="1234567 7654321")
+    with ParsedDocument(path) as doc:
+        sb_df = extract_sb_data(doc)
+        invoice_rows = _invoice_rows_from_tables(_as_tables_dict(doc))
+    assert len(sb_df) == 2 and len(invoice_rows) == 3
+
+    cases = [
+        (sb_df, invoice_rows),
+        (sb_df, []),  # an SB without invoice tables
+        (sb_df.iloc[:1], invoice_rows[:1]),
+        (sb_df.drop(columns=["INVOICE NO"]), invoice_rows),
+        # The shared INVOICE NO column keeps its SB position
+        (sb_df[["INVOICE NO"] + [col for col in sb_df.columns if col != "INVOICE NO"]], invoice_rows),
+        (pd.DataFrame(), invoice_rows),
+    ]
+    for sb, rows in cases:
+        pd.testing.assert_frame_equal(_combine_sb_with_invoices(sb, rows), iterrows_combine(sb, rows))
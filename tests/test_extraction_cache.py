@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+
+import extraction_cache
+from extraction_cache import ExtractionCache
+
+
+def entry(n):
+    rows = pd.DataFrame({"SHIPPINGBILL NO": [str(n)] * 50, "INVOICE NO": [f"INV/{k}" for k in range(50)]})
+    return rows, {"Page_1": rows.copy()}
+
+
+def test_hit_returns_what_was_put(tmp_path):
+    cache = ExtractionCache(tmp_path)
+    rows, tables = entry(1)
+    cache.put(cache.key_for("abc"), rows, tables)
+
+    hit_rows, hit_tables = cache.get(cache.key_for("abc"))
+    pd.testing.assert_frame_equal(hit_rows, rows)
+    pd.testing.assert_frame_equal(hit_tables["Page_1"], tables["Page_1"])
+    assert cache.get(cache.key_for("def")) is None
+
+
+def test_new_extractor_version_misses(tmp_path, monkeypatch):
+    cache = ExtractionCache(tmp_path)
+    cache.put(cache.key_for("abc"), *entry(1))
+
+    monkeypatch.setattr(extraction_cache, "EXTRACTOR_VERSION", extraction_cache.EXTRACTOR_VERSION + 1)
+    assert cache.get(cache.key_for("abc")) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ExtractionCache(tmp_path)
+    for n in range(3):
+        cache.put(f"k{n}", *entry(n))
+        os.utime(tmp_path / f"k{n}.pkl", (1000 + n, 1000 + n))
+    entry_size = cache.size_bytes() // 3
+    cache.get("k0")  # now the most recently used
+
+    cache.max_bytes = 3 * entry_size + entry_size // 2
+    cache.put("k3", *entry(3))
+
+    assert cache.get("k1") is None
+    assert all(cache.get(key) is not None for key in ("k0", "k2", "k3"))
+    assert cache.size_bytes() <= cache.max_bytes
+
+
+def test_put_only_evicts_past_the_size_limit(tmp_path, monkeypatch):
+    cache = ExtractionCache(tmp_path)
+    evictions = []
+    monkeypatch.setattr(ExtractionCache, "evict", lambda self: evictions.append(self))
+
+    for n in range(3):
+        cache.put(f"k{n}", *entry(n))
+    assert not evictions
+
+    cache.max_bytes = cache.size_bytes()
+    cache.put("k3", *entry(3))
+    assert len(evictions) == 1
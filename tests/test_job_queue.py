@@ -0,0 +1,64 @@
+import os
+import time
+
+import job_queue
+from batch import tidy_combined_rows
+from job_queue import ExtractionService, run_job
+
+
+def test_stale_workspaces_are_pruned_while_the_service_runs(tmp_path, monkeypatch):
+    service = ExtractionService(workers=1, workspace_dir=tmp_path)
+    try:
+        fresh = service.workspace("fresh")
+        stale = tmp_path / "stale"
+        stale.mkdir()
+        old = time.time() - job_queue.WORKSPACE_MAX_AGE_SECONDS - 60
+        os.utime(stale, (old, old))
+
+        # Within the interval nothing is swept
+        service.workspace("fresh")
+        assert stale.exists()
+
+        monkeypatch.setattr(job_queue, "WORKSPACE_PRUNE_INTERVAL_SECONDS", 0)
+        service.workspace("fresh")
+        assert not stale.exists()
+        assert fresh.exists()
+    finally:
+        service.shutdown()
+
+
+def test_uploaded_bytes_are_extracted_without_touching_disk(pdfs, tmp_path):
+    with open(pdfs.shipping_bill(invoices=2), "rb") as f:
+        data = f.read()
+    service = ExtractionService(workers=1, workspace_dir=tmp_path / "workspaces")
+    try:
+        result = run_job(service, "session", [data, data])
+    finally:
+        service.shutdown()
+    assert not result.failures
+    assert result.sources == [None, None]
+    assert len(tidy_combined_rows(result.rows)) == 4
+    assert not list((tmp_path / "workspaces").rglob("*.pdf"))
+
+
+def finished_results(service, job_id):
+    while not service.status(job_id).finished:
+        service.wait(job_id, len(service.results(job_id)), timeout=1)
+    return sorted(service.results(job_id), key=lambda result: result.index)
+
+
+def test_a_crashing_pdf_fails_only_its_own_file(pdfs, crashing_pdf, tmp_path):
+    paths = pdfs.batch(files=6, invoices=1)
+    service = ExtractionService(workers=2, workspace_dir=tmp_path / "workspaces")
+    try:
+        # Both jobs are queued before the crash, so the other session's files share the broken pool
+        crashing = service.submit("crashing", [crashing_pdf] + paths[:3])
+        other = service.submit("other", paths[3:])
+        crashing_results = finished_results(service, crashing)
+        other_results = finished_results(service, other)
+    finally:
+        service.shutdown()
+    assert "BrokenProcessPool" in crashing_results[0].error
+    for result in crashing_results[1:] + other_results:
+        assert result.error is None
+        assert not result.rows.empty
@@ -0,0 +1,70 @@
+import json
+import threading
+import time
+from email.message import EmailMessage
+
+from mailbox_sources import STATE_FILE_NAME, MaildirSource, iter_matching_pdfs
+
+
+class SlowMaildirSource(MaildirSource):
+    def fetch_attachment(self, location, filename):
+        time.sleep(0.05)
+        return super().fetch_attachment(location, filename)
+
+
+def write_mail(folder, name, attachments):
+    folder.mkdir(parents=True, exist_ok=True)
+    msg = EmailMessage()
+    msg["Subject"] = name
+    msg["Message-ID"] = f"<{name}@example.com>"
+    for filename, data in attachments:
+        msg.add_attachment(data, maintype="application", subtype="pdf", filename=filename)
+    (folder / f"{name}.eml").write_bytes(msg.as_bytes())
+
+
+def test_sessions_share_one_download_dir(tmp_path):
+    downloads = tmp_path / "downloads"
+    for box in ("a", "b"):
+        for k in range(3):
+            write_mail(tmp_path / box, f"{box}{k}", [(f"SB_{box}{k}.pdf", f"%PDF {box}{k}".encode())])
+
+    found = {}
+
+    def session(box):
+        source = SlowMaildirSource(tmp_path / box)
+        found[box] = sorted(iter_matching_pdfs(source, ["SB_"], downloads))
+
+    threads = [threading.Thread(target=session, args=(box,)) for box in ("a", "b", "a")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    state = json.loads((downloads / STATE_FILE_NAME).read_text(encoding="utf-8"))
+    assert len(state) == 2
+    for box_state in state.values():
+        assert box_state["watermark"] is not None
+        assert all(entry["sha256"] for entry in box_state["attachments"])
+    # The two sessions on mailbox a write its attachments once
+    assert len(list(downloads.glob("*.pdf"))) == 6
+    assert len(found["a"]) == 3 and len(found["b"]) == 3
+
+
+def test_sessions_download_into_their_own_dirs(tmp_path):
+    shared = tmp_path / "shared"
+    for k in range(2):
+        write_mail(tmp_path / "box", f"m{k}", [(f"SB_{k}.pdf", f"%PDF {k}".encode())])
+
+    found = {}
+    for session in ("s1", "s2"):
+        source = MaildirSource(tmp_path / "box")
+        found[session] = sorted(iter_matching_pdfs(source, ["SB_"], tmp_path / session, state_dir=shared))
+
+    for session in ("s1", "s2"):
+        assert len(found[session]) == 2
+        assert all(path.startswith(str(tmp_path / session)) for path in found[session])
+        assert len(list((tmp_path / session).glob("*.pdf"))) == 2
+    # The index is shared, the downloads are not
+    assert not list(shared.glob("*.pdf"))
+    (box_state,) = json.loads((shared / STATE_FILE_NAME).read_text(encoding="utf-8")).values()
+    assert len(box_state["attachments"]) == 2 and not box_state["saved"]
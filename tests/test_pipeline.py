@@ -0,0 +1,12 @@
+from pipeline import run_pipeline
+
+
+def test_worker_crash_fails_only_the_crashing_file(pdfs, crashing_pdf):
+    paths = pdfs.batch(files=7, invoices=1)
+    sources = paths[:3] + [crashing_pdf] + paths[3:]
+    result = run_pipeline(iter(sources), workers=4)
+    assert result.error is None
+    assert len(result.sources) == 8
+    assert [failure.index for failure in result.failures] == [3]
+    assert "BrokenProcessPool" in result.failures[0].error
+    assert len(result.rows) == 7
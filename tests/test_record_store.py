@@ -0,0 +1,27 @@
+import pandas as pd
+
+from extraction import RECORD_COLUMNS
+from record_store import RecordStore
+
+
+def sb_rows(sb_number, invoices):
+    rows = pd.DataFrame(columns=RECORD_COLUMNS)
+    rows["INVOICE NO"] = [f"INV/{k}" for k in range(invoices)]
+    rows["SHIPPINGBILL NO"] = sb_number
+    return rows
+
+
+def test_revision_changes_when_a_delete_frees_row_ids(tmp_path):
+    store = RecordStore(tmp_path / "records.sqlite3")
+    store.put_rows("a", sb_rows("1000001", 2))
+    store.put_rows("b", sb_rows("1000002", 2))
+    seen = {store.revision()}
+
+    # Same row count and, once b's ids are freed, the same max id as before
+    store.delete_pdf("b")
+    seen.add(store.revision())
+    store.put_rows("c", sb_rows("1000003", 2))
+    seen.add(store.revision())
+
+    assert len(seen) == 3
+    assert store.rows_for_shipping_bills(["1000003"])["INVOICE NO"].tolist() == ["INV/0", "INV/1"]
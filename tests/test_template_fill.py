@@ -0,0 +1,107 @@
+import random
+
+import pandas as pd
+from openpyxl import Workbook
+
+from extraction import RECORD_COLUMNS
+from template_fill import KEY_COLUMNS, fill_template, normalize_key
+
+TEMPLATE_HEADERS = ["SHIPPINGBILL NO", "INVOICE NO", "DRAWEE NAME", "FINAL DESTINATION", "GOODS DESCRIPTION", "REMARKS"]
+
+
+def make_template(rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(TEMPLATE_HEADERS)
+    for row in rows:
+        ws.append(row)
+    return ws
+
+
+def grid(ws):
+    return [[cell.value for cell in row] for row in ws.iter_rows(min_row=1)]
+
+
+def _blank(value):
+    return value is None or (isinstance(value, float) and pd.isna(value)) or str(value).strip() == ""
+
+
+def reference_fill(ws, extracted_df):
+    """Row-by-row fill: first (SB, invoice) match, else first SB match; only blank cells get a value."""
+    headers = {cell.value: cell.column for cell in ws[1] if cell.value}
+    records = extracted_df.to_dict("records")
+    fields = [col for col in extracted_df.columns if col in headers and col not in KEY_COLUMNS]
+    for row in ws.iter_rows(min_row=2):
+        sb = row[headers["SHIPPINGBILL NO"] - 1].value
+        inv = row[headers["INVOICE NO"] - 1].value
+        sb_key = normalize_key(sb) if sb else None
+        inv_key = normalize_key(inv) if inv else None
+        if sb_key is None:
+            continue
+        match = None
+        if inv_key is not None:
+            match = next(
+                (r for r in records
+                 if normalize_key(r["SHIPPINGBILL NO"]) == sb_key and normalize_key(r["INVOICE NO"]) == inv_key),
+                None,
+            )
+        if match is None:
+            match = next((r for r in records if normalize_key(r["SHIPPINGBILL NO"]) == sb_key), None)
+        if match is None:
+            continue
+        for field in fields:
+            cell = row[headers[field] - 1]
+            if _blank(cell.value) and not _blank(match[field]):
+                cell.value = match[field]
+
+
+def random_case(seed):
+    rng = random.Random(seed)
+    sbs = ["1001", "1002", "1003", " 1004 ", None, ""]
+    invs = ["INV/1", "inv/2", "INV/3", None]
+    extracted = pd.DataFrame([
+        {
+            "SHIPPINGBILL NO": rng.choice(sbs),
+            "INVOICE NO": rng.choice(invs),
+            "DRAWEE NAME": rng.choice(["ACME", "", None, "GLOBEX"]),
+            "FINAL DESTINATION": rng.choice(["SWEDEN", None]),
+            "GOODS DESCRIPTION": rng.choice(["STEEL", "PARTS", None]),
+        }
+        for _ in range(rng.randint(0, 12))
+    ], columns=["SHIPPINGBILL NO", "INVOICE NO", "DRAWEE NAME", "FINAL DESTINATION", "GOODS DESCRIPTION"])
+    template = [
+        [
+            rng.choice([1001, 1002.0, "1003", "1004", "9999", None]),
+            rng.choice(["INV/1", "INV/2", "inv/3", None]),
+            rng.choice([None, "", "KEPT"]),
+            rng.choice([None, " "]),
+            None,
+            rng.choice([None, "note"]),
+        ]
+        for _ in range(rng.randint(1, 15))
+    ]
+    return extracted, template
+
+
+def test_fill_matches_reference_cell_for_cell():
+    for seed in range(300):
+        extracted, rows = random_case(seed)
+        expected, actual = make_template(rows), make_template(rows)
+        reference_fill(expected, extracted)
+        fill_template(actual, extracted, chunk_rows=4)
+        assert grid(actual) == grid(expected), f"seed {seed}"
+
+
+def test_fill_with_no_extracted_rows():
+    ws = make_template([["1001", "INV/1", None, None, None, None]])
+    report = fill_template(ws, pd.DataFrame(columns=RECORD_COLUMNS))
+    assert report.filled_rows == 0
+    assert grid(ws)[1] == ["1001", "INV/1", None, None, None, None]
+
+
+def test_fill_when_no_extracted_row_has_an_sb_number():
+    extracted = pd.DataFrame({"SHIPPINGBILL NO": [None, ""], "INVOICE NO": ["INV/1", "INV/2"], "DRAWEE NAME": ["A", "B"]})
+    ws = make_template([["1001", "INV/1", None, None, None, None], ["1002", None, None, None, None, None]])
+    report = fill_template(ws, extracted)
+    assert report.filled_rows == 0
+    assert grid(ws)[1:] == [["1001", "INV/1", None, None, None, None], ["1002", None, None, None, None, None]]
@@ -0,0 +1,46 @@
+import os
+
+from record_store import RecordStore
+from watch_folder import FolderWatcher, Manifest
+
+
+def make_watcher(tmp_path, store=None):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir(exist_ok=True)
+    store = store or RecordStore(tmp_path / "records.sqlite3")
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    return inbox, FolderWatcher([str(inbox)], store, manifest, settle_seconds=0)
+
+
+def test_empty_file_is_skipped_and_once_returns(pdfs, tmp_path):
+    inbox, watcher = make_watcher(tmp_path)
+    empty = inbox / "empty.pdf"
+    empty.write_bytes(b"")
+    pdfs.shipping_bill("inbox/SB_1.pdf", invoices=2, sb_number="1000001")
+
+    watcher.run(once=True, poll_seconds=0)
+
+    assert not watcher._settling
+    assert watcher.manifest.files[str(empty)]["error"] == "empty file"
+    assert watcher.manifest.files[str(inbox / "SB_1.pdf")]["rows"] == 2
+    # Picked up again once something is written to it
+    pdfs.shipping_bill("inbox/empty.pdf", invoices=1, sb_number="1000002")
+    os.utime(empty, ns=(0, 10**18))
+    watcher.scan()
+    assert watcher.manifest.files[str(empty)]["error"] is None
+    assert watcher.manifest.files[str(empty)]["rows"] == 1
+
+
+def test_store_failure_is_recorded(pdfs, tmp_path):
+    class FailingStore(RecordStore):
+        def put_rows(self, pdf_hash, rows, source_name=None):
+            raise RuntimeError("disk full")
+
+    inbox, watcher = make_watcher(tmp_path, FailingStore(tmp_path / "records.sqlite3"))
+    path = pdfs.shipping_bill("inbox/SB_1.pdf", invoices=1)
+
+    results = watcher.scan()
+
+    assert len(results) == 1
+    assert watcher.manifest.files[path]["error"] == "RuntimeError: disk full"
+    assert not watcher.manifest.hashes()
@@ -0,0 +1,300 @@
+"""
+Watch-folder ingestion: extract PDFs as they land in a drop directory.
+
+FolderWatcher scans the watched directories for PDFs that are new, or have
+changed since the manifest last saw them. Each one runs through the usual
+extraction chain (batch.iter_extract), and its rows are stored in the
+RecordStore. The rows of a changed PDF replace the ones from its previous
+content. End-of-day reporting then reads the store (export_ingested, or a
+template fill with cli.py --store) instead of re-extracting the day's files.
+
+- Wake-ups: watchdog's observer (inotify on Linux) wakes the loop as soon
+  as something changes. Without watchdog, or if the observer cannot start
+  (e.g. the inotify watch limit is reached), the folders are polled.
+  Either way they are rescanned every RESCAN_SECONDS, because events are
+  not delivered for every network share.
+- Debounce: a file is only extracted once its size and mtime have stayed the
+  same for settle_seconds, so half-copied PDFs are left alone. A file that
+  settles empty is recorded as skipped and picked up again once written.
+- Manifest: a JSON file with the size, mtime and SHA-256 of every ingested
+  file, saved after each file. A restart picks up where it stopped, and a
+  touched file whose content did not change is not extracted again.
+  Files moved out of the folder after ingestion stay in the manifest, so
+  they are still part of the day's report.
+"""
+import json
+import os
+import threading
+import time
+
+from batch import iter_extract, tidy_combined_rows
+from extraction import EXTRACTOR_VERSION, RECORD_COLUMNS
+from extraction_cache import hash_pdf
+from instrumentation import log_event
+
+MANIFEST_VERSION = 1
+DEFAULT_SETTLE_SECONDS = 2.0
+DEFAULT_POLL_SECONDS = 5.0
+RESCAN_SECONDS = 60.0
+
+
+class Manifest:
+    """
+    {path: entry} for every PDF taken from the watched folders. An entry
+    holds the size, mtime_ns and sha256 the file had when it was extracted,
+    the rows stored (or the error), the EXTRACTOR_VERSION used and when.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        self.files = data.get("files", {})
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, path, stat):
+        """True when path was handled with this size, mtime and extractor version."""
+        entry = self.files.get(path)
+        return (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["extractor_version"] == EXTRACTOR_VERSION
+        )
+
+    def record(self, path, stat, sha256, rows=0, error=None):
+        self.files[path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256,
+            "rows": rows,
+            "error": error,
+            "extractor_version": EXTRACTOR_VERSION,
+            "ingested_at": time.time(),
+        }
+
+    def hashes(self):
+        """SHA-256 of every file extracted without error."""
+        return {entry["sha256"] for entry in self.files.values() if not entry["error"]}
+
+
+def _is_pdf_name(name):
+    # Skips dotfiles and Office lock files; names still being copied
+    # (x.pdf.part, x.pdf.crdownload) do not end in .pdf yet
+    return name.lower().endswith(".pdf") and not name.startswith((".", "~$"))
+
+
+class FolderWatcher:
+    """
+    Ingests the PDFs of one or more directories into a RecordStore, tracking
+    them in a Manifest. scan() handles whatever is ready now; run() keeps
+    watching. workers, cache, use_layout_template and stream_pages are passed
+    on to iter_extract.
+    """
+
+    def __init__(self, directories, store, manifest, workers=1, cache=None, use_layout_template=False,
+                 stream_pages=False, settle_seconds=DEFAULT_SETTLE_SECONDS, recursive=False):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.store = store
+        self.manifest = manifest
+        self.workers = workers
+        self.cache = cache
+        self.use_layout_template = use_layout_template
+        self.stream_pages = stream_pages
+        self.settle_seconds = settle_seconds
+        self.recursive = recursive
+        self._settling = {}  # path -> ((size, mtime_ns), monotonic time first seen so)
+        self._wake = threading.Event()
+
+    def _candidates(self):
+        """(path, os.stat_result) of every PDF in the watched directories."""
+        for directory in self.directories:
+            for root, dirs, names in os.walk(directory):
+                if not self.recursive:
+                    dirs.clear()
+                for name in sorted(names):
+                    if not _is_pdf_name(name):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        yield path, os.stat(path)
+                    except FileNotFoundError:
+                        continue
+
+    def ready_files(self):
+        """
+        New or changed PDFs whose size and mtime have not moved for
+        settle_seconds. Files still settling are remembered for the next call.
+        """
+        now = time.monotonic()
+        ready = []
+        seen = set()
+        for path, stat in self._candidates():
+            seen.add(path)
+            if self.manifest.is_current(path, stat):
+                self._settling.pop(path, None)
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            settling = self._settling.get(path)
+            if settling is None or settling[0] != signature:
+                settling = self._settling[path] = (signature, now)
+            # Files already quiet before the first scan (a backlog) count from their mtime
+            quiet = max(now - settling[1], time.time() - stat.st_mtime)
+            if quiet >= self.settle_seconds:
+                ready.append((path, stat))
+        for path in list(self._settling):
+            if path not in seen:
+                del self._settling[path]
+        return ready
+
+    def _forget_content(self, sha256):
+        # A changed file's old rows go, unless another watched file has the same content
+        if sha256 and sha256 not in self.manifest.hashes():
+            self.store.delete_pdf(sha256)
+
+    def ingest(self, ready):
+        """Extract and store the given (path, stat) files. Returns their FileResults."""
+        to_extract = []
+        for path, stat in ready:
+            if not stat.st_size:
+                # Recorded as skipped so run(once=True) does not wait on it; a
+                # write changes its size and mtime, so it is picked up then
+                self.manifest.record(path, stat, None, error="empty file")
+                self._settling.pop(path, None)
+                print(f"⚠️ {os.path.basename(path)}: empty file, skipped")
+                continue
+            try:
+                sha256 = hash_pdf(path)
+            except FileNotFoundError:
+                continue
+            previous = self.manifest.files.get(path)
+            if (previous and previous["sha256"] == sha256 and not previous["error"]
+                    and previous["extractor_version"] == EXTRACTOR_VERSION):
+                # Touched or copied over with the same bytes: nothing to extract
+                self.manifest.record(path, stat, sha256, previous["rows"])
+                self._settling.pop(path, None)
+                continue
+            to_extract.append((path, stat, sha256))
+        if not to_extract:
+            if ready:
+                self.manifest.save()
+            return []
+
+        results = []
+        extracted = iter_extract(
+            [path for path, _, _ in to_extract],
+            workers=self.workers,
+            cache=self.cache,
+            use_layout_template=self.use_layout_template,
+            stream_pages=self.stream_pages,
+        )
+        for result in extracted:
+            path, stat, sha256 = to_extract[result.index]
+            previous = self.manifest.files.get(path)
+            error = result.error
+            if error is None:
+                try:
+                    rows = tidy_combined_rows(result.rows)
+                    self.store.put_rows(sha256, rows, os.path.basename(path))
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+            if error:
+                # Left as it was in the store; retried once the file changes again
+                self.manifest.record(path, stat, sha256, error=error)
+                print(f"❌ {os.path.basename(path)}: {error}")
+            else:
+                self.manifest.record(path, stat, sha256, len(rows))
+                if previous and previous["sha256"] != sha256:
+                    self._forget_content(previous["sha256"])
+                print(f"✅ {os.path.basename(path)}: {len(rows)} row(s){' (changed)' if previous else ''}")
+            self._settling.pop(path, None)
+            self.manifest.save()
+            log_event(
+                "file_ingested", file=path, sha256=sha256, error=error,
+                rows=self.manifest.files[path]["rows"], cached=result.cached,
+            )
+            results.append(result)
+        return results
+
+    def scan(self):
+        """Ingest every PDF that is ready now. Returns the FileResults."""
+        return self.ingest(self.ready_files())
+
+    def _start_observer(self):
+        """A running watchdog observer that sets self._wake on any change, or None to poll."""
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            print("ℹ️ watchdog is not installed, polling instead (pip install watchdog for instant pickup).")
+            return None
+
+        wake = self._wake
+
+        class _WakeHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+
+        observer = Observer()
+        try:
+            for directory in self.directories:
+                observer.schedule(_WakeHandler(), directory, recursive=self.recursive)
+            observer.start()
+        except OSError as e:
+            print(f"⚠️ Could not watch for file events ({e}), polling instead.")
+            return None
+        return observer
+
+    def run(self, once=False, poll_seconds=DEFAULT_POLL_SECONDS):
+        """
+        Keep ingesting until interrupted (Ctrl+C). With once=True, return
+        as soon as every PDF present has been ingested (waiting for files
+        still being written to settle).
+        """
+        observer = None
+        try:
+            # Inside the try, so an interrupt that arrives while starting up
+            # still stops the observer
+            observer = self._start_observer()
+            mode = "file events" if observer is not None else f"polling every {poll_seconds:g}s"
+            print(f"👀 Watching {', '.join(self.directories)} ({mode}).")
+            while True:
+                self.scan()
+                if once and not self._settling:
+                    return
+                if self._settling:
+                    timeout = self.settle_seconds / 2
+                else:
+                    timeout = RESCAN_SECONDS if observer is not None else poll_seconds
+                self._wake.wait(timeout)
+                self._wake.clear()
+        except KeyboardInterrupt:
+            print("🛑 Stopped watching.")
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join(timeout=5)
+
+
+def export_ingested(manifest, store, target, fmt):
+    """
+    Write the stored rows of every file in the manifest to target in fmt
+    (see export.EXPORT_FORMATS), without extracting anything. Returns the
+    row count.
+    """
+    from export import RowWriter
+
+    rows = store.rows_for_pdfs(manifest.hashes())
+    with RowWriter(target, fmt, RECORD_COLUMNS) as writer:
+        writer.write_frame(rows)
+    return len(rows)